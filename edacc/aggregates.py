@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.aggregates
+    ----------------
+
+    Incrementally maintained per-experiment aggregates of the results of
+    each (solver configuration, instance) pair.
+
+    Instead of rescanning all ExperimentResults rows of an experiment on
+    every page load, an ExperimentAggregates object remembers the highest
+    date_modified value it has seen (the watermark) and only fetches rows
+    that were modified since then. Rows that change after they have been
+    counted (e.g. jobs that are reset) cause only their cell to be
+    recomputed. Deleted jobs aren't seen by the watermark, but they change
+    the version stamp of the experiment data (see data_version), which
+    counts the jobs. Whenever the stamp changes, the number of counted jobs
+    is compared to the number of completed jobs in the database and
+    everything is rebuilt if they differ (e.g. because jobs were deleted
+    or rows were missed by the watermark).
+
+    The aggregates of at most MAX_CACHED_STORES experiments and cost columns
+    are kept, the least recently used ones are dropped first.
+
+    Only the cost columns resultTime, wallTime and cost without a fixed
+    limit are supported, callers have to fall back to their queries
+    for result properties and fixed limits.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import datetime, math
+from collections import OrderedDict
+from threading import Lock
+
+from sqlalchemy.sql import select, and_, or_, not_, functions
+
+from edacc.constants import STATUS_PROCESSING
+
+# costs that can be aggregated
+COSTS = ('resultTime', 'wallTime', 'cost')
+
+# rows modified this many seconds before the watermark are fetched again
+# because date_modified is set before the modifying transaction commits
+WATERMARK_OVERLAP = datetime.timedelta(seconds=60)
+
+# maximum number of ExperimentAggregates kept in memory
+MAX_CACHED_STORES = 32
+
+
+class CellAggregate(object):
+    """ Aggregates of the completed runs of a solver configuration on an instance.
+
+        runs, successes: number of completed and successful runs
+        sum, sum_squares, min, max: of the cost of the successful runs
+        limit_sum: sum of the limits of the unsuccessful runs (PAR-k numerator)
+        num_finished, finished_sum: number and cost sum of the runs with status >= 1
+    """
+    __slots__ = ('runs', 'successes', 'sum', 'sum_squares', 'min', 'max', 'limit_sum',
+                 'num_finished', 'finished_sum')
+
+    def __init__(self):
+        self.runs = 0
+        self.successes = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = None
+        self.max = None
+        self.limit_sum = 0.0
+        self.num_finished = 0
+        self.finished_sum = 0.0
+
+    def add(self, status, successful, cost, limit):
+        self.runs += 1
+        if successful:
+            self.successes += 1
+            self.sum += cost
+            self.sum_squares += cost * cost
+            if self.min is None or cost < self.min: self.min = cost
+            if self.max is None or cost > self.max: self.max = cost
+        else:
+            self.limit_sum += limit or 0.0
+        if status >= 1 and cost is not None:
+            self.num_finished += 1
+            self.finished_sum += cost
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.successes += other.successes
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        if other.min is not None and (self.min is None or other.min < self.min): self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max): self.max = other.max
+        self.limit_sum += other.limit_sum
+        self.num_finished += other.num_finished
+        self.finished_sum += other.finished_sum
+
+    @property
+    def failures(self):
+        return self.runs - self.successes
+
+    def mean(self):
+        """ Mean cost of the successful runs """
+        if self.successes == 0: return None
+        return self.sum / self.successes
+
+    def stddev(self):
+        """ Standard deviation of the cost of the successful runs """
+        if self.successes == 0: return None
+        mean = self.sum / self.successes
+        return math.sqrt(max(0.0, self.sum_squares / self.successes - mean * mean))
+
+    def par_sum(self, k, penalty=None):
+        """ Cumulated penalized cost where unsuccessful runs count k times
+            their limit or k times penalty if given. """
+        if penalty is not None:
+            return self.sum + k * penalty * self.failures
+        return self.sum + k * self.limit_sum
+
+    def par(self, k, penalty=None):
+        if self.runs == 0: return None
+        return self.par_sum(k, penalty) / self.runs
+
+
+class ExperimentAggregates(object):
+    """ Aggregates of all (solver configuration, instance) pairs of an experiment
+        for one cost column. Use get_aggregates() to obtain an up-to-date instance.
+    """
+
+    def __init__(self, experiment_id, cost):
+        self.experiment_id = experiment_id
+        self.cost = cost
+        self.lock = Lock()
+        self.checked_version = None # data version of the last comparison of the number of jobs
+        self._reset()
+
+    def _reset(self):
+        # (idSolverConfig, idInstance) -> CellAggregate
+        self.cells = dict()
+        # ids of the completed jobs that are part of the aggregates
+        self.counted = set()
+        # idJob -> row fingerprint of the rows in the overlap window before the watermark
+        self.recent = dict()
+        self.watermark = None
+
+    def _columns(self, db):
+        table = db.metadata.tables['ExperimentResults']
+        if self.cost == 'resultTime':
+            limit_column = table.c['CPUTimeLimit']
+        elif self.cost == 'wallTime':
+            limit_column = table.c['wallClockTimeLimit']
+        else:
+            limit_column = table.c['CPUTimeLimit'] # unused, see CellAggregate.par_sum
+        return table, [table.c['idJob'], table.c['SolverConfig_idSolverConfig'], table.c['Instances_idInstance'],
+                       table.c['status'], table.c['resultCode'], table.c[self.cost], limit_column,
+                       table.c['date_modified']]
+
+    def _add_row(self, row):
+        status = int(row[3])
+        if status in STATUS_PROCESSING: return
+        key = (row[1], row[2])
+        if key not in self.cells:
+            self.cells[key] = CellAggregate()
+        cost = None if row[5] is None else float(row[5])
+        successful = str(row[4]).startswith('1') and cost is not None
+        self.cells[key].add(status, successful, cost, None if row[6] is None else float(row[6]))
+        self.counted.add(row[0])
+
+    def _rebuild(self, db):
+        self._reset()
+        table, columns = self._columns(db)
+        rows = db.session.connection().execute(
+            select(columns, table.c['Experiment_idExperiment'] == self.experiment_id))
+        for row in rows:
+            self._add_row(row)
+            if row[7] is not None and (self.watermark is None or row[7] > self.watermark):
+                self.watermark = row[7]
+        if self.watermark is not None:
+            rows = db.session.connection().execute(
+                select(columns, and_(table.c['Experiment_idExperiment'] == self.experiment_id,
+                                     table.c['date_modified'] >= self.watermark - WATERMARK_OVERLAP)))
+            self.recent = dict((row[0], (row[3], row[4], row[5], row[6], row[7])) for row in rows)
+
+    def _recompute_cells(self, db, keys):
+        """ Rebuilds the given cells from all of their rows. """
+        table, columns = self._columns(db)
+        instances_by_sc = dict()
+        for sc_id, instance_id in keys:
+            instances_by_sc.setdefault(sc_id, []).append(instance_id)
+            self.cells.pop((sc_id, instance_id), None)
+        cell_filter = or_(*[and_(table.c['SolverConfig_idSolverConfig'] == sc_id,
+                                 table.c['Instances_idInstance'].in_(instance_ids))
+                            for sc_id, instance_ids in instances_by_sc.iteritems()])
+        rows = db.session.connection().execute(
+            select(columns, and_(table.c['Experiment_idExperiment'] == self.experiment_id, cell_filter)))
+        for row in rows:
+            self._add_row(row)
+
+    def update(self, db, version):
+        """ Applies all rows modified since the last update. version is the
+            current version stamp of the experiment data. """
+        if self.watermark is None:
+            self._rebuild(db)
+        else:
+            table, columns = self._columns(db)
+            rows = db.session.connection().execute(
+                select(columns, and_(table.c['Experiment_idExperiment'] == self.experiment_id,
+                                     table.c['date_modified'] >= self.watermark - WATERMARK_OVERLAP)))
+            dirty = set()
+            new_watermark = self.watermark
+            seen = []
+            for row in rows:
+                fingerprint = (row[3], row[4], row[5], row[6], row[7])
+                if row[7] is not None and row[7] > new_watermark: new_watermark = row[7]
+                seen.append((row[0], row[7], fingerprint))
+                if self.recent.get(row[0]) == fingerprint:
+                    continue # already applied and unchanged
+                if row[0] in self.counted:
+                    # counted job changed, e.g. it was reset or verified again
+                    dirty.add((row[1], row[2]))
+                    if int(row[3]) in STATUS_PROCESSING: self.counted.discard(row[0])
+                else:
+                    self._add_row(row)
+            if dirty:
+                self._recompute_cells(db, dirty)
+            self.watermark = new_watermark
+            window_start = new_watermark - WATERMARK_OVERLAP
+            self.recent = dict((id, fp) for id, date, fp in seen if date is not None and date >= window_start)
+
+        # safety net: jobs that were deleted or rows that were missed by the watermark.
+        # Counting scans all jobs of the experiment, so only count when the data changed.
+        if version != self.checked_version:
+            table = db.metadata.tables['ExperimentResults']
+            num_completed = db.session.connection().execute(
+                select([functions.count(table.c['idJob'])],
+                       and_(table.c['Experiment_idExperiment'] == self.experiment_id,
+                            not_(table.c['status'].in_(STATUS_PROCESSING))))).fetchone()[0]
+            if num_completed != len(self.counted):
+                self._rebuild(db)
+            self.checked_version = version
+
+    # The readers hold the lock because update() of another request mutates the cells,
+    # the returned aggregates are copies.
+
+    def cell(self, idSolverConfig, idInstance):
+        """ Returns the aggregate of the given pair, an empty aggregate if there are no completed runs """
+        aggregate = CellAggregate()
+        with self.lock:
+            if (idSolverConfig, idInstance) in self.cells:
+                aggregate.merge(self.cells[(idSolverConfig, idInstance)])
+        return aggregate
+
+    def by_solver_config(self, solver_config_ids, instance_ids=None):
+        """ Returns a dictionary idSolverConfig -> CellAggregate merged over the given instances """
+        instance_ids = None if instance_ids is None else set(instance_ids)
+        totals = dict((sc_id, CellAggregate()) for sc_id in solver_config_ids)
+        with self.lock:
+            for (sc_id, instance_id), agg in self.cells.iteritems():
+                if sc_id in totals and (instance_ids is None or instance_id in instance_ids):
+                    totals[sc_id].merge(agg)
+        return totals
+
+    def by_instance(self, instance_ids, solver_config_ids=None):
+        """ Returns a dictionary idInstance -> CellAggregate merged over the given solver configurations """
+        solver_config_ids = None if solver_config_ids is None else set(solver_config_ids)
+        totals = dict((instance_id, CellAggregate()) for instance_id in instance_ids)
+        with self.lock:
+            for (sc_id, instance_id), agg in self.cells.iteritems():
+                if instance_id in totals and (solver_config_ids is None or sc_id in solver_config_ids):
+                    totals[instance_id].merge(agg)
+        return totals
+
+    def total(self):
+        """ Returns the aggregate over all pairs of the experiment """
+        total = CellAggregate()
+        with self.lock:
+            for agg in self.cells.itervalues():
+                total.merge(agg)
+        return total
+
+
+_stores = OrderedDict() # key -> ExperimentAggregates, least recently used first
+_stores_lock = Lock()
+
+
+def get_aggregates(db, experiment, cost='resultTime'):
+    """ Returns the up-to-date ExperimentAggregates of the given experiment
+        and cost column or None if the cost can't be aggregated.
+    """
+    if cost not in COSTS: return None
+    key = (db.database, experiment.idExperiment, cost)
+    version = experiment.get_data_version(db)
+    with _stores_lock:
+        store = _stores.pop(key, None)
+        if store is None:
+            store = ExperimentAggregates(experiment.idExperiment, cost)
+        _stores[key] = store # most recently used
+        while len(_stores) > MAX_CACHED_STORES:
+            _stores.popitem(last=False)
+    with store.lock:
+        store.update(db, version)
+    return store
+
+
+def clear(database=None):
+    """ Drops the aggregates of all experiments of the given database (all databases if None). """
+    with _stores_lock:
+        for key in _stores.keys():
+            if database is None or key[0] == database:
+                del _stores[key]
@@ -1,46 +1,137 @@
-import tempfile
-import os
-import subprocess
-import resource
-from itertools import combinations, izip
-
-from edacc import config
-
-sets_union = lambda sets: reduce(lambda x, y: x.union(y), sets, set())
-
-
-def min_set_cover(U, sets):
-    # brute force implementation ...
-    min_combinations = list()
-    for size in range(1, len(sets) + 1):
-        for comb in combinations(sets, size):
-            if len(U.difference(sets_union(comb))) == 0:
-                if comb not in min_combinations:
-                    min_combinations.append(comb)
-        if min_combinations: break
-    return min_combinations
-
-
-def ak_min_set_cover(U, sets, set_ids):
-    def setlimits():
-        resource.setrlimit(resource.RLIMIT_CPU, (60, 60))
-
-    tempdir = tempfile.mkdtemp()
-    with open(os.path.join(tempdir, "instance"), "w") as instance:
-        instance.write(' '.join(map(str, sorted(U))) + '\n')
-        for sc_id, s in izip(set_ids, sets):
-            instance.write(str(sc_id) + ' ' + ' '.join(map(str, sorted(s))) + '\n')
-
-    with open(os.path.join(tempdir, "solution"), "w") as solution:
-        solver = subprocess.Popen([os.path.join(config.CONTRIB_DIR, 'setcover/akmaxsat'),
-                                   os.path.join(tempdir, "instance")], stdout=subprocess.PIPE, preexec_fn=setlimits)
-        solution.write(solver.communicate()[0])
-
-    sol = subprocess.Popen([os.path.join(config.CONTRIB_DIR, 'setcover/verify_msc'), os.path.join(tempdir, "instance"),
-                            os.path.join(tempdir, "solution")], stdout=subprocess.PIPE, preexec_fn=setlimits)
-    output = sol.communicate()[0]
-    min_sets = []
-    for line in output.splitlines():
-        min_sets.append(map(int, line.split()))
-
-    return min_sets
\ No newline at end of file
+import time
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def _popcount(x):
+    return bin(x).count('1')
+
+
+def _bits(x):
+    """ Yields the positions of the set bits of the integer x """
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+def exact_min_set_cover(U, sets, set_ids, time_budget=None, max_covers=1000):
+    """ Returns all minimum set covers of U (at most max_covers) as lists of the
+        IDs of the sets in the cover.
+
+        The sets are encoded as integer bitsets over the elements of U. Sets that
+        are a subset of another set are left out of the search and added back by
+        exchanging them with the sets of the covers found. Elements that are
+        covered whenever another element is covered are left out as well. The
+        search branches on the uncovered element with the fewest covering sets,
+        prunes with a lower bound from elements that can't be covered by the same
+        set and memoizes results by the set of uncovered elements.
+
+        If the search takes longer than time_budget seconds, the best cover found
+        so far (greedy) is returned.
+    """
+    U = set(U)
+    if not U: return []
+    position = dict((e, pos) for pos, e in enumerate(sorted(U)))
+    masks = []
+    for s in sets:
+        mask = 0
+        for e in s:
+            if e in position: mask |= 1 << position[e]
+        masks.append(mask)
+    universe = (1 << len(U)) - 1
+    if reduce(lambda x, y: x | y, masks, 0) != universe: return []
+
+    # dominance pruning: only keep one of each distinct maximal set
+    core = []
+    for i, mask in sorted(enumerate(masks), key=lambda x: -_popcount(x[1])):
+        if mask and not any(mask | masks[j] == masks[j] for j in core):
+            core.append(i)
+
+    # bitset over the core sets containing each element. An element whose
+    # sets are a superset of another element's sets is covered automatically.
+    element_sets = set()
+    for e in xrange(len(U)):
+        element_sets.add(sum(1 << k for k, i in enumerate(core) if masks[i] >> e & 1))
+    candidates = []
+    for c in sorted(element_sets, key=_popcount):
+        if not any(c | d == c for d in candidates):
+            candidates.append(c)
+    # masks of the core sets over the remaining elements
+    core_masks = [sum(1 << e for e, c in enumerate(candidates) if c >> k & 1) for k in xrange(len(core))]
+    max_size = max(_popcount(mask) for mask in core_masks)
+
+    def lower_bound(uncovered):
+        # elements no two of which are covered by a common set each need their own set
+        independent, used = 0, 0
+        for e in sorted(_bits(uncovered), key=lambda e: _popcount(candidates[e])):
+            if not candidates[e] & used:
+                independent += 1
+                used |= candidates[e]
+        return max(independent, -(-_popcount(uncovered) // max_size))
+
+    deadline = None if time_budget is None else time.time() + time_budget
+    memo = dict() # uncovered -> (True, size, covers) or (False, lower bound)
+
+    def solve(uncovered, limit):
+        """ Returns (size, covers) of the minimum covers of uncovered if size <= limit, else None """
+        if uncovered == 0: return 0, set([frozenset()])
+        if limit <= 0: return None
+        m = memo.get(uncovered)
+        if m is not None:
+            if m[0]: return (m[1], m[2]) if m[1] <= limit else None
+            if m[1] > limit: return None
+        if deadline is not None and time.time() > deadline: raise _BudgetExceeded()
+        if lower_bound(uncovered) > limit:
+            memo[uncovered] = (False, limit + 1)
+            return None
+
+        e = min(_bits(uncovered), key=lambda e: _popcount(candidates[e]))
+        best, covers = None, set()
+        for k in _bits(candidates[e]):
+            result = solve(uncovered & ~core_masks[k], (limit if best is None else best) - 1)
+            if result is None: continue
+            if best is None or result[0] + 1 < best:
+                best, covers = result[0] + 1, set()
+            if len(covers) < max_covers:
+                covers.update(c | frozenset([k]) for c in result[1])
+        if best is None:
+            memo[uncovered] = (False, limit + 1)
+            return None
+        memo[uncovered] = (True, best, covers)
+        return best, covers
+
+    # greedy cover as upper bound and fallback
+    reduced_universe = (1 << len(candidates)) - 1
+    greedy, uncovered = [], reduced_universe
+    while uncovered:
+        k = max(xrange(len(core)), key=lambda k: _popcount(core_masks[k] & uncovered))
+        greedy.append(core[k])
+        uncovered &= ~core_masks[k]
+
+    try:
+        result = None
+        for limit in xrange(lower_bound(reduced_universe), len(greedy) + 1):
+            result = solve(reduced_universe, limit)
+            if result is not None: break
+        covers = set(frozenset(core[k] for k in c) for c in result[1])
+    except _BudgetExceeded:
+        return [sorted(set_ids[i] for i in greedy)]
+
+    # add back the left out sets by exchanging single sets of the covers
+    queue = list(covers)
+    while queue and len(covers) < max_covers:
+        cover = queue.pop()
+        for i in cover:
+            rest = cover - frozenset([i])
+            missing = universe & ~reduce(lambda x, j: x | masks[j], rest, 0)
+            for j in xrange(len(masks)):
+                if j not in cover and masks[j] & missing == missing:
+                    new_cover = rest | frozenset([j])
+                    if new_cover not in covers:
+                        covers.add(new_cover)
+                        queue.append(new_cover)
+
+    return sorted(sorted(set_ids[i] for i in cover) for cover in covers)[:max_covers]
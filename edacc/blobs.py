@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.blobs
+    -----------
+
+    Chunked access to large BLOB columns.
+
+    Loading a BLOB column through the ORM or a plain SELECT transfers the
+    whole value at once. Blob reads the header and the length of a value in
+    one query and then the data in chunks of CHUNK_SIZE bytes with SUBSTRING,
+    so values of any size can be processed in constant memory. get_windows
+    reads only the beginning and the end of values (e.g. for previews).
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import struct
+
+from sqlalchemy import func
+from sqlalchemy.sql import select
+
+from edacc import utils
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Blob(object):
+    """ BLOB column value of a single row. Raises KeyError if the row doesn't exist.
+        If the length is passed (e.g. queried for several rows at once) the
+        header and length aren't queried and the header is empty.
+
+        header: the first header_length bytes of the value
+        length: the length of the value in bytes (0 if it is NULL)
+    """
+
+    def __init__(self, db, table_name, column_name, id_column_name, id, header_length=0, length=None):
+        self.db = db
+        table = db.metadata.tables[table_name]
+        self.column = table.c[column_name]
+        self.where = table.c[id_column_name] == id
+        if length is not None:
+            self.header, self.length = '', length
+            return
+        row = db.session.connection().execute(
+            select([func.substring(self.column, 1, header_length), func.length(self.column)], self.where)).first()
+        if row is None: raise KeyError(id)
+        self.header = row[0] or ''
+        self.length = row[1] or 0
+
+    def chunks(self, start=0, length=None, chunk_size=CHUNK_SIZE):
+        """ Generator of the bytes start to start + length (default: the end)
+            of the value in chunks of chunk_size bytes. The chunks are read on
+            a connection of its own, they can be consumed after the request's
+            session has been removed (e.g. by streamed responses).
+        """
+        end = self.length if length is None else min(self.length, start + length)
+        if start >= end: return
+        conn = self.db.engine.connect()
+        try:
+            for pos in xrange(start, end, chunk_size):
+                # SUBSTRING positions start at 1
+                chunk = conn.execute(select([func.substring(self.column, pos + 1, min(chunk_size, end - pos))],
+                                            self.where)).scalar()
+                if not chunk: break # the value was shortened meanwhile
+                yield chunk
+        finally:
+            conn.close()
+
+
+def get_windows(db, table_name, column_names, id_column_name, id, size):
+    """ Returns the lengths and the first and last size bytes of BLOB values
+        of a single row in one query as dictionary column name -> (length, head, tail).
+        The tail starts after the head, i.e. it is empty if the value is shorter than
+        size bytes. The entries are (None, None, None) for NULL values.
+        Raises KeyError if the row doesn't exist.
+    """
+    table = db.metadata.tables[table_name]
+    columns = []
+    for name in column_names:
+        column = table.c[name]
+        length = func.length(column)
+        columns += [length, func.substring(column, 1, size),
+                    func.substring(column, func.greatest(length - (size - 1), size + 1))]
+    row = db.session.connection().execute(select(columns, table.c[id_column_name] == id)).first()
+    if row is None: raise KeyError(id)
+    return dict((name, tuple(row[3 * i: 3 * i + 3])) for i, name in enumerate(column_names))
+
+
+class InstanceBlob(Blob):
+    """ Instance blob, which is LZMA compressed if it starts with 'LZMA'
+        (see utils.lzma_compress for the format of the compressed data).
+
+        compressed: whether the instance is compressed
+        size: the size of the stored (possibly compressed) instance without the 'LZMA' prefix
+        uncompressed_size: the size of the instance, None if it is compressed without size information
+    """
+
+    def __init__(self, db, id):
+        # prefix, LZMA properties (5 bytes) and uncompressed size (8 bytes)
+        super(InstanceBlob, self).__init__(db, 'Instances', 'instance', 'idInstance', id, header_length=4 + 13)
+        self.compressed = self.header[:4] == 'LZMA'
+        if self.compressed:
+            self.size = self.length - 4
+            coded_length = struct.unpack('<Q', self.header[9:17])[0] if len(self.header) == 17 else None
+            self.uncompressed_size = coded_length if coded_length != 0xFFFFFFFFFFFFFFFF else None
+        else:
+            self.size = self.uncompressed_size = self.length
+
+    def stored_chunks(self, chunk_size=CHUNK_SIZE):
+        """ Generator of the stored (possibly compressed) instance in chunks """
+        return self.chunks(4 if self.compressed else 0, chunk_size=chunk_size)
+
+    def decompressed_chunks(self, chunk_size=CHUNK_SIZE):
+        """ Generator of the (decompressed) instance in chunks of at most chunk_size bytes """
+        if self.compressed:
+            return utils.lzma_decompress_chunks(self.stored_chunks(chunk_size), chunk_size)
+        return self.chunks(chunk_size=chunk_size)
+
+    def open(self):
+        """ Returns a read-only file-like object of the (decompressed) instance """
+        return utils.IterReader(self.decompressed_chunks())
+
+    def head(self, n):
+        """ Returns the first n bytes of the (decompressed) instance """
+        reader = self.open()
+        try:
+            return reader.read(n)
+        finally:
+            reader.close()
+
+    def tail(self, n):
+        """ Returns the last n bytes of the (decompressed) instance.
+            Compressed instances have to be decompressed completely. """
+        if not self.compressed:
+            return ''.join(self.chunks(max(0, self.length - n)))
+        tail = ''
+        for chunk in self.decompressed_chunks():
+            tail = (tail + chunk)[-n:]
+        return tail
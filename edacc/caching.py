@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.caching
+    -------------
+
+    Two-tier cache backend for Flask-Cache.
+
+    Values are pickled once and kept in a size-bounded in-process LRU cache
+    (config.CACHE_MEMORY_SIZE bytes) in front of a cache shared by all web
+    server processes: memcached at config.MEMCACHED_HOST if config.CACHING
+    is enabled, otherwise files in TEMP_DIR/cache limited to
+    config.CACHE_DIR_SIZE bytes (least recently used files are deleted first).
+
+    The keys of memoized functions start with the function name followed
+    by ':' (see Cache), hits, misses and transferred bytes are counted per
+    such key prefix, see TwoTierCache.get_stats.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import os, time, hashlib
+import cPickle as pickle
+from collections import OrderedDict
+from threading import Lock
+
+from flask.ext.cache import Cache as FlaskCache
+
+from edacc import config
+
+CACHE_DIR = os.path.join(config.TEMP_DIR, 'cache')
+
+# the directory size is recounted after this many writes to notice the writes of other processes
+RECOUNT_INTERVAL = 100
+
+# seconds a value read from a shared cache that doesn't tell its expiry (memcached)
+# is kept in the in-process cache
+UNKNOWN_EXPIRY_TIMEOUT = 10
+
+
+def _prefixed(make_cache_key):
+    def prefixed_cache_key(f, *args, **kwargs):
+        return getattr(f, '__name__', 'memoized') + ':' + make_cache_key(f, *args, **kwargs)
+
+    return prefixed_cache_key
+
+
+class Cache(FlaskCache):
+    """ Flask-Cache extension whose memoize keys are prefixed by the name of the function """
+
+    # Flask-Cache up to 0.11
+    def memoize_make_cache_key(self, make_name=None):
+        return _prefixed(super(Cache, self).memoize_make_cache_key(make_name))
+
+    # Flask-Cache 0.12 and later
+    def _memoize_make_cache_key(self, make_name=None, timeout=None):
+        return _prefixed(super(Cache, self)._memoize_make_cache_key(make_name, timeout))
+
+
+class MemoryCache(object):
+    """ In-process LRU cache of strings limited to max_size bytes """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict() # key -> (expiry time, data)
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None: return None
+            if entry[0] <= time.time():
+                self.size -= len(entry[1])
+                return None
+            self.entries[key] = entry # most recently used
+            return entry[1]
+
+    def set(self, key, data, timeout):
+        with self.lock:
+            # an older value of the key must not outlive a new value that doesn't fit
+            self._remove(key)
+            if len(data) > self.max_size: return
+            self.entries[key] = (time.time() + timeout, data)
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None: self.size -= len(entry[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class FileSystemCache(object):
+    """ Cache of strings in files of a directory limited to max_size bytes """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.size = None # estimated size of the directory, counted on the first write
+        self.writes = 0
+        self.lock = Lock()
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+
+    def _filename(self, key):
+        return os.path.join(self.directory, hashlib.md5(key).hexdigest())
+
+    def get(self, key):
+        """ Returns the tuple (data, expiry time) or (None, None) """
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                expires = float(f.readline())
+                if expires <= time.time():
+                    os.remove(filename)
+                    return None, None
+                data = f.read()
+            # mark as recently used
+            os.utime(filename, None)
+            return data, expires
+        except (IOError, OSError, ValueError):
+            return None, None
+
+    def set(self, key, data, timeout):
+        filename = self._filename(key)
+        temp_filename = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            f.write('%r\n' % (time.time() + timeout,))
+            f.write(data)
+        os.rename(temp_filename, filename)
+        with self.lock:
+            self.writes += 1
+            if self.size is None or self.writes % RECOUNT_INTERVAL == 0:
+                self.size = self._count()
+            else:
+                self.size += len(data)
+            if self.size > self.max_size:
+                self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'): continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def _count(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """ Deletes the least recently used files until the directory is
+            smaller than 90% of the maximum size. """
+        entries = self._entries()
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if self.size <= 0.9 * self.max_size: break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            self.size -= size
+
+    def clear(self):
+        for _, _, name in self._entries():
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        with self.lock:
+            self.size = 0
+
+
+class MemcachedCache(object):
+    """ Cache of strings in memcached """
+
+    def __init__(self, servers, key_prefix='edacc'):
+        from werkzeug.contrib.cache import MemcachedCache
+        self.memcached = MemcachedCache(servers, key_prefix=key_prefix)
+
+    def get(self, key):
+        """ Returns the tuple (data, None), memcached doesn't tell the expiry time """
+        return self.memcached.get(hashlib.md5(key).hexdigest()), None
+
+    def set(self, key, data, timeout):
+        self.memcached.set(hashlib.md5(key).hexdigest(), data, timeout)
+
+    def delete(self, key):
+        self.memcached.delete(hashlib.md5(key).hexdigest())
+
+    def clear(self):
+        self.memcached.clear()
+
+
+def key_prefix(key):
+    """ Returns the part of the key the statistics are grouped by """
+    return key.split(':', 1)[0] if ':' in key else '(other)'
+
+
+class TwoTierCache(object):
+    """ Cache with the interface of the werkzeug caches that looks up the
+        in-process cache first and the shared cache second. """
+
+    def __init__(self, shared, memory_size, default_timeout=300):
+        self.shared = shared
+        self.memory = MemoryCache(memory_size)
+        self.default_timeout = default_timeout
+        self.stats = dict()
+        self.stats_lock = Lock()
+
+    def _count(self, key, event, num_bytes=0):
+        prefix = key_prefix(key)
+        with self.stats_lock:
+            stats = self.stats.get(prefix)
+            if stats is None:
+                stats = self.stats[prefix] = dict(memory_hits=0, shared_hits=0, misses=0, sets=0,
+                                                  bytes_read=0, bytes_written=0)
+            stats[event] += 1
+            if event == 'sets':
+                stats['bytes_written'] += num_bytes
+            else:
+                stats['bytes_read'] += num_bytes
+
+    def get_stats(self):
+        """ Returns a dictionary key prefix -> dictionary with the numbers of
+            memory_hits, shared_hits, misses, sets, bytes_read and bytes_written """
+        with self.stats_lock:
+            return dict((prefix, dict(stats)) for prefix, stats in self.stats.iteritems())
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is not None:
+            self._count(key, 'memory_hits', len(data))
+        else:
+            data, expires = self.shared.get(key)
+            if data is None:
+                self._count(key, 'misses')
+                return None
+            self._count(key, 'shared_hits', len(data))
+            if expires is None:
+                timeout = min(self.default_timeout, UNKNOWN_EXPIRY_TIMEOUT)
+            else:
+                timeout = expires - time.time()
+            if timeout > 0:
+                self.memory.set(key, data, timeout)
+        return pickle.loads(data)
+
+    def get_many(self, *keys):
+        return [self.get(key) for key in keys]
+
+    def get_dict(self, *keys):
+        return dict((key, self.get(key)) for key in keys)
+
+    def set(self, key, value, timeout=None):
+        if timeout is None: timeout = self.default_timeout
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._count(key, 'sets', len(data))
+        self.memory.set(key, data, timeout)
+        self.shared.set(key, data, timeout)
+
+    def add(self, key, value, timeout=None):
+        if self.get(key) is not None: return False
+        self.set(key, value, timeout)
+        return True
+
+    def set_many(self, mapping, timeout=None):
+        for key, value in mapping.iteritems():
+            self.set(key, value, timeout)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.shared.delete(key)
+
+    def delete_many(self, *keys):
+        for key in keys:
+            self.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        self.shared.clear()
+
+
+def two_tier(app, flask_config, args, kwargs):
+    """ Flask-Cache backend factory (CACHE_TYPE = 'edacc.caching.two_tier') """
+    if config.CACHING:
+        shared = MemcachedCache([config.MEMCACHED_HOST])
+    else:
+        shared = FileSystemCache(CACHE_DIR, config.CACHE_DIR_SIZE)
+    return TwoTierCache(shared, config.CACHE_MEMORY_SIZE, kwargs.get('default_timeout', 300))
@@ -9,12 +9,82 @@
 # Enable or disable printing of debug messages, disable in production use!
 DEBUG = True
 
-# Enable or disable memcached usage to cache expensive calculation results
+# Enable or disable memcached usage to cache expensive calculation results,
+# if disabled they are cached in TEMP_DIR/cache
 CACHING = False
-# Cache timeout in seconds
-CACHE_TIMEOUT = 5
+# Default cache timeout in seconds of values that are cached without timeout
+# (e.g. the version hashes of memoized functions, which invalidate all their results when they expire)
+CACHE_TIMEOUT = 7 * 24 * 60 * 60
 # Host and port of the memcache daemon
 MEMCACHED_HOST = '127.0.0.1:11211'
+# Maximum size in bytes of the cache in TEMP_DIR/cache
+CACHE_DIR_SIZE = 1024 * 1024 * 1024
+# Maximum size in bytes of the in-process cache each web server process keeps
+# in front of memcached or TEMP_DIR/cache
+CACHE_MEMORY_SIZE = 64 * 1024 * 1024
+
+# Number of seconds the progress statistics of an experiment are shared between
+# all clients polling the experiment progress page
+PROGRESS_STATS_TTL = 3
+
+# Number of seconds the version stamp of the results of an experiment, which is
+# part of the cache keys of analysis pages and plots, is reused before it is queried again
+DATA_VERSION_TTL = 5
+
+# Number of seconds the search for all minimum solver sets covering the solved
+# instances (SOTA page) may take before the best set found so far is shown
+SET_COVER_TIME_BUDGET = 10
+
+# Implementation of the statistics functions (correlations, Kolmogorow-Smirnow and
+# Wilcoxon tests, probabilistic domination): 'native' (NumPy/SciPy) or 'R' (rpy2).
+# Survival tests always use R.
+STATISTICS_BACKEND = 'native'
+
+# Number of worker processes that run the survival tests of the survival ranking,
+# each with its own R instance. 0 runs the tests in the web server process.
+SURVIVAL_TEST_PROCESSES = 4
+# Survival test processes are killed after this many seconds per test
+SURVIVAL_TEST_TIMEOUT = 120
+# and replaced after this many tests
+SURVIVAL_TEST_WORKER_MAX_TASKS = 1000
+# Time in seconds the results of survival tests are kept in TEMP_DIR/survival-tests after their last use
+SURVIVAL_TEST_RESULT_TTL = 30 * 24 * 60 * 60
+
+# Number of worker processes that render plots, each with its own R instance.
+# 0 renders the plots in the web server process (one at a time).
+PLOT_PROCESSES = 4
+# Plot rendering processes are killed after this many seconds per plot
+PLOT_TIMEOUT = 300
+# and replaced after rendering this many plots
+PLOT_WORKER_MAX_TASKS = 200
+
+# Maximum size in bytes of the rendered plots cached in TEMP_DIR/plot-cache (0 disables the cache)
+PLOT_CACHE_SIZE = 512 * 1024 * 1024
+
+# Maximum number of instances and solver configurations shown by the runtime matrix plot,
+# larger matrices are downsampled by averaging blocks of adjacent cells
+RUNTIME_MATRIX_PLOT_RESOLUTION = 600
+
+# Number of worker processes running background tasks (rankings, set covers, model fitting)
+# per web server process. 0 runs the tasks on a thread of the web server process.
+TASK_PROCESSES = 2
+# Task processes are killed after this many seconds per task
+TASK_TIMEOUT = 60 * 60
+# and replaced after running this many tasks
+TASK_WORKER_MAX_TASKS = 100
+
+# Time in seconds the results of background tasks are kept in TEMP_DIR/tasks
+TASK_RESULT_TTL = 7 * 24 * 60 * 60
+
+# Number of rows fetched from the database and written per chunk of streamed CSV downloads
+CSV_BATCH_SIZE = 1000
+
+# Number of experiments whose jobs are indexed in memory for the search box of the
+# experiment progress page per web server process
+JOB_SEARCH_INDEXES = 8
+
+# Maximum size in bytes of the packages of public solvers saved in TEMP_DIR/solver-packages
+SOLVER_PACKAGE_DIR_SIZE = 2 * 1024 * 1024 * 1024
 
 # Directory the web application can use to save temporary files (required)
 TEMP_DIR = '/tmp/edacc-webfrontend'
@@ -55,9 +125,6 @@ DEFAULT_MAIL_SENDER = "bla@gmail.com"
 # folder used to upload benchmarks to
 UPLOAD_FOLDER = "/tmp"
 
-# folder with external binaries etc.
-CONTRIB_DIR = "contrib"
-
 # List of databases this server connects to at startup
 # Format: Tuples of username, password, database, label (used on the pages), hidden
 DEFAULT_DATABASES = (
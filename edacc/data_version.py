@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.data_version
+    ------------------
+
+    Cheap version stamps of the results of experiments for cache keys.
+
+    The stamp of an experiment is the triple (latest date_modified, highest
+    job ID, number of jobs) of its ExperimentResults rows. The maxima are
+    single index lookups: MySQL resolves MAX of a column that follows the
+    equality-filtered prefix of an index without scanning rows. The count
+    scans the experiment's entries of the same index, which is much cheaper
+    than reading the rows. This needs an index on (Experiment_idExperiment,
+    date_modified), see the installation steps in README.rst; idJob is part
+    of every InnoDB index as primary key. Modified and added jobs change the
+    maxima, deleted jobs (e.g. when the number of runs of an experiment is
+    reduced) change the count.
+
+    Stamps are kept in-process for config.DATA_VERSION_TTL seconds, so
+    changes of the results are seen after at most that time.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.sql import select
+
+from edacc import config, utils
+
+_stamps = utils.SingleFlightCache(config.DATA_VERSION_TTL)
+
+
+def _probe(db, experiment_id):
+    table = db.metadata.tables['ExperimentResults']
+    s = select([func.max(table.c['date_modified']), func.max(table.c['idJob']), func.count(table.c['idJob'])],
+               table.c['Experiment_idExperiment'] == experiment_id)
+    return tuple(db.session.connection().execute(s).fetchone())
+
+
+def get_data_version(db, experiment_id):
+    """ Returns the version stamp of the results of the experiment """
+    return _stamps.get((db.database, experiment_id), lambda: _probe(db, experiment_id))
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.job_search
+    ----------------
+
+    In-memory search index of the jobs of experiments for the search box
+    of the experiment progress datatable.
+
+    A job matches a search term if the term is contained (ignoring case)
+    in its ID, seed or run or in the name of its instance, solver
+    configuration, status, result code, grid queue, compute node or compute
+    node IP. The texts are kept once per distinct value (e.g. per instance),
+    the jobs only as arrays of codes, so a search scans the few distinct
+    texts and then the code arrays with NumPy instead of all joined rows.
+    Texts are read when a value is first indexed, renamed instances or
+    solver configurations are found by their old names until the index is
+    evicted.
+
+    The index of an experiment is built by a background thread the first time
+    it is searched and then updated with the jobs whose date_modified changed
+    since the last update (minus aggregates.WATERMARK_OVERLAP), when the
+    version stamp of the experiment data (see data_version) changes. Deleted
+    jobs stay in the index; the job query filters them out.
+    config.JOB_SEARCH_INDEXES indexes are kept per web server process.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import numpy
+from collections import OrderedDict
+from threading import Thread, Lock
+
+from edacc import config, data_version
+from edacc.aggregates import WATERMARK_OVERLAP
+
+# searches matching at most this many jobs select them by their IDs, otherwise
+# the search is translated to conditions on the columns of ExperimentResults
+MAX_ID_LIST = 10000
+
+# number of search results kept per index to narrow down the search while a term is typed
+RESULT_CACHE_SIZE = 16
+
+_indexes = OrderedDict() # (database, experiment ID) -> JobSearchIndex, least recently used first
+_lock = Lock()
+
+
+class Dimension(object):
+    """ Distinct values of a job attribute, numbered consecutively (codes),
+        with the text a search term is looked up in. """
+
+    def __init__(self, column, lookup=None):
+        self.column = column # column of ExperimentResults
+        self.lookup = lookup # query of (key, text) rows for keys (format parameter), None if the key is the text
+        self.keys = []
+        self.texts = []
+        self.code_by_key = dict()
+
+    def encode(self, conn, keys):
+        """ Returns the codes of the keys, assigning codes to new keys """
+        new_keys = list(set(k for k in keys if k not in self.code_by_key))
+        if new_keys:
+            if self.lookup is None:
+                text_by_key = dict((k, k) for k in new_keys)
+            else:
+                text_by_key = dict()
+                for key_chunk in (new_keys[i:i + 1000] for i in xrange(0, len(new_keys), 1000)):
+                    text_by_key.update(conn.execute(self.lookup % ", ".join(["%s"] * len(key_chunk)),
+                                                    tuple(key_chunk)).fetchall())
+            for k in new_keys:
+                self.code_by_key[k] = len(self.keys)
+                self.keys.append(k)
+                text = text_by_key.get(k)
+                if isinstance(text, str):
+                    # the connections return byte strings (use_unicode=0), search terms are unicode
+                    text = text.decode('utf-8', 'replace')
+                self.texts.append(text.lower() if isinstance(text, basestring) else None)
+        return numpy.array([self.code_by_key[k] for k in keys], dtype=numpy.int32)
+
+    def matching(self, term):
+        """ Returns a boolean array: code -> whether the text of the value contains the term """
+        return numpy.array([text is not None and term in text for text in self.texts], dtype=bool)
+
+
+def _contains_digits(numbers, digits):
+    """ Returns a boolean array: whether the decimal representation of the numbers contains the digits """
+    length, value = len(digits), int(digits)
+    rest = numpy.abs(numbers)
+    mask = rest == 0 if digits == '0' else numpy.zeros(len(numbers), dtype=bool)
+    # compare the lowest digits and shift the numbers until they are shorter than the term
+    while True:
+        long_enough = rest >= 10 ** (length - 1)
+        if not long_enough.any(): break
+        mask |= long_enough & (rest % 10 ** length == value)
+        rest = rest // 10
+    return mask
+
+
+def _normalize(term):
+    """ Returns the search term as lower-case unicode string """
+    if isinstance(term, str): term = term.decode('utf-8', 'replace')
+    return term.lower()
+
+
+class JobSearchIndex(object):
+    """ Search index of the jobs of an experiment """
+
+    def __init__(self, db, experiment_id):
+        self.db = db
+        self.experiment_id = experiment_id
+        self.lock = Lock()
+        self.ready = False
+        self.version = None # data version of the last update
+        self.watermark = None # latest date_modified of the indexed jobs
+        self.dimensions = [
+            Dimension('Instances_idInstance', "SELECT idInstance, name FROM Instances WHERE idInstance IN (%s)"),
+            Dimension('SolverConfig_idSolverConfig',
+                      "SELECT idSolverConfig, name FROM SolverConfig WHERE idSolverConfig IN (%s)"),
+            Dimension('status', "SELECT statusCode, description FROM StatusCodes WHERE statusCode IN (%s)"),
+            Dimension('resultCode', "SELECT resultCode, description FROM ResultCodes WHERE resultCode IN (%s)"),
+            Dimension('computeQueue', "SELECT idgridQueue, name FROM gridQueue WHERE idgridQueue IN (%s)"),
+            Dimension('computeNode'),
+            Dimension('computeNodeIP'),
+        ]
+        self.job_ids = numpy.zeros(0, dtype=numpy.int64) # sorted
+        self.numbers = numpy.zeros((2, 0), dtype=numpy.int64) # seed, run
+        self.codes = numpy.zeros((len(self.dimensions), 0), dtype=numpy.int32)
+        self.results = OrderedDict() # term -> positions of the matching jobs
+
+    def update(self, version):
+        """ Adds the jobs that were added or modified since the last update """
+        with self.lock:
+            if self.version != version:
+                self._update(version)
+
+    def _update(self, version):
+        conn = self.db.engine.connect()
+        try:
+            query = "SELECT idJob, seed, run, date_modified, " + \
+                    ", ".join(d.column for d in self.dimensions) + \
+                    " FROM ExperimentResults WHERE Experiment_idExperiment = %s"
+            params = (self.experiment_id, )
+            if self.watermark is not None:
+                # date_modified is set before the modifying transaction commits, jobs committed
+                # after the last update can have an older date_modified than the watermark
+                query += " AND date_modified >= %s"
+                params += (self.watermark - WATERMARK_OVERLAP, )
+            rows = conn.execute(query, params).fetchall()
+            if not rows:
+                self.version = version
+                return
+            columns = zip(*rows)
+            job_ids = numpy.array(columns[0], dtype=numpy.int64)
+            numbers = numpy.array([[n or 0 for n in columns[1]], [n or 0 for n in columns[2]]], dtype=numpy.int64)
+            codes = numpy.array([d.encode(conn, columns[4 + i]) for i, d in enumerate(self.dimensions)],
+                                dtype=numpy.int32)
+            watermark = max(d for d in columns[3] if d is not None) if any(columns[3]) else self.watermark
+        finally:
+            conn.close()
+
+        # overwrite the known jobs, insert the new ones
+        positions = numpy.searchsorted(self.job_ids, job_ids)
+        known = positions < len(self.job_ids)
+        known[known] = self.job_ids[positions[known]] == job_ids[known]
+        self.numbers[:, positions[known]] = numbers[:, known]
+        self.codes[:, positions[known]] = codes[:, known]
+        if not known.all():
+            job_ids = numpy.concatenate((self.job_ids, job_ids[~known]))
+            order = numpy.argsort(job_ids, kind='mergesort')
+            self.job_ids = job_ids[order]
+            self.numbers = numpy.concatenate((self.numbers, numbers[:, ~known]), axis=1)[:, order]
+            self.codes = numpy.concatenate((self.codes, codes[:, ~known]), axis=1)[:, order]
+        self.watermark = watermark
+        self.version = version
+        self.results.clear() # positions have changed
+
+    def search(self, term):
+        """ Returns the sorted array of the IDs of the jobs matching the search term """
+        term = _normalize(term)
+        with self.lock:
+            # the jobs matching a term are a subset of the jobs matching any part of it
+            candidates = None
+            for previous_term, positions in reversed(self.results.items()):
+                if previous_term in term:
+                    candidates = positions
+                    break
+            codes = self.codes if candidates is None else self.codes[:, candidates]
+            mask = numpy.zeros(codes.shape[1], dtype=bool)
+            for i, dimension in enumerate(self.dimensions):
+                mask |= dimension.matching(term)[codes[i]]
+            if term.isdigit():
+                job_ids = self.job_ids if candidates is None else self.job_ids[candidates]
+                numbers = self.numbers if candidates is None else self.numbers[:, candidates]
+                mask |= _contains_digits(job_ids, term)
+                for row in numbers:
+                    mask |= _contains_digits(row, term)
+            positions = numpy.nonzero(mask)[0] if candidates is None else candidates[mask]
+            self.results[term] = positions
+            if len(self.results) > RESULT_CACHE_SIZE:
+                self.results.popitem(last=False)
+            return self.job_ids[positions]
+
+    def column_conditions(self, term):
+        """ Returns the SQL condition and parameters on the columns of ExperimentResults
+            that are true for the jobs matching the term. """
+        term = _normalize(term)
+        conditions, params = [], []
+        for dimension in self.dimensions:
+            keys = [dimension.keys[code] for code in numpy.nonzero(dimension.matching(term))[0]]
+            if keys:
+                conditions.append("ExperimentResults." + dimension.column + " IN (" +
+                                  ", ".join(["%s"] * len(keys)) + ")")
+                params += keys
+        if term.isdigit():
+            for column in ('idJob', 'seed', 'run'):
+                conditions.append("ExperimentResults." + column + " LIKE %s")
+                params.append('%' + term + '%')
+        return "(" + (" OR ".join(conditions) or "0 = 1") + ")", params
+
+    def build(self, version):
+        """ Indexes all jobs of the experiment, runs in a thread of its own """
+        try:
+            self.update(version)
+            self.ready = True
+        except Exception:
+            # drop the index, the next search builds it again
+            key = (self.db.database, self.experiment_id)
+            with _lock:
+                if _indexes.get(key) is self: del _indexes[key]
+            raise
+
+
+def search_condition(db, experiment_id, term):
+    """ Returns the SQL condition and its parameters that select the jobs of the
+        experiment matching the search term (see the module documentation), or
+        None if the index of the experiment isn't built yet.
+    """
+    key = (db.database, experiment_id)
+    version = data_version.get_data_version(db, experiment_id)
+    with _lock:
+        index = _indexes.pop(key, None)
+        if index is None:
+            index = JobSearchIndex(db, experiment_id)
+            thread = Thread(target=index.build, args=(version, ))
+            thread.daemon = True
+            thread.start()
+        _indexes[key] = index # most recently used
+        while len(_indexes) > config.JOB_SEARCH_INDEXES:
+            _indexes.popitem(last=False)
+    if not index.ready: return None
+
+    index.update(version)
+    job_ids = index.search(term)
+    if len(job_ids) <= MAX_ID_LIST:
+        if len(job_ids) == 0: return "(0 = 1)", []
+        return "ExperimentResults.idJob IN (" + ", ".join(["%s"] * len(job_ids)) + ")", \
+               [int(id) for id in job_ids]
+    return index.column_conditions(term)
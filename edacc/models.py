@@ -11,10 +11,10 @@
     :license: MIT, see LICENSE for details.
 """
 
-from collections import namedtuple
 from lxml import etree
 from cStringIO import StringIO
 
+import numpy
 import sqlalchemy
 from sqlalchemy import create_engine, MetaData, func
 from sqlalchemy.engine.url import URL
@@ -23,7 +23,7 @@ from sqlalchemy.orm import relation, relationship, joinedload_all, backref
 from sqlalchemy.sql import and_, not_, select, label, expression, literal
 from sqlalchemy import schema
 
-from edacc import config, utils
+from edacc import config, utils, result_matrix, aggregates, solved_index, statistics, data_version, blobs
 from edacc.constants import *
 
 
@@ -112,52 +112,24 @@ class EDACCDatabase(object):
                 except:
                     return None
 
+            def get_blob(self, db):
+                """ Returns the blobs.InstanceBlob of the instance for chunked
+                    and incremental access to the (decompressed) instance. """
+                return blobs.InstanceBlob(db, self.idInstance)
+
             def get_instance(self, db):
                 """
                     Decompresses the instance blob if necessary and returns it as string.
                     EDACC can store compressed and uncompressed instances. To distinguish
                     between them, we prepend the ASCII characters "LZMA" to a compressed instance.
+                    Use get_blob to process large instances in chunks.
                 """
-                table = db.metadata.tables['Instances']
-                c_instance = table.c['instance']
-                c_id = table.c['idInstance']
-                # get prefix
-                instance_header = db.session.connection().execute(select([func.substring(c_instance, 1, 4)],
-                                                                         c_id == self.idInstance).select_from(
-                    table)).first()[0]
-                data_length = db.session.connection().execute(select([func.length(c_instance)],
-                                                                     c_id == self.idInstance).select_from(
-                    table)).first()[0]
-                if data_length > 32 * 1024 * 1024:
-                    return "Instance too large for processing. Please use the EDACC GUI application."
-                if instance_header == 'LZMA': # compressed instance?
-                    # get blob without LZMA prefix
-                    instance_blob = db.session.connection().execute(select([func.substring(c_instance, 5)],
-                                                                           c_id == self.idInstance).select_from(
-                        table)).first()[0]
-                    return utils.lzma_decompress(instance_blob)
-                else:
-                    return self.instance
+                return ''.join(self.get_blob(db).decompressed_chunks())
 
             def get_compressed_instance(self, db):
-                table = db.metadata.tables['Instances']
-                c_instance = table.c['instance']
-                c_id = table.c['idInstance']
-                # get prefix
-                instance_header = db.session.connection().execute(select([func.substring(c_instance, 1, 4)],
-                                                                         c_id == self.idInstance).select_from(
-                    table)).first()[0]
-                data_length = db.session.connection().execute(select([func.length(c_instance)],
-                                                                     c_id == self.idInstance).select_from(
-                    table)).first()[0]
-                if instance_header == 'LZMA': # compressed instance?
-                    # get blob without LZMA prefix
-                    instance_blob = db.session.connection().execute(select([func.substring(c_instance, 5)],
-                                                                           c_id == self.idInstance).select_from(
-                        table)).first()[0]
-                    return instance_blob, True
-                else:
-                    return self.instance, False
+                """ Returns the stored instance without the "LZMA" prefix and whether it is compressed """
+                blob = self.get_blob(db)
+                return ''.join(blob.stored_chunks()), blob.compressed
 
             def set_instance(self, uncompressed_instance):
                 """ Compresses the instance and sets the instance blob attribute """
@@ -170,6 +142,11 @@ class EDACCDatabase(object):
             def get_num_jobs(self, db):
                 return db.session.query(db.ExperimentResult).filter_by(experiment=self).count()
 
+            def get_data_version(self, db):
+                """ Returns a version stamp of the results of the experiment
+                    for cache keys, see data_version. """
+                return data_version.get_data_version(db, self.idExperiment)
+
             #def get_num_runs(self, db):
             #    """ Returns the number of runs of the experiment """
             #    num_results = db.session.query(db.ExperimentResult) \
@@ -183,21 +160,15 @@ class EDACCDatabase(object):
             #        return 0
             #    return num_results / num_solver_configs / num_instances
 
+            def get_solved_index(self, db, instances, solver_configs):
+                """ Returns the solved_index.SolvedIndex (packed bit array of the solved
+                    instances of each solver configuration) of the given instances and
+                    solver configurations. """
+                return solved_index.get_solved_index(db, self, instances, solver_configs)
+
             def get_solved_instance_ids_by_solver_id(self, db, instances, solver_configs):
                 if not solver_configs or not instances: return []
-                solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
-                instance_ids = [i.idInstance for i in instances]
-                successful_runs = db.session.query(db.ExperimentResult.SolverConfig_idSolverConfig,
-                                                   db.ExperimentResult.Instances_idInstance) \
-                    .filter_by(experiment=self).filter(db.ExperimentResult.resultCode.like("1%")) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
-                    .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
-                    .filter_by(status=1).all()
-                solved_instances = dict((sc.idSolverConfig, set()) for sc in solver_configs)
-                for run in successful_runs:
-                    solved_instances[run.SolverConfig_idSolverConfig].add(run.Instances_idInstance)
-
-                return solved_instances
+                return self.get_solved_index(db, instances, solver_configs).solved_sets()
 
             def get_sota_solvers(self, db, instances, solver_configs):
                 """
@@ -206,29 +177,7 @@ class EDACCDatabase(object):
                     superset of its solved instances.
                 """
                 if not solver_configs or not instances: return []
-                solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
-                instance_ids = [i.idInstance for i in instances]
-                successful_runs = db.session.query(db.ExperimentResult.SolverConfig_idSolverConfig,
-                                                   db.ExperimentResult.Instances_idInstance) \
-                    .filter_by(experiment=self).filter(db.ExperimentResult.resultCode.like("1%")) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
-                    .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
-                    .filter_by(status=1).all()
-                solved_instances = dict((sc.idSolverConfig, set()) for sc in solver_configs)
-                for run in successful_runs:
-                    solved_instances[run.SolverConfig_idSolverConfig].add(run.Instances_idInstance)
-
-                sota_solvers = []
-                sota_solved = set()
-                for solver in solved_instances:
-                    isSOTA = True
-                    for othersolver in solved_instances.iterkeys():
-                        if solver == othersolver: continue
-                        if solved_instances[othersolver] > solved_instances[solver]:
-                            isSOTA = False
-                            break
-                    if isSOTA: sota_solvers.append(solver)
-
+                sota_solvers = set(self.get_solved_index(db, instances, solver_configs).sota_ids())
                 return [sc for sc in solver_configs if sc.idSolverConfig in sota_solvers]
 
             def unique_solver_contributions(self, db, instances, solver_configs):
@@ -237,28 +186,8 @@ class EDACCDatabase(object):
                     of the instances that only this solver config solved.
                 """
                 if not solver_configs or not instances: return {}
-                solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
-                instance_ids = [i.idInstance for i in instances]
-                successful_runs = db.session.query(db.ExperimentResult.SolverConfig_idSolverConfig,
-                                                   db.ExperimentResult.Instances_idInstance) \
-                    .filter_by(experiment=self).filter(db.ExperimentResult.resultCode.like("1%")) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
-                    .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
-                    .filter_by(status=1).all()
-                solved_instances = dict((sc.idSolverConfig, set()) for sc in solver_configs)
-                for run in successful_runs:
-                    solved_instances[run.SolverConfig_idSolverConfig].add(run.Instances_idInstance)
-
-                sc_by_id = dict((sc.idSolverConfig, sc) for sc in solver_configs)
-                unique_solver_contribs = dict()
-                for solver in solved_instances:
-                    solved = set([i for i in solved_instances[solver]])
-                    for othersolver in solved_instances:
-                        if othersolver == solver: continue
-                        solved = solved.difference(solved_instances[othersolver])
-                    unique_solver_contribs[sc_by_id[solver]] = solved
-
-                return unique_solver_contribs
+                unique_sets = self.get_solved_index(db, instances, solver_configs).unique_sets()
+                return dict((sc, unique_sets[sc.idSolverConfig]) for sc in solver_configs)
 
             def get_max_num_runs(self, db):
                 """ Returns the number of runs of the experiment """
@@ -403,16 +332,22 @@ class EDACCDatabase(object):
 
             def get_result_matrix(self, db, solver_configs, instances, cost='resultTime', fixed_limit=None):
                 """ Returns the results as matrix of lists of result tuples, i.e.
-                    Dict<idInstance, Dict<idSolverConfig, List of runs>> """
-                num_successful = dict(
-                    (i.idInstance, dict((sc.idSolverConfig, 0) for sc in solver_configs)) for i in instances)
-                num_completed = dict(
-                    (i.idInstance, dict((sc.idSolverConfig, 0) for sc in solver_configs)) for i in instances)
-                M = dict((i.idInstance, dict((sc.idSolverConfig, list()) for sc in solver_configs)) for i in instances)
+                    Dict<idInstance, Dict<idSolverConfig, List of runs>>
+                    and the number of successful and completed runs as
+                    Dict<idInstance, Dict<idSolverConfig, int>>.
+                    The dictionaries are read-only views of get_result_arrays(). """
+                matrix = self.get_result_arrays(db, solver_configs, instances, cost, fixed_limit)
+                num_successful, num_completed = matrix.count_dicts()
+                return matrix.run_dict(), num_successful, num_completed
+
+            def get_result_arrays(self, db, solver_configs, instances, cost='resultTime', fixed_limit=None):
+                """ Returns the results as result_matrix.ResultMatrix, i.e. dense
+                    arrays of shape (#instances, #solver configs, #runs).
+                    The arrays are built in a single pass over the query result. """
                 solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
                 instance_ids = [i.idInstance for i in instances]
                 if not solver_config_ids or not instance_ids:
-                    return M, 0, 0
+                    return result_matrix.ResultMatrix(instance_ids, solver_config_ids)
                 table = db.metadata.tables['ExperimentResults']
                 table_result_codes = db.metadata.tables['ResultCodes']
                 from_table = table
@@ -423,7 +358,6 @@ class EDACCDatabase(object):
                 result_code_column = table.c['resultCode']
                 if cost == 'resultTime':
                     cost_column = table.c['resultTime']
-                    cost_property = db.ExperimentResult.resultTime
                     cost_limit_column = table.c['CPUTimeLimit']
 
                     if fixed_limit:
@@ -436,7 +370,6 @@ class EDACCDatabase(object):
                                                              else_=table.c['resultCode'])
                 elif cost == 'wallTime':
                     cost_column = table.c['wallTime']
-                    cost_property = db.ExperimentResult.wallTime
                     cost_limit_column = table.c['wallClockTimeLimit']
 
                     if fixed_limit:
@@ -449,13 +382,9 @@ class EDACCDatabase(object):
                                                              else_=table.c['resultCode'])
                 elif cost == 'cost':
                     cost_column = table.c['cost']
-                    cost_property = db.ExperimentResult.cost
-                    inf = float('inf')
                     cost_limit_column = table.c['CPUTimeLimit'] # doesnt matter
                 else:
                     cost_column = table_has_prop_value.c['value']
-                    cost_property = db.ResultPropertyValue.value
-                    inf = float('inf')
                     cost_limit_column = table.c['CPUTimeLimit']
                     from_table = table.join(table_has_prop, and_(table_has_prop.c['idProperty'] == int(cost),
                                                                  table_has_prop.c['idExperimentResults'] == table.c[
@@ -470,27 +399,22 @@ class EDACCDatabase(object):
                                 table.c['Instances_idInstance'].in_(instance_ids)),
                            from_obj=from_table.join(table_result_codes))
 
-                Run = namedtuple('Run', ['idJob', 'status', 'result_code_description', 'resultCode', 'resultTime',
-                                         'successful', 'penalized_time10', 'idSolverConfig', 'idInstance',
-                                         'penalized_time1', 'censored'])
-
-                for r in db.session.connection().execute(s):
-                    if r.Instances_idInstance not in M: continue
-                    if r.SolverConfig_idSolverConfig not in M[r.Instances_idInstance]: continue
-                    if str(r.resultCode).startswith('1'): num_successful[r.Instances_idInstance][
-                        r.SolverConfig_idSolverConfig] += 1
-                    if r.status not in STATUS_PROCESSING: num_completed[r.Instances_idInstance][
-                        r.SolverConfig_idSolverConfig] += 1
-                    M[r.Instances_idInstance][r.SolverConfig_idSolverConfig].append(
-                        Run(r.idJob, int(r.status), r[6], int(r.resultCode),
-                            None if int(r.status) <= 0 else float(r.cost), str(r.resultCode).startswith('1'),
-                            float(r.cost) if str(r.resultCode).startswith('1') else (inf if cost not in (
-                            'resultTime', 'wallTime') else float(r.limit)) * 10,
-                            r.SolverConfig_idSolverConfig, r.Instances_idInstance,
-                            float(r.cost) if str(r.resultCode).startswith('1') else (
-                            inf if cost not in ('resultTime', 'wallTime') else float(r.limit)),
-                            not str(r.resultCode).startswith('1')))
-                return M, num_successful, num_completed
+                rows = db.session.connection().execute(s)
+                return result_matrix.from_rows(rows, instance_ids, solver_config_ids,
+                                               cost in ('resultTime', 'wallTime'), self.get_max_num_runs(db))
+
+            def get_correlation_matrix(self, db, solver_configs, instances, cost='resultTime', method='spearman'):
+                """ Returns the (#solver configs x #solver configs) arrays (coefficients, p-values)
+                    of the correlation (see statistics.correlation_matrix) of the PAR1 values
+                    of each pair of solver configurations, where the runs are paired
+                    by instance and run number. The diagonal coefficients are 1. """
+                results = self.get_result_arrays(db, solver_configs, instances, cost)
+                # one row per (instance, run), one column per solver configuration
+                data = results.par1.transpose(0, 2, 1).reshape(-1, len(results.solver_config_ids))
+                coefficients, p_values = statistics.correlation_matrix(data, method)
+                numpy.fill_diagonal(coefficients, 1.0)
+                numpy.fill_diagonal(p_values, 0.0)
+                return coefficients, p_values
 
         class ExperimentResult(object):
             """ Maps the ExperimentResult table. Provides a function
@@ -966,12 +890,14 @@ def get_databases():
 
 
 def add_database(username, password, database, label, hidden=False):
+    aggregates.clear(database)
     databases[database] = EDACCDatabase(username, password, database, label, hidden)
     return databases[database]
 
 
 def remove_database(database):
     if database in databases:
+        aggregates.clear(database)
         del databases[database]
 
 
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.plot_cache
+    ----------------
+
+    Content-addressed disk cache of rendered plots.
+
+    A plot is identified by the hash of the plot function's name, its
+    (normalized) arguments and the output format. Since the arguments
+    contain the plotted data, plots of changed experiment data get a new key
+    and stale plots are never served. The hash doubles as ETag of the plot.
+
+    The cache directory is limited to config.PLOT_CACHE_SIZE bytes, the
+    least recently used plots (by access time, which is updated on each hit)
+    are deleted first.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import os, time, hashlib
+from threading import Lock
+
+import numpy
+
+from edacc import config
+
+CACHE_DIR = os.path.join(config.TEMP_DIR, 'plot-cache')
+
+_evict_lock = Lock()
+
+
+def _normalize(value):
+    """ Returns a representation of value that doesn't depend on
+        the iteration order of dictionaries and sets. """
+    if isinstance(value, dict):
+        return 'dict', tuple(sorted((_normalize(k), _normalize(v)) for k, v in value.iteritems()))
+    if isinstance(value, (set, frozenset)):
+        return 'set', tuple(sorted(_normalize(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, numpy.ndarray):
+        return 'array', value.dtype.str, value.shape, hashlib.sha1(numpy.ascontiguousarray(value).data).hexdigest()
+    return repr(value)
+
+
+def plot_key(function_name, args, kwargs, format):
+    """ Returns the cache key of a plot """
+    return hashlib.sha1(repr(_normalize((function_name, args, kwargs, format)))).hexdigest()
+
+
+def _path(key, format):
+    return os.path.join(CACHE_DIR, key + '.' + format)
+
+
+def lookup(key, format):
+    """ Returns (data, modification time) of the cached plot or None. The plot is read
+        here because other threads or processes can evict it at any time. """
+    if config.PLOT_CACHE_SIZE <= 0: return None
+    filename = _path(key, format)
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime
+    except (IOError, OSError):
+        return None
+    try:
+        # mark as recently used, the modification time remains the time the plot was rendered
+        os.utime(filename, (time.time(), mtime))
+    except OSError:
+        pass
+    return data, mtime
+
+
+def store(key, format, rendered_filename):
+    """ Moves the rendered plot into the cache and returns its new filename.
+        Returns None if the cache is disabled. """
+    if config.PLOT_CACHE_SIZE <= 0: return None
+    try:
+        os.makedirs(CACHE_DIR)
+    except OSError:
+        pass
+    filename = _path(key, format)
+    os.rename(rendered_filename, filename)
+    evict()
+    return filename
+
+
+def evict():
+    """ Deletes the least recently used plots until the cache is smaller than config.PLOT_CACHE_SIZE """
+    with _evict_lock:
+        entries = []
+        total_size = 0
+        for name in os.listdir(CACHE_DIR):
+            try:
+                st = os.stat(os.path.join(CACHE_DIR, name))
+            except OSError:
+                continue
+            entries.append((st.st_atime, st.st_size, name))
+            total_size += st.st_size
+        if total_size <= config.PLOT_CACHE_SIZE: return
+        for atime, size, name in sorted(entries):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                continue
+            total_size -= size
+            if total_size <= config.PLOT_CACHE_SIZE: break
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.plot_pool
+    ---------------
+
+    Pool of plot rendering processes.
+
+    The embedded R interpreter is not thread-safe, so the functions of
+    edacc.plots are serialized by a global lock within a process. To render
+    several plots at the same time, plots are rendered by worker processes,
+    each with its own R interpreter (with the packages loaded by edacc.plots).
+    A plot that takes longer than config.PLOT_TIMEOUT seconds gets its worker
+    killed, and workers are replaced after config.PLOT_WORKER_MAX_TASKS plots
+    to limit the memory R accumulates. Database objects in the arguments of
+    a plot are replaced by PlotObjects, since the mapped classes can't be pickled.
+
+    Forking the multithreaded web server process, possibly with R loaded,
+    isn't safe. start() is called at startup before any threads exist and
+    forks one supervisor process per worker, which has neither threads nor R
+    and starts, kills and replaces its worker. Supervisors can't be replaced,
+    a pool whose supervisors all died raises AllWorkersDied and the plots are
+    rendered in the web server process, as with config.PLOT_PROCESSES = 0.
+    ProcessPool is also used for the survival tests (see edacc.survival_tests)
+    and the background tasks (see edacc.tasks).
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import os, sys, atexit, multiprocessing, Queue
+from threading import Semaphore, Lock
+
+from edacc import config
+
+
+class PlotError(Exception):
+    """ Raised in the web server process if a plot function raised an exception """
+    pass
+
+
+class PlotTimeout(PlotError):
+    pass
+
+
+class AllWorkersDied(PlotError):
+    """ Raised by ProcessPool.run if all supervisor processes of the pool died,
+        the callers run the job in their own process instead """
+    pass
+
+
+# seconds the web server process waits for a supervisor longer than the plot timeout
+SUPERVISOR_GRACE_TIME = 10
+
+
+def _worker_main(conn):
+    """ Main loop of a worker process: receives (function name, args, kwargs)
+        jobs and sends back (success, return value or error message).
+    """
+    from edacc import plots
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None: break
+        name, args, kwargs = job
+        try:
+            conn.send((True, getattr(plots, name)(*args, **kwargs)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+class PlotObject(object):
+    """ Picklable stand-in for a database object (e.g. a solver configuration
+        or instance) that is passed to a plot function. Plot functions only
+        use the string representation, name and get_name() of these objects.
+    """
+
+    def __init__(self, obj):
+        state = obj._sa_instance_state
+        self.key = (type(obj).__name__, state.key[1] if state.key else id(obj))
+        self.text = unicode(obj)
+        self.name = getattr(obj, 'name', None)
+        self.display_name = obj.get_name() if hasattr(obj, 'get_name') else self.text
+
+    def get_name(self):
+        return self.display_name
+
+    def __str__(self):
+        return self.text
+
+    def __unicode__(self):
+        return self.text
+
+    def __repr__(self):
+        return 'PlotObject(%r, %r)' % (self.key, self.text)
+
+    def __eq__(self, other):
+        return isinstance(other, PlotObject) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def plot_data(value):
+    """ Returns value with all database objects (also within dictionaries,
+        lists and tuples) replaced by PlotObjects. """
+    if hasattr(value, '_sa_instance_state'):
+        return PlotObject(value)
+    if isinstance(value, dict):
+        return dict((plot_data(k), plot_data(v)) for k, v in value.iteritems())
+    if isinstance(value, list):
+        return [plot_data(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(plot_data(v) for v in value)
+    return value
+
+
+class _Worker(object):
+    """ Worker process started by a supervisor, target is the main function of the worker """
+
+    def __init__(self, target):
+        self.conn, child_conn = multiprocessing.Pipe()
+        # not daemonic, daemonic processes can't start processes (task workers start survival test processes)
+        self.process = multiprocessing.Process(target=target, args=(child_conn,))
+        self.process.start()
+        child_conn.close()
+        self.num_tasks = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except IOError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive(): self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def _supervisor_main(conn, target, timeout, max_tasks):
+    """ Main loop of a supervisor process: passes jobs to its worker, which is
+        started on demand with the main function target, and sends back
+        (status, return value or error message) with status 'ok', 'error',
+        'timeout' or 'died'. Exits when the process that started it is gone
+        (e.g. a killed task worker, see edacc.tasks).
+    """
+    parent = os.getppid()
+    worker = None
+    try:
+        while True:
+            while not conn.poll(1):
+                if os.getppid() != parent: return
+            try:
+                job = conn.recv()
+            except EOFError:
+                break
+            if job is None: break
+            if worker is None: worker = _Worker(target)
+            try:
+                worker.conn.send(job)
+                if not worker.conn.poll(timeout):
+                    worker.kill()
+                    worker = None
+                    conn.send(('timeout', None))
+                    continue
+                success, result = worker.conn.recv()
+            except (IOError, EOFError):
+                worker.kill()
+                worker = None
+                conn.send(('died', None))
+                continue
+            worker.num_tasks += 1
+            if worker.num_tasks >= max_tasks:
+                worker.stop()
+                worker = None
+            conn.send(('ok' if success else 'error', result))
+    finally:
+        if worker is not None: worker.stop()
+
+
+class _Supervisor(object):
+    def __init__(self, target, timeout, max_tasks):
+        self.conn, child_conn = multiprocessing.Pipe()
+        # not daemonic, daemonic processes can't start workers
+        self.process = multiprocessing.Process(target=_supervisor_main,
+                                               args=(child_conn, target, timeout, max_tasks))
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except IOError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive(): self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+class ProcessPool(object):
+    """ Runs jobs on `processes` worker processes with the main function target,
+        which receives jobs from and sends (success, return value or error message)
+        back to its end of a pipe (see _worker_main). """
+
+    def __init__(self, processes, timeout, max_tasks, target):
+        self.timeout = timeout
+        self.processes = processes
+        self.supervisors = [_Supervisor(target, timeout, max_tasks) for _ in xrange(processes)]
+        self.idle = Queue.Queue()
+        for supervisor in self.supervisors:
+            self.idle.put(supervisor)
+
+    def run(self, job):
+        """ Passes the picklable job to a worker process and returns the
+            worker's return value. Blocks until a worker is available. """
+        supervisor = self.idle.get()
+        if supervisor is None:
+            # wake the next waiting thread as well
+            self.idle.put(None)
+            raise AllWorkersDied('All worker processes died')
+        try:
+            supervisor.conn.send(job)
+            if not supervisor.conn.poll(self.timeout + SUPERVISOR_GRACE_TIME):
+                raise IOError('no answer from the supervisor')
+            status, result = supervisor.conn.recv()
+        except (IOError, EOFError):
+            # supervisors can't be replaced, see the module documentation
+            supervisor.kill()
+            self.supervisors.remove(supervisor)
+            sys.stderr.write('edacc.plot_pool: a supervisor process died, %d of %d left%s\n' %
+                             (len(self.supervisors), self.processes,
+                              '' if self.supervisors else ', running the jobs in process %d' % (os.getpid(),)))
+            if not self.supervisors: self.idle.put(None)
+            raise PlotError('The worker process died')
+        except:
+            self.idle.put(supervisor)
+            raise
+        self.idle.put(supervisor)
+
+        if status == 'timeout':
+            raise PlotTimeout('The job took longer than %d seconds' % (self.timeout,))
+        if status == 'died':
+            raise PlotError('The worker process died')
+        if status == 'error': raise PlotError(result)
+        return result
+
+    def stop(self):
+        for supervisor in self.supervisors:
+            supervisor.stop()
+        self.supervisors = []
+        self.idle.put(None)
+
+
+class PlotPool(ProcessPool):
+    """ Renders plots on `processes` worker processes """
+
+    def __init__(self, processes, timeout, max_tasks):
+        super(PlotPool, self).__init__(processes, timeout, max_tasks, _worker_main)
+
+    def render(self, name, *args, **kwargs):
+        """ Calls the function `name` of edacc.plots with the given arguments
+            in a worker process and returns its return value. Blocks until
+            a worker is available. """
+        try:
+            return self.run((name, args, kwargs))
+        except PlotTimeout:
+            raise PlotTimeout('Rendering the plot took longer than %d seconds' % (self.timeout,))
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def start():
+    """ Starts the plot pool unless config.PLOT_PROCESSES is 0. This should be called before
+        any threads are started, the pool is started on the first plot otherwise. """
+    global _pool
+    with _pool_lock:
+        if _pool is None and config.PLOT_PROCESSES > 0:
+            _pool = PlotPool(config.PLOT_PROCESSES, config.PLOT_TIMEOUT, config.PLOT_WORKER_MAX_TASKS)
+            # before multiprocessing waits for the supervisors to exit
+            atexit.register(_pool.stop)
+
+
+def render(function, *args, **kwargs):
+    """ Calls the plot function (a function of edacc.plots) with the given
+        arguments on the plot pool and returns its return value.
+        If config.PLOT_PROCESSES is 0 or all plot processes died the function
+        is called in this process.
+    """
+    if config.PLOT_PROCESSES <= 0:
+        return function(*args, **kwargs)
+    start()
+    try:
+        return _pool.render(function.__name__, *plot_data(args), **plot_data(kwargs))
+    except AllWorkersDied:
+        return function(*args, **kwargs)
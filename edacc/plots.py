@@ -4,6 +4,8 @@
     -----------
 
     Plotting functions using rpy2 to interface with the statistics language R.
+    The web application calls them through edacc.plot_pool, which runs them
+    in worker processes with their own R interpreter.
 
     :copyright: (c) 2010 by Daniel Diepold.
     :license: MIT, see LICENSE for details.
@@ -75,6 +77,7 @@ def synchronized(f):
         finally:
             global_lock.release()
 
+    lockedfunc.__wrapped__ = f
     return lockedfunc
 
 
@@ -826,7 +829,10 @@ def barplot(values, filename, format='png'):
 
 @synchronized
 def runtime_matrix_plot(flattened_rtmatrix, num_sorted_solver_configs, num_sorted_instances, measure, filename,
-                        format='png'):
+                        format='png', instance_block=1, solver_config_block=1):
+    """ Plots the runtime matrix. If the matrix was downsampled, each cell is
+        the average of blocks of instance_block instances and solver_config_block
+        solver configurations. """
     if format == 'png':
         grdevices.png(file=filename, units="px", width=840,
                       height=700, type="cairo")
@@ -885,13 +891,17 @@ def runtime_matrix_plot(flattened_rtmatrix, num_sorted_solver_configs, num_sorte
                       ','.join(map(str, range(1, num_sorted_solver_configs + 1))),
                       num_sorted_solver_configs, min_val, max_val))
 
-    robjects.r.mtext("instance (sorted by %s)" % (measure,), side=1, line=3, cex=1.2) # bottom axis label
-    robjects.r.mtext("config (sorted by %s)" % (measure,), side=2, line=3, cex=1.2) # left axis label
+    instance_label = "instance (sorted by %s)" % (measure,)
+    if instance_block > 1: instance_label = "block of %d instances (sorted by %s)" % (instance_block, measure)
+    solver_config_label = "config (sorted by %s)" % (measure,)
+    if solver_config_block > 1: solver_config_label = "block of %d configs (sorted by %s)" % (solver_config_block, measure)
+    robjects.r.mtext(instance_label, side=1, line=3, cex=1.2) # bottom axis label
+    robjects.r.mtext(solver_config_label, side=2, line=3, cex=1.2) # left axis label
     robjects.r.title('Runtime Matrix Plot', cex=1.4)
 
     if format == "rscript":
-        file.write("mtext('instance (sorted by %s)', side=1, line=3, cex=1.2)\n" % (measure,))
-        file.write("mtext('config (sorted by %s)', side=2, line=3, cex=1.2)\n" % (measure,))
+        file.write("mtext('%s', side=1, line=3, cex=1.2)\n" % (instance_label,))
+        file.write("mtext('%s', side=2, line=3, cex=1.2)\n" % (solver_config_label,))
         file.write("title('Runtime Matrix Plot', cex=1.4)\n")
 
     robjects.r.par(mar=robjects.FloatVector([5, 2.5, 2.5, 3]))
@@ -20,10 +20,9 @@ except:
 
 from flask import Blueprint, abort, request
 from flask import render_template as render
-from sqlalchemy import not_, func
+from sqlalchemy import not_
 
-from edacc import models
-from edacc.web import cache
+from edacc import models, tasks
 from edacc.constants import STATUS_PROCESSING
 from edacc.views.helpers import require_login, require_phase
 
@@ -65,19 +64,13 @@ def borg_explorer_data(database, experiment_id):
     if type == 'categories.json':
         return json_dumps([{"path": experiment.name, "name": experiment.name}])
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified))\
-        .filter_by(experiment=experiment).first()
-    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
-
-    @synchronized
-    @cache.memoize(7*24*60*60)
-    def get_data(database, experiment_id, job_count, last_modified_job):
-        runs = db.session.query(db.ExperimentResult) \
-                                .filter(db.ExperimentResult.Experiment_idExperiment==experiment_id) \
-                                .filter(not_(db.ExperimentResult.status.in_(STATUS_PROCESSING))).order_by('idJob').all()
-        return CategoryData().fit([(0, r.instance.name, r.result_code.description, r.resultTime, 0, r.solver_configuration.name, 0) for r in runs])
-
-    data = get_data(database, experiment_id, job_count, last_modified_job)
+    # the model is fitted by a background task, the client polls until it's finished
+    task_id = tasks.submit(('borg-explorer', database, experiment_id, experiment.get_data_version(db)),
+                           fit_category_data, database, experiment_id)
+    status = tasks.status(task_id)
+    if status['state'] != 'finished':
+        return json_dumps(status), 202
+    data = tasks.get_result(task_id)
 
     if type == 'runs.json':
         return json_dumps(data.table)
@@ -92,6 +85,15 @@ def borg_explorer_data(database, experiment_id):
     else:
         abort(404)
 
+@synchronized
+def fit_category_data(database, experiment_id):
+    """ Fits the model of the runs of the experiment, run as background task """
+    db = models.get_database(database)
+    runs = db.session.query(db.ExperimentResult) \
+                            .filter(db.ExperimentResult.Experiment_idExperiment==experiment_id) \
+                            .filter(not_(db.ExperimentResult.status.in_(STATUS_PROCESSING))).order_by('idJob').all()
+    return CategoryData().fit([(0, r.instance.name, r.result_code.description, r.resultTime, 0, r.solver_configuration.name, 0) for r in runs])
+
 ##############################################################################
 
 def assert_probabilities(array):
@@ -15,7 +15,7 @@ from itertools import izip
 
 from sqlalchemy.sql import select, and_, functions, not_, expression, literal
 
-from edacc import statistics
+from edacc import statistics, aggregates, result_matrix, survival_tests
 
 
 def avg_point_biserial_correlation_ranking(db, experiment, instances):
@@ -165,7 +165,11 @@ def number_of_solved_instances_ranking(db, experiment, instances, solver_configs
         cost_limit_column = table.c['CPUTimeLimit']
 
     results = {}
-    if cost in ('resultTime', 'wallTime', 'cost'):
+    store = None if fixed_limit else aggregates.get_aggregates(db, experiment, cost)
+    if store is not None:
+        for sc_id, agg in store.by_solver_config(solver_config_ids, instance_ids).iteritems():
+            if agg.successes > 0: results[sc_id] = (agg.sum, agg.successes)
+    elif cost in ('resultTime', 'wallTime', 'cost'):
         s = select([c_solver_config_id, functions.sum(cost_column), functions.count()],
                    and_(c_experiment_id == experiment.idExperiment, c_result_code.like(u'1%'), c_status == 1,
                         c_instance_id.in_(instance_ids), c_solver_config_id.in_(solver_config_ids))) \
@@ -285,7 +289,11 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
     from sqlalchemy import func, or_, not_
 
     property_limit = 0
-    if cost in ('resultTime', 'wallTime', 'cost'):
+    store = None if fixed_limit else aggregates.get_aggregates(db, experiment, cost)
+    if store is not None:
+        best_instance_runtimes = [(agg.min, instance_id) for instance_id, agg in
+                                  store.by_instance(instance_ids, solver_config_ids).iteritems() if agg.successes > 0]
+    elif cost in ('resultTime', 'wallTime', 'cost'):
         best_instance_runtimes = db.session.query(func.min(cost_property), db.ExperimentResult.Instances_idInstance) \
             .filter(db.ExperimentResult.Experiment_idExperiment == experiment.idExperiment) \
             .filter(result_code_column.like(u'1%')) \
@@ -544,23 +552,22 @@ def ranking_from_graph(M, edges, vertices, solver_config_ids):
 
 
 def survival_ranking(db, experiment, instances, solver_configs, results, cost="resultTime", a=0.00, alpha=0.05):
+    """ Ranking by pairwise survival analysis tests of the solvers' runtimes.
+        The tests are run by the survival_tests module.
+    """
     instance_ids = [i.idInstance for i in instances]
     solver_config_ids = [s.idSolverConfig for s in solver_configs]
     sc_by_id = dict()
     for sc in solver_configs:
         sc_by_id[sc.idSolverConfig] = sc
 
-    def values_tied(v1, v2, a=a):
-        # Test if two values are tied, i.e. if the intervals [v1 - a*v1, v1 + a*v1]
-        # and [v2 - a*v2, v2 + a*v2] overlap.
-        if v1 > v2:
-            if v2 + a * v2 > v1 - a * v1:
-                return True
-        else:
-            if v1 + a * v1 > v2 - a * v2:
-                return True
-
-        return False
+    # penalized runtimes of the runs, restricted to the given instances and solver configs
+    M = result_matrix.as_result_matrix(results)
+    rows = [M.instance_index[id] for id in instance_ids]
+    cols = [M.solver_config_index[id] for id in solver_config_ids]
+    par1 = M.par1[rows][:, cols]
+    censored = M.censored[rows][:, cols]
+    mask = M.mask[rows][:, cols]
 
     # build the matrix of pairwise comparisons:
     # survival_winner[(solver1, solver2)] = 0 if no signficiant difference
@@ -573,62 +580,53 @@ def survival_ranking(db, experiment, instances, solver_configs, results, cost="r
     better_solver = dict()
     for s1 in solver_config_ids:
         for s2 in solver_config_ids:
-            if (s1, s2) in survival_winner: continue
             p_values[(s1, s2)] = 1
-            p_values[(s2, s1)] = 1
             tests_performed[(s1, s2)] = "-"
-            tests_performed[(s2, s1)] = "-"
             survival_winner[(s1, s2)] = 0
-            survival_winner[(s2, s1)] = 0
             count_values_tied[(s1, s2)] = 0
-            count_values_tied[(s2, s1)] = 0
             better_solver[(s1, s2)] = False
-            better_solver[(s2, s1)] = False
-            if s1 == s2: continue
 
-            runs_s1 = list()
-            runs_s2 = list()
-            runs_s1_censored = list()
-            runs_s2_censored = list()
-            # list of results of s1 and s2, tied pairs are replaced by their mean
-            for idInstance in instance_ids:
-                for run1, run2 in izip(results[idInstance][s1], results[idInstance][s2]):
-                    if values_tied(run1.penalized_time1, run2.penalized_time1):
-                        runs_s1.append((run1.penalized_time1 + run2.penalized_time1) / 2.0)
-                        runs_s2.append((run1.penalized_time1 + run2.penalized_time1) / 2.0)
-                        runs_s1_censored.append(run1.censored and run2.censored)
-                        runs_s2_censored.append(run1.censored and run2.censored)
-                        if not run1.censored or not run2.censored:
-                            count_values_tied[(s1, s2)] += 1
-                            count_values_tied[(s2, s1)] += 1
-                    else:
-                        runs_s1.append(run1.penalized_time1)
-                        runs_s2.append(run2.penalized_time1)
-                        runs_s1_censored.append(run1.censored)
-                        runs_s2_censored.append(run2.censored)
-                # calculate p-value of the survival-analysis hypothesis test
-            p_value, test_performed = statistics.surv_test(runs_s1, runs_s2, runs_s1_censored, runs_s2_censored, alpha)
-
-            p_values[(s1, s2)] = p_values[(s2, s1)] = p_value
-            tests_performed[(s1, s2)] = tests_performed[(s2, s1)] = test_performed
-
-            if numpy.median(runs_s1) > numpy.median(runs_s2):
-                better_solver[(s1, s2)] = False
-                better_solver[(s2, s1)] = True
+    pairs = []
+    tests = []
+    for j1, s1 in enumerate(solver_config_ids):
+        for j2 in xrange(j1 + 1, len(solver_config_ids)):
+            s2 = solver_config_ids[j2]
+            # runs of s1 and s2 that are paired up, i.e. the k-th run of both on the same instance
+            paired = mask[:, j1, :] & mask[:, j2, :]
+            runs_s1, runs_s2 = par1[:, j1, :][paired], par1[:, j2, :][paired]
+            runs_s1_censored, runs_s2_censored = censored[:, j1, :][paired], censored[:, j2, :][paired]
+            # two values are tied if the intervals [v1 - a*v1, v1 + a*v1]
+            # and [v2 - a*v2, v2 + a*v2] overlap, tied pairs are replaced by their mean
+            tied = (1 + a) * numpy.minimum(runs_s1, runs_s2) > (1 - a) * numpy.maximum(runs_s1, runs_s2)
+            both_censored = runs_s1_censored & runs_s2_censored
+            count_values_tied[(s1, s2)] = count_values_tied[(s2, s1)] = int((tied & ~both_censored).sum())
+            mean = (runs_s1 + runs_s2) / 2.0
+            runs_s1 = numpy.where(tied, mean, runs_s1)
+            runs_s2 = numpy.where(tied, mean, runs_s2)
+            runs_s1_censored = numpy.where(tied, both_censored, runs_s1_censored)
+            runs_s2_censored = numpy.where(tied, both_censored, runs_s2_censored)
+            pairs.append((s1, s2, numpy.median(runs_s1) > numpy.median(runs_s2)))
+            tests.append((runs_s1.tolist(), runs_s2.tolist(), runs_s1_censored.tolist(), runs_s2_censored.tolist()))
+
+    # calculate p-values of the survival-analysis hypothesis tests
+    test_results = survival_tests.surv_tests(tests, alpha)
+
+    for (s1, s2, s2_better), (p_value, test_performed) in izip(pairs, test_results):
+        p_values[(s1, s2)] = p_values[(s2, s1)] = p_value
+        tests_performed[(s1, s2)] = tests_performed[(s2, s1)] = test_performed
+
+        better_solver[(s1, s2)] = not s2_better
+        better_solver[(s2, s1)] = s2_better
+
+        if p_value <= alpha:
+            if better_solver[(s2, s1)]:
+                # s2 better
+                survival_winner[(s1, s2)] = -1
+                survival_winner[(s2, s1)] = 1
             else:
-                better_solver[(s1, s2)] = True
-                better_solver[(s2, s1)] = False
-
-            if p_value <= alpha:
-                if better_solver[(s2, s1)]:
-                    # s2 better
-                    survival_winner[(s1, s2)] = -1
-                    survival_winner[(s2, s1)] = 1
-                else:
-                    # s1 better
-                    survival_winner[(s1, s2)] = 1
-                    survival_winner[(s2, s1)] = -1
-
+                # s1 better
+                survival_winner[(s1, s2)] = 1
+                survival_winner[(s2, s1)] = -1
 
     # calculate adjacency matrix and list of edges (v1, v2) of the graph
     edges_surv = set()
@@ -710,54 +708,70 @@ def survival_ranking(db, experiment, instances, solver_configs, results, cost="r
             l_surv], survival_winner, M_surv, p_values, tests_performed, dot_code, count_values_tied
 
 
+def careful_raw_scores(par1, censored, valid, noise=1.0, block_elements=2 ** 22):
+    """ Computes the raw-scores matrix of the careful ranking for all pairs of solvers at once.
+        par1, censored and valid are arrays of shape (#solvers, #comparisons), where
+        column k holds the k-th (instance, run) pair and valid marks the existing runs.
+        Entry (a, b) of the returned #solvers x #solvers integer matrix is the number of
+        comparisons solver a won against b minus the number it lost. Runs are compared
+        pairwise: if exactly one is censored the uncensored run wins, if both are censored
+        they are tied, otherwise a run wins if its time is below the tie zone
+        e1 +- alpha * sqrt(e1) around the mean e1 of both times.
+        The computation is done in blocks of solvers with about block_elements entries.
+    """
+    alpha = math.sqrt(noise / 2.0)
+    n, m = par1.shape
+    raw = numpy.zeros((n, n), dtype=numpy.int64)
+    if n == 0 or m == 0: return raw
+    block_size = max(1, block_elements // (n * m))
+    with numpy.errstate(invalid='ignore', over='ignore'):
+        for start in xrange(0, n, block_size):
+            t1 = par1[start:start + block_size, numpy.newaxis, :]
+            c1 = censored[start:start + block_size, numpy.newaxis, :]
+            v1 = valid[start:start + block_size, numpy.newaxis, :]
+            t2, c2, v2 = par1[numpy.newaxis], censored[numpy.newaxis], valid[numpy.newaxis]
+
+            compared = v1 & v2
+            uncensored = compared & ~c1 & ~c2
+            e1 = (t1 + t2) / 2.0
+            bound = e1 - alpha * numpy.sqrt(e1)
+            first_faster = uncensored & (t1 < bound)
+            second_faster = uncensored & ~first_faster & (t2 < bound)
+            wins = (compared & ~c1 & c2) | first_faster
+            losses = (compared & c1 & ~c2) | second_faster
+            raw[start:start + block_size] = wins.sum(axis=2) - losses.sum(axis=2)
+    numpy.fill_diagonal(raw, 0)
+    return raw
+
+
 def careful_ranking(db, experiment, instances, solver_configs, results, cost="resultTime", noise=1.0, break_ties=False):
+    """ Ranking by pairwise comparisons of the runs of the solvers on each instance,
+        see careful_raw_scores. results can be a result_matrix.ResultMatrix
+        or the dictionary returned by Experiment.get_result_matrix.
+        Returns the ranking as list of lists of equally ranked solvers, the raw scores
+        as dictionary (s1 ID, s2 ID) -> score and the domination matrix.
+    """
     instance_ids = [i.idInstance for i in instances]
     solver_config_ids = [s.idSolverConfig for s in solver_configs]
     sc_by_id = dict()
     for sc in solver_configs:
         sc_by_id[sc.idSolverConfig] = sc
 
-    alpha = math.sqrt(noise / 2.0)
-    raw = dict()
-    for s1 in solver_config_ids:
-        for s2 in solver_config_ids:
-            if (s1, s2) in raw: continue
-            raw[(s1, s2)] = 0
-            raw[(s2, s1)] = 0
-            if s1 == s2: continue
-            #print "Comparing ", sc_by_id[s1].name, " and ", sc_by_id[s2].name
+    matrix = result_matrix.as_result_matrix(results)
+    rows = [matrix.instance_index[id] for id in instance_ids if id in matrix.instance_index]
+    cols = [matrix.solver_config_index[id] for id in solver_config_ids]
 
-            for idInstance in instance_ids:
-                for r1, r2 in izip(results[idInstance][s1], results[idInstance][s2]):
-                    #print (str(r1.penalized_time1) + ("+" if r1.censored else "")), "vs.", (str(r2.penalized_time1) + ("+" if r2.censored else "")),
+    def by_solver(array):
+        # (instances x solvers x runs) -> (solvers x (instance, run) pairs)
+        a = array[rows][:, cols]
+        return a.transpose(1, 0, 2).reshape(len(cols), a.shape[0] * a.shape[2])
 
-                    if r1.censored and r2.censored:
-                        #print " .. tied"
-                        continue
-                    elif r1.censored and not r2.censored:
-                        #print " uncensored wins"
-                        raw[(s2, s1)] += 1
-                        raw[(s1, s2)] -= 1
-                        continue
-                    elif not r1.censored and r2.censored:
-                        #print " uncensored wins"
-                        raw[(s1, s2)] += 1
-                        raw[(s2, s1)] -= 1
-                        continue
-
-                    e1 = (r1.penalized_time1 + r2.penalized_time1) / 2.0
-                    delta = alpha * math.sqrt(e1)
-                    #print "Tiezone: [", e1 - delta, ",", e1 + delta, "]",
-                    if r1.penalized_time1 < e1 - delta:
-                        #print r1.penalized_time1, "<", e1 - delta
-                        raw[(s1, s2)] += 1
-                        raw[(s2, s1)] -= 1
-                    elif r2.penalized_time1 < e1 - delta:
-                        #print r2.penalized_time1, "<", e1 - delta
-                        raw[(s2, s1)] += 1
-                        raw[(s1, s2)] -= 1
-                        #else:
-                        #print " .. tied"
+    raw_matrix = careful_raw_scores(by_solver(matrix.par1), by_solver(matrix.censored), by_solver(matrix.mask),
+                                    noise)
+    raw = dict()
+    for a, s1 in enumerate(solver_config_ids):
+        for b, s2 in enumerate(solver_config_ids):
+            raw[(s1, s2)] = int(raw_matrix[a, b])
 
     edges = set()
 
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.result_matrix
+    -------------------
+
+    Columnar (NumPy) representation of the results of an experiment.
+
+    The results of the selected solver configurations on the selected
+    instances are held in dense arrays of shape
+    (#instances, #solver configurations, #runs), which is considerably
+    cheaper than one Python tuple per run. Cells that have fewer runs than
+    the widest cell are padded; use the `mask` (or `run_count`) to tell
+    real runs from padding.
+
+    The old dictionary representation
+    Dict<idInstance, Dict<idSolverConfig, List of runs>> can be obtained
+    from a ResultMatrix with `run_dict()`. It is built lazily per instance.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+from collections import namedtuple, Mapping
+
+import numpy
+
+from edacc.constants import STATUS_PROCESSING
+
+Run = namedtuple('Run', ['idJob', 'status', 'result_code_description', 'resultCode', 'resultTime',
+                         'successful', 'penalized_time10', 'idSolverConfig', 'idInstance',
+                         'penalized_time1', 'censored'])
+
+# status value of padding cells (no run)
+STATUS_NO_RUN = -100
+
+# names of the (instances x solver configs x runs) arrays of a ResultMatrix
+_RUN_ARRAYS = ('id_job', 'status', 'result_code', 'cost', 'par1', 'par10', 'censored', 'description')
+
+
+class ResultMatrix(object):
+    """ Dense arrays of the results of a set of solver configurations on
+        a set of instances. Axis 0 are instances, axis 1 solver configurations
+        and axis 2 the runs in the order they were returned by the database.
+
+        Arrays:
+            id_job, status, result_code (int), cost (raw cost column value,
+            float), par1, par10 (penalized cost, float), censored (bool),
+            description (int, index into the descriptions list).
+            run_count, num_successful, num_completed (int, instances x solver configs)
+    """
+
+    def __init__(self, instance_ids, solver_config_ids, num_runs=1):
+        self.instance_ids = list(instance_ids)
+        self.solver_config_ids = list(solver_config_ids)
+        self.instance_index = dict((id, idx) for idx, id in enumerate(self.instance_ids))
+        self.solver_config_index = dict((id, idx) for idx, id in enumerate(self.solver_config_ids))
+        # distinct result code descriptions, referenced by index from the description array
+        self.descriptions = [None]
+        self._description_index = {None: 0}
+
+        shape2 = (len(self.instance_ids), len(self.solver_config_ids))
+        self.run_count = numpy.zeros(shape2, dtype=numpy.int32)
+        self.num_successful = numpy.zeros(shape2, dtype=numpy.int32)
+        self.num_completed = numpy.zeros(shape2, dtype=numpy.int32)
+        self._allocate(max(1, num_runs))
+
+    def _allocate(self, num_runs):
+        shape = (len(self.instance_ids), len(self.solver_config_ids), num_runs)
+        self.id_job = numpy.zeros(shape, dtype=numpy.int64)
+        self.status = numpy.empty(shape, dtype=numpy.int32)
+        self.status.fill(STATUS_NO_RUN)
+        self.result_code = numpy.zeros(shape, dtype=numpy.int32)
+        self.cost = numpy.empty(shape, dtype=numpy.float64)
+        self.cost.fill(numpy.nan)
+        self.par1 = numpy.empty(shape, dtype=numpy.float64)
+        self.par1.fill(numpy.nan)
+        self.par10 = numpy.empty(shape, dtype=numpy.float64)
+        self.par10.fill(numpy.nan)
+        self.censored = numpy.zeros(shape, dtype=numpy.bool_)
+        self.description = numpy.zeros(shape, dtype=numpy.int16)
+
+    def _grow(self):
+        """ Doubles the size of the runs axis. """
+        old = [getattr(self, name) for name in _RUN_ARRAYS]
+        n = self.num_runs
+        self._allocate(2 * n)
+        for name, old_array in zip(_RUN_ARRAYS, old):
+            getattr(self, name)[:, :, :n] = old_array
+
+    def _trim(self):
+        """ Shrinks the runs axis to the maximum number of runs of any cell. """
+        n = max(1, int(self.run_count.max()) if self.run_count.size else 0)
+        for name in _RUN_ARRAYS:
+            setattr(self, name, getattr(self, name)[:, :, :n])
+
+    @property
+    def num_runs(self):
+        return self.id_job.shape[2]
+
+    @property
+    def shape(self):
+        return self.id_job.shape
+
+    @property
+    def mask(self):
+        """ Boolean array that is True where a cell holds an actual run. """
+        return numpy.arange(self.num_runs)[numpy.newaxis, numpy.newaxis, :] < self.run_count[:, :, numpy.newaxis]
+
+    @property
+    def successful(self):
+        return self.mask & ~self.censored
+
+    def add(self, idJob, idInstance, idSolverConfig, status, resultCode, cost, par1, par10,
+            result_code_description=None):
+        """ Appends a run to the cell of the given instance and solver configuration.
+            Runs of unknown instances or solver configurations are ignored.
+        """
+        i = self.instance_index.get(idInstance)
+        j = self.solver_config_index.get(idSolverConfig)
+        if i is None or j is None: return
+        k = self.run_count[i, j]
+        if k >= self.num_runs: self._grow()
+        successful = str(resultCode).startswith('1')
+        self.id_job[i, j, k] = idJob
+        self.status[i, j, k] = status
+        self.result_code[i, j, k] = resultCode
+        self.cost[i, j, k] = numpy.nan if cost is None else cost
+        self.par1[i, j, k] = par1
+        self.par10[i, j, k] = par10
+        self.censored[i, j, k] = not successful
+        self.run_count[i, j] = k + 1
+        if successful: self.num_successful[i, j] += 1
+        if status not in STATUS_PROCESSING: self.num_completed[i, j] += 1
+        if result_code_description not in self._description_index:
+            self._description_index[result_code_description] = len(self.descriptions)
+            self.descriptions.append(result_code_description)
+        self.description[i, j, k] = self._description_index[result_code_description]
+
+    def cell(self, idInstance, idSolverConfig):
+        """ Returns the list of Run tuples of the given instance and solver configuration. """
+        i = self.instance_index[idInstance]
+        j = self.solver_config_index[idSolverConfig]
+        runs = []
+        for k in xrange(self.run_count[i, j]):
+            status = int(self.status[i, j, k])
+            result_code = int(self.result_code[i, j, k])
+            runs.append(Run(int(self.id_job[i, j, k]), status, self.descriptions[self.description[i, j, k]],
+                            result_code, None if status <= 0 else float(self.cost[i, j, k]),
+                            not self.censored[i, j, k], float(self.par10[i, j, k]), idSolverConfig,
+                            idInstance, float(self.par1[i, j, k]), bool(self.censored[i, j, k])))
+        return runs
+
+    def run_dict(self):
+        """ Returns the results as lazily built
+            Dict<idInstance, Dict<idSolverConfig, List of runs>> """
+        return _RunDictView(self)
+
+    def count_dicts(self):
+        """ Returns the number of successful and completed runs as
+            Dict<idInstance, Dict<idSolverConfig, int>> """
+        return _CountDictView(self, self.num_successful), _CountDictView(self, self.num_completed)
+
+
+class _RunDictView(Mapping):
+    """ Read-only Dict<idInstance, Dict<idSolverConfig, List of runs>> view
+        of a ResultMatrix. The per-instance dictionaries are built on first access.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self._rows = dict()
+
+    def __getitem__(self, idInstance):
+        if idInstance not in self._rows:
+            if idInstance not in self.matrix.instance_index: raise KeyError(idInstance)
+            self._rows[idInstance] = dict((idSolverConfig, self.matrix.cell(idInstance, idSolverConfig))
+                                          for idSolverConfig in self.matrix.solver_config_ids)
+        return self._rows[idInstance]
+
+    def __contains__(self, idInstance):
+        return idInstance in self.matrix.instance_index
+
+    def __iter__(self):
+        return iter(self.matrix.instance_ids)
+
+    def __len__(self):
+        return len(self.matrix.instance_ids)
+
+
+class _CountDictView(Mapping):
+    """ Read-only Dict<idInstance, Dict<idSolverConfig, int>> view of a
+        (instances x solver configs) array of a ResultMatrix.
+        The per-instance dictionaries are built on first access.
+    """
+
+    def __init__(self, matrix, array):
+        self.matrix = matrix
+        self.array = array
+        self._rows = dict()
+
+    def __getitem__(self, idInstance):
+        if idInstance not in self._rows:
+            i = self.matrix.instance_index[idInstance]
+            self._rows[idInstance] = dict(zip(self.matrix.solver_config_ids, self.array[i].tolist()))
+        return self._rows[idInstance]
+
+    def __contains__(self, idInstance):
+        return idInstance in self.matrix.instance_index
+
+    def __iter__(self):
+        return iter(self.matrix.instance_ids)
+
+    def __len__(self):
+        return len(self.matrix.instance_ids)
+
+
+def as_result_matrix(results):
+    """ Returns the ResultMatrix of results, which can be a ResultMatrix,
+        the run dictionary view of one or a plain
+        Dict<idInstance, Dict<idSolverConfig, List of runs>> (which is converted).
+    """
+    if isinstance(results, ResultMatrix): return results
+    if isinstance(results, _RunDictView): return results.matrix
+    instance_ids = list(results.iterkeys())
+    solver_config_ids = list(set(sc_id for runs_by_sc in results.itervalues() for sc_id in runs_by_sc))
+    M = ResultMatrix(instance_ids, solver_config_ids)
+    for idInstance, runs_by_sc in results.iteritems():
+        for idSolverConfig, runs in runs_by_sc.iteritems():
+            for run in runs:
+                M.add(run.idJob, idInstance, idSolverConfig, run.status, run.resultCode, run.resultTime,
+                      run.penalized_time1, run.penalized_time10, run.result_code_description)
+    M._trim()
+    return M
+
+
+def from_rows(rows, instance_ids, solver_config_ids, penalize_with_limit, num_runs=1):
+    """ Builds a ResultMatrix in a single pass over the rows of the result
+        matrix query (see models.Experiment.get_result_arrays).
+        If penalize_with_limit is False, unsuccessful runs are penalized with
+        infinity instead of the row's limit.
+    """
+    M = ResultMatrix(instance_ids, solver_config_ids, num_runs)
+    inf = float('inf')
+    for r in rows:
+        result_code = int(r.resultCode)
+        if str(result_code).startswith('1'):
+            par1 = par10 = float(r.cost)
+        else:
+            par1 = float(r.limit) if penalize_with_limit else inf
+            par10 = par1 * 10
+        M.add(r.idJob, r.Instances_idInstance, r.SolverConfig_idSolverConfig, int(r.status), result_code,
+              None if r.cost is None else float(r.cost), par1, par10, r.description)
+    M._trim()
+    return M
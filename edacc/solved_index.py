@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.solved_index
+    ------------------
+
+    Index of the instances solved by each solver configuration of an experiment.
+
+    An instance counts as solved by a solver configuration if at least one run
+    of the solver configuration on the instance finished with a result code
+    starting with 1. The solved instances of each solver configuration are held
+    as packed bit array (numpy.packbits) over the positions of the instances,
+    so superset tests, differences, unions and counts are vectorized bitwise
+    operations over whole rows.
+
+    Indexes are built with a single query and kept in-process until the results
+    of the experiment change.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+import numpy
+from sqlalchemy.sql import select, and_
+
+# number of set bits of each byte value
+POPCOUNT = numpy.array([bin(b).count('1') for b in xrange(256)], dtype=numpy.int32)
+
+# maximum number of indexes kept in memory
+MAX_CACHED_INDEXES = 32
+
+
+def popcount(bits):
+    """ Returns the number of set bits along the last axis of the packed bit array bits """
+    return POPCOUNT[bits].sum(axis=-1)
+
+
+class SolvedIndex(object):
+    """ Packed bit matrix with one row per solver configuration and one
+        bit per instance. Row j, bit i is set if solver config j solved instance i.
+    """
+
+    def __init__(self, instance_ids, solver_config_ids, solved_pairs=()):
+        self.instance_ids = list(instance_ids)
+        self.solver_config_ids = list(solver_config_ids)
+        self.instance_index = dict((id, idx) for idx, id in enumerate(self.instance_ids))
+        self.solver_config_index = dict((id, idx) for idx, id in enumerate(self.solver_config_ids))
+        solved = numpy.zeros((len(self.solver_config_ids), len(self.instance_ids)), dtype=numpy.bool_)
+        for idSolverConfig, idInstance in solved_pairs:
+            j = self.solver_config_index.get(idSolverConfig)
+            i = self.instance_index.get(idInstance)
+            if i is not None and j is not None:
+                solved[j, i] = True
+        self.bits = numpy.packbits(solved, axis=1) if solved.size else \
+            numpy.zeros((len(self.solver_config_ids), 0), dtype=numpy.uint8)
+
+    def row(self, idSolverConfig):
+        return self.bits[self.solver_config_index[idSolverConfig]]
+
+    def instance_ids_of(self, bits):
+        """ Returns the list of instance IDs of the set bits of a packed row """
+        positions = numpy.nonzero(numpy.unpackbits(bits)[:len(self.instance_ids)])[0]
+        return [self.instance_ids[i] for i in positions]
+
+    def counts(self):
+        """ Returns an array with the number of solved instances of each solver config """
+        return popcount(self.bits)
+
+    def union(self, solver_config_ids=None):
+        """ Returns the packed row of the instances solved by any of the given solver configs (all if None) """
+        if solver_config_ids is None:
+            rows = self.bits
+        else:
+            rows = self.bits[[self.solver_config_index[id] for id in solver_config_ids]]
+        if len(rows) == 0:
+            return numpy.zeros(self.bits.shape[1], dtype=numpy.uint8)
+        return numpy.bitwise_or.reduce(rows, axis=0)
+
+    def superset_matrix(self, block_size=64):
+        """ Returns a boolean matrix S x S where entry (a, b) is True if solver
+            config a solves every instance solver config b solves. """
+        n = len(self.solver_config_ids)
+        result = numpy.zeros((n, n), dtype=numpy.bool_)
+        for start in xrange(0, n, block_size):
+            block = self.bits[start:start + block_size]
+            # bits set in b but not in a, for all a in the block and all b
+            missing = self.bits[numpy.newaxis, :, :] & ~block[:, numpy.newaxis, :]
+            result[start:start + block_size] = ~missing.any(axis=2)
+        return result
+
+    def sota_ids(self):
+        """ Returns the IDs of the solver configs where no other solver config
+            solves a strict superset of their solved instances. """
+        superset = self.superset_matrix()
+        strict_superset = superset & ~superset.T
+        return [id for j, id in enumerate(self.solver_config_ids) if not strict_superset[:, j].any()]
+
+    def unique_bits(self):
+        """ Returns a packed bit matrix of the instances only the respective solver config solved """
+        solved_once = numpy.zeros(self.bits.shape[1], dtype=numpy.uint8)
+        solved_more = numpy.zeros(self.bits.shape[1], dtype=numpy.uint8)
+        for row in self.bits:
+            solved_more |= solved_once & row
+            solved_once |= row
+        return self.bits & ~solved_more
+
+    def solved_sets(self):
+        """ Returns a dictionary idSolverConfig -> set of solved instance IDs """
+        return dict((id, set(self.instance_ids_of(self.bits[j]))) for j, id in enumerate(self.solver_config_ids))
+
+    def unique_sets(self):
+        """ Returns a dictionary idSolverConfig -> set of instance IDs only this solver config solved """
+        unique = self.unique_bits()
+        return dict((id, set(self.instance_ids_of(unique[j]))) for j, id in enumerate(self.solver_config_ids))
+
+
+_indexes = OrderedDict() # key -> (data version, SolvedIndex), least recently used first
+_indexes_lock = Lock()
+
+
+def get_solved_index(db, experiment, instances, solver_configs):
+    """ Returns the SolvedIndex of the given instances and solver configurations
+        of the experiment. Built indexes are reused until the results of
+        the experiment change. """
+    instance_ids = tuple(sorted(i.idInstance for i in instances))
+    solver_config_ids = tuple(sorted(sc.idSolverConfig for sc in solver_configs))
+    table = db.metadata.tables['ExperimentResults']
+
+    version = experiment.get_data_version(db)
+    key = (db.database, experiment.idExperiment, instance_ids, solver_config_ids)
+    with _indexes_lock:
+        entry = _indexes.pop(key, None)
+        if entry is not None and entry[0] == version:
+            _indexes[key] = entry # most recently used
+            return entry[1]
+
+    solved_pairs = []
+    if instance_ids and solver_config_ids:
+        s = select([table.c['SolverConfig_idSolverConfig'], table.c['Instances_idInstance']],
+                   and_(table.c['Experiment_idExperiment'] == experiment.idExperiment,
+                        table.c['resultCode'].like(u'1%'),
+                        table.c['status'] == 1,
+                        table.c['Instances_idInstance'].in_(instance_ids),
+                        table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids))).distinct()
+        solved_pairs = db.session.connection().execute(s)
+    index = SolvedIndex(instance_ids, solver_config_ids, solved_pairs)
+
+    with _indexes_lock:
+        _indexes.pop(key, None)
+        _indexes[key] = (version, index) # most recently used
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
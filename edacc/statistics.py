@@ -5,31 +5,366 @@
 
     Various statistics functions.
 
+    The correlation, two-sample and domination functions are implemented
+    natively with NumPy/SciPy and in R (via rpy2); config.STATISTICS_BACKEND
+    selects the implementation bound to the public names. The survival tests
+    are only available in R. The R interpreter is started on first use.
+
     :copyright: (c) 2010 by Daniel Diepold.
     :license: MIT, see LICENSE for details.
 """
 
-from rpy2 import robjects
-from rpy2.robjects.packages import importr
+import math, itertools
+from itertools import izip
+from threading import Lock
+
+import numpy
+from scipy import stats, special
+
+from edacc import config
 
-r_stats = importr('stats')
-importr('splines')
-importr('survival')
-importr('surv2sample')
+_r = None
+_r_lock = Lock()
+
+
+def load_r():
+    """ Starts the embedded R interpreter and loads the required R packages
+        on first use. Returns the tuple (robjects, stats R package).
+    """
+    global _r
+    with _r_lock:
+        if _r is None:
+            from rpy2 import robjects
+            from rpy2.robjects.packages import importr
+            r_stats = importr('stats')
+            importr('splines')
+            importr('survival')
+            importr('surv2sample')
+            _r = (robjects, r_stats)
+        return _r
 
 
-def prob_domination(v1, v2):
+# ------------------------------------------------------------------
+# native (NumPy/SciPy) implementations
+# They return the same values as the functions of the R stats package
+# with their default arguments.
+# ------------------------------------------------------------------
+
+def native_prob_domination(v1, v2):
     """ Returns an integer indicating if the empirical CDF of Algorithm A
         obtained from the runtimes vector v1 probabilistically dominates
         the empirical CDF obtained from v2 (return 1), or the other way around
         (return -1), or if there are crossovers (return 0).
         Algorithm A probabilistically dominates algorithm B, iff.
-        
+
         1) :math:`\\forall t: P(RT_A \le t) \ge P(RT_B \le t)`
 
         2) :math:`\exists t: P(RT_A \le t) > P(RT_B \le t)`
     """
+    v1 = numpy.sort(numpy.asarray(v1, dtype=numpy.float64))
+    v2 = numpy.sort(numpy.asarray(v2, dtype=numpy.float64))
+    points = numpy.concatenate((v1, v2))
+    ecdf1 = numpy.searchsorted(v1, points, side='right') / float(len(v1))
+    ecdf2 = numpy.searchsorted(v2, points, side='right') / float(len(v2))
+
+    if numpy.all(ecdf1 >= ecdf2) and numpy.any(ecdf1 > ecdf2):
+        return 1
+    if numpy.all(ecdf2 >= ecdf1) and numpy.any(ecdf2 > ecdf1):
+        return -1
+
+    return 0
+
+
+def prob_domination_groups(groups1, values1, groups2, values2):
+    """ Batched native_prob_domination over many pairs of samples.
+        Sample pair g consists of the values1 whose entry in groups1 is g and
+        the values2 whose entry in groups2 is g (e.g. the runtimes of two solvers
+        on instance g). The empirical CDFs of all groups are compared at once
+        with sorted arrays. NaN values are ignored.
+        Returns a dictionary group -> 1, -1 or 0 (see prob_domination) of all
+        groups that have values in both samples.
+    """
+    groups1, values1 = numpy.asarray(groups1, dtype=numpy.int64), numpy.asarray(values1, dtype=numpy.float64)
+    groups2, values2 = numpy.asarray(groups2, dtype=numpy.int64), numpy.asarray(values2, dtype=numpy.float64)
+    groups1, values1 = groups1[~numpy.isnan(values1)], values1[~numpy.isnan(values1)]
+    groups2, values2 = groups2[~numpy.isnan(values2)], values2[~numpy.isnan(values2)]
+    common = numpy.intersect1d(groups1, groups2)
+    if len(common) == 0: return dict()
+    keep1, keep2 = numpy.in1d(groups1, common), numpy.in1d(groups2, common)
+    n1 = int(keep1.sum())
+
+    # encode (group, value) as sortable integer keys: group index * #distinct values + value rank
+    _, group_index = numpy.unique(numpy.concatenate((groups1[keep1], groups2[keep2])), return_inverse=True)
+    _, value_rank = numpy.unique(numpy.concatenate((values1[keep1], values2[keep2])), return_inverse=True)
+    num_values = int(value_rank.max()) + 1
+    keys = group_index.astype(numpy.int64) * num_values + value_rank
+    keys1, keys2 = numpy.sort(keys[:n1]), numpy.sort(keys[n1:])
+    sizes1 = numpy.bincount(group_index[:n1], minlength=len(common)).astype(numpy.float64)
+    sizes2 = numpy.bincount(group_index[n1:], minlength=len(common)).astype(numpy.float64)
+
+    # evaluate both ECDFs of each group at all values of the group
+    points = numpy.sort(keys)
+    point_group = points // num_values
+    group_start = point_group * num_values
+    ecdf1 = (numpy.searchsorted(keys1, points, side='right') -
+             numpy.searchsorted(keys1, group_start, side='left')) / sizes1[point_group]
+    ecdf2 = (numpy.searchsorted(keys2, points, side='right') -
+             numpy.searchsorted(keys2, group_start, side='left')) / sizes2[point_group]
+
+    diff = ecdf1 - ecdf2
+    starts = numpy.searchsorted(point_group, numpy.arange(len(common)), side='left')
+    min_diff = numpy.minimum.reduceat(diff, starts)
+    max_diff = numpy.maximum.reduceat(diff, starts)
+    result = numpy.where((min_diff >= 0) & (max_diff > 0), 1, numpy.where((max_diff <= 0) & (min_diff < 0), -1, 0))
+    return dict(izip(common.tolist(), result.tolist()))
+
+
+def _complete_pairs(x, y):
+    """ Returns x and y as float arrays without the pairs that contain NaN values """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    complete = ~(numpy.isnan(x) | numpy.isnan(y))
+    return x[complete], y[complete]
+
+
+def _pearson(x, y):
+    """ Returns the pearson correlation coefficient of x and y or None if undefined """
+    dx, dy = x - x.mean(), y - y.mean()
+    denominator = math.sqrt(numpy.dot(dx, dx) * numpy.dot(dy, dy))
+    if denominator == 0 or numpy.isnan(denominator): return None
+    return max(-1.0, min(1.0, numpy.dot(dx, dy) / denominator))
+
+
+_spearman_exact_dists = dict()
+
+def _spearman_exact_dist(n):
+    """ Returns the sorted array of the sums of squared rank differences
+        of all permutations of n ranks (n <= 9). """
+    if n not in _spearman_exact_dists:
+        ranks = numpy.arange(n)
+        _spearman_exact_dists[n] = numpy.sort(numpy.array(
+            [((ranks - numpy.array(p)) ** 2).sum() for p in itertools.permutations(ranks)]))
+    return _spearman_exact_dists[n]
+
+
+def _spearman_p(q, n, lower_tail):
+    """ Probability of a sum of squared rank differences of at most q (lower_tail)
+        or at least q under independence. Algorithm AS 89 as used by R's cor.test,
+        exact for n <= 9 and an Edgeworth series expansion otherwise.
+        q and lower_tail can be arrays.
+    """
+    lower_tail = numpy.asarray(lower_tail, dtype=numpy.bool_)
+    q = numpy.round(numpy.asarray(q, dtype=numpy.float64)) + numpy.where(lower_tail, 2, 0)
+    n3 = n * (n * n - 1) / 3.0 # maximum value of the statistic
+    if n <= 9:
+        dist = _spearman_exact_dist(n)
+        at_least = len(dist) - numpy.searchsorted(dist, q, side='left')
+        p = numpy.where(lower_tail, len(dist) - at_least, at_least) / float(len(dist))
+    else:
+        b = 1.0 / n
+        x = (6.0 * (q - 1) * b / (n * n - 1) - 1) * math.sqrt(1.0 / b - 1)
+        y = x * x
+        u = x * b * (0.2274 + b * (0.2531 + 0.1745 * b) +
+                     y * (-0.0758 + b * (0.1033 + 0.3932 * b) -
+                          y * b * (0.0879 + 0.0151 * b - y * (0.0072 - 0.0831 * b + y * b * (0.0131 - 4.6e-4 * y)))))
+        y = u / numpy.exp(y / 2)
+        p = numpy.where(lower_tail, stats.norm.cdf(x) - y, stats.norm.sf(x) + y)
+    p = numpy.where(q <= 0, numpy.where(lower_tail, 0.0, 1.0), p)
+    p = numpy.where(q > n3, numpy.where(lower_tail, 1.0, 0.0), p)
+    return numpy.clip(p, 0.0, 1.0)
+
+
+def native_spearman_correlation(x, y):
+    """ Calculates the spearman rank correlation coefficient.
+        Returns a tuple (rho, p-value)
+    """
+    x, y = _complete_pairs(x, y)
+    n = len(x)
+    if n < 2: return 0.0, 1.0
+    rank_x, rank_y = stats.rankdata(x), stats.rankdata(y)
+    rho = _pearson(rank_x, rank_y)
+    if rho is None: return 0.0, 1.0
+    ties = len(numpy.unique(rank_x)) < n or len(numpy.unique(rank_y)) < n
+    q = (n ** 3 - n) * (1 - rho) / 6.0
+    if n < 1290 and not ties:
+        p = float(_spearman_p(q, n, lower_tail=q <= (n ** 3 - n) / 6.0))
+    else:
+        if n < 3 or abs(rho) == 1: return rho, 0.0 if n >= 3 else 1.0
+        t = rho * math.sqrt((n - 2) / (1 - rho * rho))
+        p = stats.t.sf(abs(t), n - 2)
+    return rho, min(2 * p, 1.0)
+
+
+def native_pearson_correlation(x, y):
+    """ Calculates the pearson correlation coefficient.
+        Returns a tuple (rho, p-value)
+    """
+    x, y = _complete_pairs(x, y)
+    n = len(x)
+    if n < 3: return 0.0, 1.0
+    r = _pearson(x, y)
+    if r is None: return 0.0, 1.0
+    if abs(r) == 1: return r, 0.0
+    t = math.sqrt(n - 2) * r / math.sqrt(1 - r * r)
+    return r, 2 * stats.t.sf(abs(t), n - 2)
+
+
+def _rank_columns(data):
+    """ Returns the ranks of the values in each column of data (average ranks for ties) """
+    return numpy.column_stack([stats.rankdata(column) for column in data.T]) if len(data) else data
+
 
+def _correlation_block(x, y, method):
+    """ Correlation coefficients and p-values of each column of x with each column of y,
+        see correlation_matrix """
+    n = len(x)
+    if method == 'spearman':
+        x, y = _rank_columns(x), _rank_columns(y)
+    if n < (2 if method == 'spearman' else 3):
+        return numpy.zeros((x.shape[1], y.shape[1])), numpy.ones((x.shape[1], y.shape[1]))
+    dx, dy = x - x.mean(axis=0), y - y.mean(axis=0)
+    denominator = numpy.sqrt(numpy.outer((dx * dx).sum(axis=0), (dy * dy).sum(axis=0)))
+    undefined = denominator == 0
+    r = numpy.clip(numpy.dot(dx.T, dy) / numpy.where(undefined, 1.0, denominator), -1.0, 1.0)
+    r[undefined] = 0.0
+    perfect = numpy.abs(r) == 1
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = r * numpy.sqrt((n - 2) / (1 - r * r))
+    p = 2 * stats.t.sf(numpy.abs(t), n - 2) if n > 2 else numpy.ones(r.shape)
+    if method == 'spearman':
+        if n < 3:
+            p = numpy.ones(r.shape)
+        else:
+            p[perfect] = 0.0
+        if n < 1290:
+            ties_x = numpy.array([len(numpy.unique(column)) < n for column in x.T])
+            ties_y = numpy.array([len(numpy.unique(column)) < n for column in y.T])
+            q = (n ** 3 - n) * (1 - r) / 6.0
+            exact = numpy.minimum(2 * _spearman_p(q, n, lower_tail=q <= (n ** 3 - n) / 6.0), 1.0)
+            p = numpy.where(ties_x[:, numpy.newaxis] | ties_y[numpy.newaxis, :], p, exact)
+    else:
+        p[perfect] = 0.0
+    p[undefined] = 1.0
+    return r, p
+
+
+def correlation_matrix(data, method='spearman'):
+    """ Calculates the correlation coefficients of all pairs of columns
+        of the (observations x variables) array data and their p-values,
+        with the same results as spearman_correlation or pearson_correlation
+        (method 'spearman' or 'pearson') of each pair.
+        NaN values are missing values, a pair of columns is compared on the rows
+        where both values are present. Columns with the same missing values are
+        processed together, so without missing values there is only a single block.
+        Returns the tuple (coefficients, p-values) of (variables x variables) arrays.
+    """
+    if method not in ('spearman', 'pearson'):
+        raise ValueError('Unknown correlation method: %s' % (method,))
+    data = numpy.asarray(data, dtype=numpy.float64)
+    num_variables = data.shape[1]
+    present = ~numpy.isnan(data)
+    patterns = dict()
+    for column in xrange(num_variables):
+        patterns.setdefault(present[:, column].tostring(), []).append(column)
+    groups = patterns.values()
+
+    coefficients = numpy.zeros((num_variables, num_variables))
+    p_values = numpy.ones((num_variables, num_variables))
+    for i, columns1 in enumerate(groups):
+        for columns2 in groups[i:]:
+            rows = present[:, columns1[0]] & present[:, columns2[0]]
+            r, p = _correlation_block(data[rows][:, columns1], data[rows][:, columns2], method)
+            coefficients[numpy.ix_(columns1, columns2)] = r
+            coefficients[numpy.ix_(columns2, columns1)] = r.T
+            p_values[numpy.ix_(columns1, columns2)] = p
+            p_values[numpy.ix_(columns2, columns1)] = p.T
+    return coefficients, p_values
+
+
+def _psmirnov2x(statistic, m, n):
+    """ Exact probability of a two-sample Kolmogorow-Smirnow statistic below statistic """
+    if m > n: m, n = n, m
+    q = (0.5 + math.floor(statistic * m * n - 1e-7)) / (m * n)
+    u = numpy.array([0.0 if j / float(n) > q else 1.0 for j in xrange(n + 1)])
+    for i in xrange(1, m + 1):
+        w = float(i) / (i + n)
+        u[0] = 0.0 if i / float(m) > q else w * u[0]
+        for j in xrange(1, n + 1):
+            u[j] = 0.0 if abs(i / float(m) - j / float(n)) > q else w * u[j] + u[j - 1]
+    return u[n]
+
+
+def native_kolmogorow_smirnow_2sample_test(x, y):
+    """ Calculates the Kolmogorow-Smirnow two-sample statistic
+        Returns a tuple (value, p-value)
+    """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    x, y = numpy.sort(x[~numpy.isnan(x)]), numpy.sort(y[~numpy.isnan(y)])
+    m, n = len(x), len(y)
+    points = numpy.concatenate((x, y))
+    statistic = numpy.abs(numpy.searchsorted(x, points, side='right') / float(m) -
+                          numpy.searchsorted(y, points, side='right') / float(n)).max()
+    ties = len(numpy.unique(points)) < m + n
+    if m * n < 10000 and not ties:
+        p = 1 - _psmirnov2x(statistic, m, n)
+    else:
+        p = special.kolmogorov(math.sqrt(m * n / float(m + n)) * statistic)
+    return statistic, max(0.0, min(1.0, p))
+
+
+_wilcox_dists = dict()
+
+def _wilcox_cdf(w, m, n):
+    """ Exact probability of a Wilcoxon rank sum statistic of at most w """
+    if (m, n) not in _wilcox_dists:
+        # the frequencies of the statistic are the coefficients of the
+        # gaussian binomial coefficient [m + n choose m] = prod (1 - q^(n+i)) / (1 - q^i)
+        counts = [1] + [0] * (m * n)
+        for i in xrange(1, m + 1):
+            for k in xrange(len(counts) - 1, n + i - 1, -1):
+                counts[k] -= counts[k - n - i]
+            for k in xrange(i, len(counts)):
+                counts[k] += counts[k - i]
+        total = sum(counts)
+        _wilcox_dists[(m, n)] = numpy.cumsum(counts) / float(total)
+    cdf = _wilcox_dists[(m, n)]
+    if w < 0: return 0.0
+    return float(cdf[min(int(math.floor(w + 1e-7)), len(cdf) - 1)])
+
+
+def native_wilcox_test(x, y):
+    """ Calculates the two sample Wilcoxon test statistic (aka Mann-Whitney)
+        Returns a tuple (value, p-value)
+    """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    x, y = x[numpy.isfinite(x)], y[numpy.isfinite(y)]
+    m, n = len(x), len(y)
+    ranks = stats.rankdata(numpy.concatenate((x, y)))
+    statistic = ranks[:m].sum() - m * (m + 1) / 2.0
+    ties = len(numpy.unique(ranks)) < m + n
+    if m < 50 and n < 50 and not ties:
+        if statistic > m * n / 2.0:
+            p = 1 - _wilcox_cdf(statistic - 1, m, n)
+        else:
+            p = _wilcox_cdf(statistic, m, n)
+        return statistic, min(2 * p, 1.0)
+    _, tie_counts = numpy.unique(ranks, return_counts=True)
+    z = statistic - m * n / 2.0
+    sigma = math.sqrt((m * n / 12.0) * ((m + n + 1) - (tie_counts ** 3 - tie_counts).sum() / float((m + n) * (m + n - 1))))
+    z = (z - numpy.sign(z) * 0.5) / sigma
+    return statistic, 2 * stats.norm.sf(abs(z))
+
+
+# ------------------------------------------------------------------
+# R implementations
+# ------------------------------------------------------------------
+
+def r_prob_domination(v1, v2):
+    """ See native_prob_domination """
+    robjects, r_stats = load_r()
     ecdf1 = robjects.r.ecdf(robjects.FloatVector(v1))
     ecdf2 = robjects.r.ecdf(robjects.FloatVector(v2))
     paired = zip([ecdf1(x)[0] for x in v1 + v2], [ecdf2(x)[0] for x in v1 + v2])
@@ -42,10 +377,9 @@ def prob_domination(v1, v2):
     return 0
 
 
-def spearman_correlation(x, y):
-    """ Calculates the spearman rank correlation coefficient.
-        Returns a tuple (rho, p-value)
-    """
+def r_spearman_correlation(x, y):
+    """ See native_spearman_correlation """
+    robjects, r_stats = load_r()
     try:
         r = r_stats.cor_test(robjects.FloatVector(x), robjects.FloatVector(y),
                              method='spearman')
@@ -55,10 +389,9 @@ def spearman_correlation(x, y):
     return cor, p_value
 
 
-def pearson_correlation(x, y):
-    """ Calculates the pearson correlation coefficient.
-        Returns a tuple (rho, p-value)
-    """
+def r_pearson_correlation(x, y):
+    """ See native_pearson_correlation """
+    robjects, r_stats = load_r()
     try:
         r = r_stats.cor_test(robjects.FloatVector(x), robjects.FloatVector(y),
                              method='pearson')
@@ -68,25 +401,44 @@ def pearson_correlation(x, y):
     return cor, p_value
 
 
-def kolmogorow_smirnow_2sample_test(x, y):
-    """ Calculates the Kolmogorow-Smirnow two-sample statistic
-        Returns a tuple (value, p-value)
-    """
+def r_kolmogorow_smirnow_2sample_test(x, y):
+    """ See native_kolmogorow_smirnow_2sample_test """
+    robjects, r_stats = load_r()
     r = r_stats.ks_test(robjects.FloatVector(x), robjects.FloatVector(y),
                         alternative='two.sided')
     return r[0][0], r[1][0]
 
 
-def wilcox_test(x, y):
-    """ Calculates the two sample Wilcoxon test statistic (aka Mann-Whitney)
-        Returns a tuple (value, p-value)
-    """
+def r_wilcox_test(x, y):
+    """ See native_wilcox_test """
+    robjects, r_stats = load_r()
     r = r_stats.wilcox_test(robjects.FloatVector(x), robjects.FloatVector(y),
                             alternative='two.sided', paired=False)
     return r[0][0], r[2][0]
 
 
+BACKENDS = ('native', 'R')
+_FUNCTIONS = ('prob_domination', 'spearman_correlation', 'pearson_correlation',
+              'kolmogorow_smirnow_2sample_test', 'wilcox_test')
+
+
+def set_backend(backend):
+    """ Binds the module level statistics functions to the implementations
+        of the given backend ('native' or 'R'). """
+    if backend not in BACKENDS:
+        raise ValueError('Unknown statistics backend: %s' % (backend,))
+    prefix = 'native_' if backend == 'native' else 'r_'
+    for name in _FUNCTIONS:
+        globals()[name] = globals()[prefix + name]
+
+set_backend(config.STATISTICS_BACKEND)
+
+
 def surv_test(x, y, x_censored, y_censored, alpha=0.05):
+    """ Survival analysis test of the two censored samples x and y (R only).
+        Returns a tuple (p-value, test performed).
+    """
+    robjects, r_stats = load_r()
     combined_data = x + y
     sample_indicators = [1] * len(x) + [2] * len(y)
     censored = [0 if censored else 1 for censored in x_censored] + [0 if censored else 1 for censored in y_censored]
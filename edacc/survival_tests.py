@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.survival_tests
+    --------------------
+
+    Runs the pairwise survival analysis tests of the survival ranking.
+
+    The tests are run on a pool of worker processes, each with its own
+    embedded R interpreter, instead of one after another on the R instance
+    of the web server process. The result of each test is stored on disk
+    keyed by a hash of the test's input vectors, so only the pairs whose
+    data changed (e.g. the pairs of a newly added solver) have to be tested
+    again. Stored results that weren't used for config.SURVIVAL_TEST_RESULT_TTL
+    seconds are deleted.
+
+    Like the plot rendering processes (see edacc.plot_pool), the workers are
+    started by supervisor processes that start() forks before any threads
+    exist (in the processes running the background tasks, see edacc.tasks).
+    A test that takes longer than config.SURVIVAL_TEST_TIMEOUT seconds gets
+    its worker killed and fails the computation, workers are replaced after
+    config.SURVIVAL_TEST_WORKER_MAX_TASKS tests. Without a started pool, or
+    after all its processes died, the tests are run in the calling process.
+
+    The number of finished tests is reported as progress of the background
+    task running them (see edacc.tasks).
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import os, time, hashlib, atexit, Queue
+from threading import Thread, Lock
+
+from edacc import config, tasks
+from edacc.plot_pool import ProcessPool, PlotError, AllWorkersDied
+
+STORE_DIR = os.path.join(config.TEMP_DIR, 'survival-tests')
+
+_pool = None
+_pool_lock = Lock()
+
+_last_cleanup = [0]
+
+
+class SurvivalTestError(Exception):
+    """ Raised if a test failed or took too long in a worker process """
+    pass
+
+
+def _surv_test(args):
+    """ Runs a single test """
+    from edacc import statistics
+    return statistics.surv_test(*args)
+
+
+def _worker_main(conn):
+    """ Main loop of a worker process: receives the arguments of tests and
+        sends back (success, result or error message). """
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            break
+        if args is None: break
+        try:
+            conn.send((True, _surv_test(args)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+def start():
+    """ Starts the worker pool unless config.SURVIVAL_TEST_PROCESSES is 0.
+        This has to be called before any threads are started. """
+    global _pool
+    with _pool_lock:
+        if _pool is None and config.SURVIVAL_TEST_PROCESSES > 0:
+            _pool = ProcessPool(config.SURVIVAL_TEST_PROCESSES, config.SURVIVAL_TEST_TIMEOUT,
+                                config.SURVIVAL_TEST_WORKER_MAX_TASKS, _worker_main)
+            atexit.register(stop)
+
+
+def stop():
+    """ Stops the worker pool """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+            _pool = None
+
+
+def _run_on_pool(args_list):
+    """ Generator of the (index, result) tuples of the tests with the
+        given arguments in the order the workers finish them. The tests
+        are run by the calling thread once all workers died. """
+    jobs = Queue.Queue()
+    for job in enumerate(args_list):
+        jobs.put(job)
+    results = Queue.Queue()
+
+    def feed_worker():
+        while True:
+            try:
+                i, args = jobs.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results.put((i, _pool.run(args), None))
+            except AllWorkersDied:
+                results.put((i, None, None))
+            except PlotError as e:
+                results.put((i, None, str(e)))
+                return
+
+    # at least one thread, which passes all tests back if the workers died meanwhile
+    for _ in xrange(max(1, min(len(_pool.supervisors), len(args_list)))):
+        thread = Thread(target=feed_worker)
+        thread.daemon = True
+        thread.start()
+
+    for _ in xrange(len(args_list)):
+        i, result, error = results.get()
+        if error is not None:
+            # the threads stop after their current test
+            while True:
+                try:
+                    jobs.get_nowait()
+                except Queue.Empty:
+                    break
+            raise SurvivalTestError(error)
+        if result is None: result = _surv_test(args_list[i])
+        yield i, result
+
+
+def test_key(x, y, x_censored, y_censored, alpha):
+    """ Returns the hash identifying a test of the given input """
+    h = hashlib.sha1()
+    h.update(repr((alpha, map(float, x), map(float, y), map(bool, x_censored), map(bool, y_censored))))
+    return h.hexdigest()
+
+
+def _load(key):
+    filename = os.path.join(STORE_DIR, key[:2], key)
+    try:
+        with open(filename) as f:
+            p_value, test_performed = f.read().split()
+        # mark as recently used
+        os.utime(filename, None)
+        return float(p_value), test_performed
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _store(key, result):
+    directory = os.path.join(STORE_DIR, key[:2])
+    try:
+        os.makedirs(directory)
+    except OSError:
+        pass
+    filename = os.path.join(directory, key)
+    # write to a temporary file and rename it to avoid partially written results
+    temp_filename = filename + '.' + str(os.getpid()) + '.tmp'
+    with open(temp_filename, 'w') as f:
+        f.write('%r %s' % (float(result[0]), result[1]))
+    os.rename(temp_filename, filename)
+
+
+def _cleanup():
+    """ Deletes results not used for config.SURVIVAL_TEST_RESULT_TTL seconds, at most once an hour """
+    now = time.time()
+    if now - _last_cleanup[0] < 60 * 60: return
+    _last_cleanup[0] = now
+    try:
+        directories = os.listdir(STORE_DIR)
+    except OSError:
+        return
+    for directory in directories:
+        try:
+            names = os.listdir(os.path.join(STORE_DIR, directory))
+        except OSError:
+            continue
+        for name in names:
+            filename = os.path.join(STORE_DIR, directory, name)
+            try:
+                if now - os.path.getmtime(filename) > config.SURVIVAL_TEST_RESULT_TTL:
+                    os.remove(filename)
+            except OSError:
+                pass
+
+
+def surv_tests(tests, alpha):
+    """ Runs statistics.surv_test for each (x, y, x_censored, y_censored) tuple
+        in the list tests and returns the list of (p-value, test performed) results.
+        Stored results are reused. Raises SurvivalTestError if a test failed or
+        timed out in a worker process.
+    """
+    keys = [test_key(x, y, xc, yc, alpha) for x, y, xc, yc in tests]
+    results = [_load(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    progress = [len(tests) - len(missing), len(tests)]
+    tasks.set_progress(*progress)
+
+    if _pool is not None and len(missing) > 1:
+        computed = ((missing[j], result) for j, result in
+                    _run_on_pool([tests[i] + (alpha,) for i in missing]))
+    else:
+        computed = ((i, _surv_test(tests[i] + (alpha,))) for i in missing)
+    # results are stored and reported as they arrive
+    for i, result in computed:
+        results[i] = result
+        _store(keys[i], result)
+        progress[0] += 1
+        tasks.set_progress(*progress)
+    _cleanup()
+    return results
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.tasks
+    -----------
+
+    Background tasks for expensive analyses.
+
+    Views submit a task with a key built from the route, its arguments and
+    the version of the experiment data and get the task's ID back, which is
+    the hash of the key. Submitting a key whose task is queued, running or
+    finished returns the existing task, so repeated requests coalesce onto
+    a single computation.
+
+    The tasks are run by config.TASK_PROCESSES worker processes, so CPU-bound
+    task functions don't hold the interpreter lock against the request threads.
+    Like the plot rendering processes (see edacc.plot_pool), the workers are
+    started by supervisor processes, which start() forks at the end of
+    edacc.web, after the modules of the task functions are imported and before
+    any threads exist. A worker opens its own connections to the databases the
+    web server process serves, starts its own survival test processes (see
+    edacc.survival_tests), is killed if a task takes longer than
+    config.TASK_TIMEOUT seconds and replaced after config.TASK_WORKER_MAX_TASKS
+    tasks. Task functions have to be module-level functions and their arguments
+    and return values picklable. With config.TASK_PROCESSES = 0, or after all
+    workers died, the tasks are run by a thread of the web server process.
+
+    Tasks are kept in the spool directory TEMP_DIR/tasks, so they are shared
+    by all web server processes and survive restarts:
+
+        <id>.running    exists while the task is queued or running, holds the
+                        host and process ID of the runner and the progress
+        <id>.result     the pickled return value of the task function
+        <id>.error      a generic error message if the task function raised an exception
+                        (the traceback is logged)
+
+    Results are deleted after config.TASK_RESULT_TTL seconds. A failed task
+    is run again when it is submitted more than ERROR_TTL seconds after it failed.
+
+    :copyright: (c) 2010 by Daniel Diepold.
+    :license: MIT, see LICENSE for details.
+"""
+
+import os, time, errno, socket, hashlib, traceback, atexit, Queue
+import cPickle as pickle
+from threading import Thread, Lock, local
+
+from edacc import config, models
+from edacc.plot_pool import ProcessPool, PlotError, AllWorkersDied
+
+SPOOL_DIR = os.path.join(config.TEMP_DIR, 'tasks')
+ERROR_TTL = 10 * 60
+
+_queue = Queue.Queue()
+_threads = []
+_lock = Lock()
+_pool = None
+_pool_lock = Lock()
+_local = local()
+_last_cleanup = [0.0]
+
+
+class TaskFailed(Exception):
+    """ Raised by get_result if the task function raised an exception """
+    pass
+
+
+def _path(task_id, kind):
+    return os.path.join(SPOOL_DIR, task_id + '.' + kind)
+
+
+def _write(filename, data):
+    # write to a temporary file and rename it to avoid partially written files
+    temp_filename = filename + '.' + str(os.getpid()) + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        f.write(data)
+    os.rename(temp_filename, filename)
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+def _read_running(task_id):
+    """ Returns (host, pid, done, total) of a queued or running task or None """
+    try:
+        with open(_path(task_id, 'running')) as f:
+            host, pid, done, total = f.read().split()
+        return host, int(pid), int(done), int(total)
+    except (IOError, ValueError):
+        return None
+
+
+def _is_stale(running):
+    """ True if the process that runs the task doesn't exist anymore """
+    host, pid = running[:2]
+    if host != socket.gethostname(): return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.ESRCH
+    return False
+
+
+def task_id(key):
+    """ Returns the ID of the task with the given key """
+    return hashlib.sha1(repr(key)).hexdigest()
+
+
+def _run(id, function, args, kwargs):
+    """ Runs a task function in the calling thread """
+    _local.task_id = id
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _local.task_id = None
+        for db in models.get_databases().itervalues():
+            db.session.remove()
+
+
+def _use_databases(credentials):
+    """ Makes the databases of the list of (username, password, database, label, hidden)
+        tuples the databases of this process """
+    databases = models.get_databases()
+    served = set(c[2] for c in credentials)
+    for database in [database for database in databases if database not in served]:
+        models.remove_database(database)
+    for username, password, database, label, hidden in credentials:
+        db = databases.get(database)
+        if db is None or (db.username, db.password, db.label, db.hidden) != (username, password, label, hidden):
+            models.add_database(username, password, database, label, hidden)
+
+
+def _worker_main(conn):
+    """ Main loop of a worker process: receives (task ID, function, args, kwargs,
+        database credentials) jobs and sends back (success, return value or error message). """
+    from edacc import survival_tests
+    # the connections of the inherited databases are shared with the web server
+    # process, they are left open and unused (closing them would close the server's)
+    inherited_databases = models.get_databases().values()
+    models.get_databases().clear()
+    survival_tests.start()
+    try:
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                break
+            if job is None: break
+            id, function, args, kwargs, credentials = job
+            try:
+                _use_databases(credentials)
+                conn.send((True, _run(id, function, args, kwargs)))
+            except Exception:
+                traceback.print_exc()
+                # the message is shown to users, the details are only logged
+                conn.send((False, 'internal error, see the server log for details'))
+    finally:
+        survival_tests.stop()
+
+
+def _dispatcher():
+    """ Passes queued tasks to the worker processes (or runs them if there
+        are none) and stores their results """
+    while True:
+        id, function, args, kwargs = _queue.get()
+        try:
+            if _pool is not None:
+                credentials = [(db.username, db.password, db.database, db.label, db.hidden)
+                               for db in models.get_databases().values()]
+                try:
+                    result = _pool.run((id, function, args, kwargs, credentials))
+                except AllWorkersDied:
+                    result = _run(id, function, args, kwargs)
+            else:
+                result = _run(id, function, args, kwargs)
+            _write(_path(id, 'result'), pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        except PlotError as e:
+            _write(_path(id, 'error'), str(e))
+        except Exception:
+            traceback.print_exc()
+            # the message is shown to users, the details are only logged
+            _write(_path(id, 'error'), 'internal error, see the server log for details')
+        finally:
+            _remove(_path(id, 'running'))
+
+
+def start():
+    """ Starts the worker processes unless config.TASK_PROCESSES is 0, in which case
+        the survival test processes of this process are started. This should be called
+        before any threads are started, the workers are started by the first task otherwise. """
+    global _pool
+    with _pool_lock:
+        if _pool is not None: return
+        if config.TASK_PROCESSES > 0:
+            _pool = ProcessPool(config.TASK_PROCESSES, config.TASK_TIMEOUT, config.TASK_WORKER_MAX_TASKS,
+                                _worker_main)
+            # before multiprocessing waits for the supervisors to exit
+            atexit.register(_pool.stop)
+        else:
+            from edacc import survival_tests
+            survival_tests.start()
+
+
+def _cleanup():
+    """ Deletes results and errors older than config.TASK_RESULT_TTL, at most once an hour """
+    now = time.time()
+    if now - _last_cleanup[0] < 60 * 60: return
+    _last_cleanup[0] = now
+    for name in os.listdir(SPOOL_DIR):
+        if not name.endswith(('.result', '.error')): continue
+        try:
+            if now - os.path.getmtime(os.path.join(SPOOL_DIR, name)) > config.TASK_RESULT_TTL:
+                os.remove(os.path.join(SPOOL_DIR, name))
+        except OSError:
+            pass
+
+
+def submit(key, function, *args, **kwargs):
+    """ Runs function(*args, **kwargs) in the background unless the task
+        with the given key is queued, running, finished or failed recently.
+        The function has to return a picklable value. Returns the task ID.
+    """
+    id = task_id(key)
+    with _lock:
+        try:
+            os.makedirs(SPOOL_DIR)
+        except OSError:
+            pass
+        _cleanup()
+        if os.path.exists(_path(id, 'result')): return id
+        try:
+            if time.time() - os.path.getmtime(_path(id, 'error')) < ERROR_TTL: return id
+        except OSError:
+            pass
+
+        running = _read_running(id)
+        if running is not None and _is_stale(running):
+            _remove(_path(id, 'running'))
+        try:
+            fd = os.open(_path(id, 'running'), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except OSError as e:
+            if e.errno == errno.EEXIST: return id # queued or running
+            raise
+        with os.fdopen(fd, 'w') as f:
+            f.write('%s %d 0 0' % (socket.gethostname(), os.getpid()))
+        _remove(_path(id, 'error'))
+
+        _queue.put((id, function, args, kwargs))
+        if _pool is None and config.TASK_PROCESSES > 0: start()
+        while len(_threads) < max(config.TASK_PROCESSES, 1):
+            thread = Thread(target=_dispatcher)
+            thread.daemon = True
+            thread.start()
+            _threads.append(thread)
+    return id
+
+
+def set_progress(done, total):
+    """ Sets the progress of the task that is run by the calling thread
+        (of a worker process). Does nothing if the thread doesn't run a task.
+    """
+    id = getattr(_local, 'task_id', None)
+    if id is None: return
+    _write(_path(id, 'running'), '%s %d %d %d' % (socket.gethostname(), os.getpid(), done, total))
+
+
+def status(task_id):
+    """ Returns the status of a task as dictionary with the keys
+        'task' (the ID), 'state' (one of 'running', 'finished', 'failed' and 'unknown'),
+        'done' and 'total' (the progress, 0 if not reported) and 'error'.
+    """
+    status = {'task': task_id, 'state': 'unknown', 'done': 0, 'total': 0, 'error': None}
+    if os.path.exists(_path(task_id, 'result')):
+        status['state'] = 'finished'
+        return status
+    running = _read_running(task_id)
+    if running is not None and not _is_stale(running):
+        status.update(state='running', done=running[2], total=running[3])
+        return status
+    try:
+        with open(_path(task_id, 'error')) as f:
+            status.update(state='failed', error=f.read())
+    except IOError:
+        pass
+    return status
+
+
+def get_result(task_id):
+    """ Returns the result of a finished task. Raises TaskFailed if the
+        task failed and KeyError if there is no result. """
+    try:
+        with open(_path(task_id, 'result'), 'rb') as f:
+            return pickle.load(f)
+    except IOError:
+        try:
+            with open(_path(task_id, 'error')) as f:
+                raise TaskFailed(f.read())
+        except IOError:
+            raise KeyError(task_id)
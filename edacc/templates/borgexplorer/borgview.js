@@ -26,11 +26,19 @@ bv.load = function(loadable) {
         }
     });
 
-    loadable.resourcesRequested.forEach(function(request) {
+    var request_resource = function(request) {
         d3.json(request.path, function(resource) {
-            $loadable.trigger("resource-loaded", [request, resource]);
+            if(resource && resource.task && resource.state !== "failed") {
+                // still being computed in the background, ask again later
+                setTimeout(function() { request_resource(request); }, 2000);
+            }
+            else {
+                $loadable.trigger("resource-loaded", [request, resource]);
+            }
         });
-    });
+    };
+
+    loadable.resourcesRequested.forEach(request_resource);
 };
 
 bv.later = function(this_, callback) {
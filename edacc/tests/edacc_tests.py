@@ -90,6 +90,59 @@ class RankingTestCase(unittest.TestCase):
         assert second[6] == 0.0
         assert second[7] == 2.0
 
+    def test_aggregates(self):
+        from edacc import aggregates
+        db = self.db
+        experiment = db.session.query(db.Experiment).first()
+        store = aggregates.get_aggregates(db, experiment, 'resultTime')
+        assert len(store.counted) == 10*10*10
+        totals = store.by_solver_config([sc.idSolverConfig for sc in experiment.solver_configurations])
+        assert sorted(agg.sum for agg in totals.itervalues()) == [i * 10*10.0 for i in range(1, 11)]
+        assert all(agg.successes == 10*10 and agg.par(10) == agg.mean() for agg in totals.itervalues())
+
+        # a reset job has to be removed from the aggregates
+        job = db.session.query(db.ExperimentResult).first()
+        job.status = -1
+        db.session.commit()
+        store = aggregates.get_aggregates(db, experiment, 'resultTime')
+        assert len(store.counted) == 10*10*10 - 1
+        assert store.cell(job.SolverConfig_idSolverConfig, job.Instances_idInstance).runs == 9
+
+        # a deleted job changes the version stamp and has to be dropped from the aggregates
+        from edacc.data_version import _probe
+        job = db.session.query(db.ExperimentResult).filter_by(status=1).first()
+        sc_id, instance_id = job.SolverConfig_idSolverConfig, job.Instances_idInstance
+        runs = store.cell(sc_id, instance_id).runs
+        db.session.delete(job)
+        db.session.commit()
+        with store.lock:
+            store.update(db, _probe(db, experiment.idExperiment))
+        assert len(store.counted) == 10*10*10 - 2
+        assert store.cell(sc_id, instance_id).runs == runs - 1
+
+    def test_data_version(self):
+        from edacc.data_version import _probe
+        db = self.db
+        experiment = db.session.query(db.Experiment).first()
+        version = _probe(db, experiment.idExperiment)
+        assert version[2] == 10*10*10
+        # deleting a job that doesn't have the highest ID changes the stamp
+        job = db.session.query(db.ExperimentResult).order_by(db.ExperimentResult.idJob).first()
+        db.session.delete(job)
+        db.session.commit()
+        new_version = _probe(db, experiment.idExperiment)
+        assert new_version[1] == version[1] and new_version[2] == 10*10*10 - 1
+
+    def test_solved_index(self):
+        db = self.db
+        experiment = db.session.query(db.Experiment).first()
+        instances, solver_configs = experiment.instances, experiment.solver_configurations
+        index = experiment.get_solved_index(db, instances, solver_configs)
+        assert list(index.counts()) == [10] * 10
+        # every solver config solves every instance
+        assert len(experiment.get_sota_solvers(db, instances, solver_configs)) == 10
+        assert all(len(u) == 0 for u in experiment.unique_solver_contributions(db, instances, solver_configs).values())
+
     def tearDown(self):
         clean_database(self.db)
         self.db.session.remove()
@@ -119,16 +172,38 @@ class StatisticsTestCase(unittest.TestCase):
         assert prob_domination(v1, v2) == 1
         assert prob_domination(v2, v1) == -1
 
+    def test_prob_domination_groups(self):
+        from edacc.statistics import prob_domination_groups
+
+        groups1 = [1, 1, 1, 2, 2, 2, 3, 3, 4]
+        values1 = [1, 2, 3, 1, 2, 3, 1, 5, 1]
+        groups2 = [1, 1, 1, 2, 2, 2, 3, 3, 3, 5]
+        values2 = [1, 2, 3, 2, 3, 4, 2, 3, 3, 1]
+        assert prob_domination_groups(groups1, values1, groups2, values2) == {1: 0, 2: 1, 3: 0}
+        assert prob_domination_groups(groups2, values2, groups1, values1) == {1: 0, 2: -1, 3: 0}
+
     def test_spearman_correlation(self):
         from edacc.statistics import spearman_correlation
         rho, p = spearman_correlation([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0], [2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
         assert rho > 0.99 and p <= 0.001
+        rho, p = spearman_correlation([1.0, 2.0, 3.0, 4.0, 5.0], [2.0, 1.0, 4.0, 3.0, 5.0])
+        assert float_eq(rho, 0.8) and float_eq(p, 0.1333, eps=1e-4)
 
     def test_pearson_correlation(self):
         from edacc.statistics import pearson_correlation
         rho, p = pearson_correlation([1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 3.0, 4.0])
         assert rho == 1.0 and p <= 1e-10
 
+    def test_correlation_matrix(self):
+        from edacc.statistics import correlation_matrix, spearman_correlation
+        nan = float('nan')
+        data = [[1.0, 2.0, 5.0], [2.0, 1.0, 4.0], [3.0, 4.0, nan], [4.0, 3.0, 2.0], [5.0, 5.0, 1.0]]
+        rho, p = correlation_matrix(data)
+        assert float_eq(rho[0, 1], 0.8) and float_eq(p[0, 1], 0.1333, eps=1e-4)
+        assert float_eq(rho[1, 0], 0.8) and float_eq(p[1, 0], p[0, 1])
+        expected_rho, expected_p = spearman_correlation([1.0, 2.0, 4.0, 5.0], [5.0, 4.0, 2.0, 1.0])
+        assert float_eq(rho[0, 2], expected_rho) and float_eq(p[0, 2], expected_p)
+
     def test_kolmogorow_smirnow_2sample_test(self):
         from edacc.statistics import kolmogorow_smirnow_2sample_test
         D, p = kolmogorow_smirnow_2sample_test([1.0, 2.0, 3.0, 4.0], [5.0, 6.0, 7.0, 8.0])
@@ -143,6 +218,102 @@ class StatisticsTestCase(unittest.TestCase):
         W, p = wilcox_test([1.0, 2.0, 3.0, 4.0, 10.0], [5.0, 6.0, 7.0, 8.0])
         assert W == 4  and float_eq(p, 0.1905, eps=1e-4)
 
+    def test_native_backend_matches_r(self):
+        import numpy
+        from edacc import statistics
+        random = numpy.random.RandomState(42)
+        samples = [
+            # small samples without ties (exact p-values)
+            ([1.5, 2.0, 3.7, 4.1, 5.2, 6.8], [2.2, 1.1, 4.5, 3.9, 7.3, 5.0]),
+            # ties (asymptotic p-values)
+            ([1.0, 2.0, 2.0, 3.0, 5.0, 5.0, 6.0], [1.0, 3.0, 2.0, 2.0, 4.0, 6.0, 6.0]),
+            # large samples
+            (list(random.exponential(10.0, 60)), list(random.exponential(12.0, 60))),
+        ]
+        for x, y in samples:
+            assert statistics.native_prob_domination(x, y) == statistics.r_prob_domination(x, y)
+            assert statistics.native_prob_domination(y, x) == statistics.r_prob_domination(y, x)
+            for name in ('spearman_correlation', 'pearson_correlation', 'kolmogorow_smirnow_2sample_test',
+                         'wilcox_test'):
+                native_value, native_p = getattr(statistics, 'native_' + name)(x, y)
+                r_value, r_p = getattr(statistics, 'r_' + name)(x, y)
+                assert float_eq(native_value, r_value, eps=1e-8), name
+                assert float_eq(native_p, r_p, eps=1e-6), name
+
+class AlgorithmsTestCase(unittest.TestCase):
+    def test_exact_min_set_cover(self):
+        from edacc.algorithms import exact_min_set_cover
+        U = set([1, 2, 3, 4, 5])
+        sets = [set([1, 2, 3]), set([4, 5]), set([1, 2]), set([3, 4, 5]), set([5])]
+        assert exact_min_set_cover(U, sets, [10, 11, 12, 13, 14]) == [[10, 11], [10, 13], [12, 13]]
+        assert exact_min_set_cover(U, sets[2:], [12, 13, 14]) == [[12, 13]]
+        assert exact_min_set_cover(U, sets[:1], [10]) == []
+        assert exact_min_set_cover(set(), sets, [10, 11, 12, 13, 14]) == []
+
+class JobSearchTestCase(unittest.TestCase):
+    def test_contains_digits(self):
+        import numpy
+        from edacc.job_search import _contains_digits
+        numbers = numpy.array([0, 5, 10, 105, 1050, -2051, 123456789, 2**40], dtype=numpy.int64)
+        for digits in ("0", "5", "05", "10", "205", "6789", "1099511627776", "9"):
+            assert list(_contains_digits(numbers, digits)) == [digits in str(abs(n)) for n in numbers]
+
+    def test_dimension_matching(self):
+        from edacc.job_search import Dimension
+        dimension = Dimension('computeNode')
+        # the database connections return UTF-8 encoded byte strings
+        codes = dimension.encode(None, ['node1', 'Caf\xc3\xa9', None, 'node1'])
+        assert list(dimension.matching(u'node')[codes]) == [True, False, False, True]
+        assert list(dimension.matching(u'caf\xe9')[codes]) == [False, True, False, False]
+        assert list(dimension.matching(u'\xe9')[codes]) == [False, True, False, False]
+
+class ResultMatrixTestCase(unittest.TestCase):
+    def test_from_rows(self):
+        """ Compares result_matrix.from_rows with the dictionaries Experiment.get_result_matrix built before """
+        import random
+        from collections import namedtuple
+        from edacc import result_matrix
+        from edacc.constants import STATUS_PROCESSING
+        Row = namedtuple('Row', ['idJob', 'resultCode', 'cost', 'status', 'SolverConfig_idSolverConfig',
+                                 'Instances_idInstance', 'description', 'limit'])
+        Run = namedtuple('Run', ['idJob', 'status', 'result_code_description', 'resultCode', 'resultTime',
+                                 'successful', 'penalized_time10', 'idSolverConfig', 'idInstance',
+                                 'penalized_time1', 'censored'])
+        random.seed(1)
+        instance_ids, solver_config_ids = [3, 1, 7, 5], [10, 12, 11]
+        rows = []
+        for id in xrange(1, 200):
+            result_code, status = random.choice([(11, 1), (10, 1), (-21, 21), (0, 0), (0, -1), (-5, -2)])
+            rows.append(Row(id, result_code, random.choice([None, random.random() * 10]) if status <= 0 else
+                            random.random() * 10, status, random.choice(solver_config_ids + [13]),
+                            random.choice(instance_ids + [2]), 'description %d' % result_code, 10.0))
+
+        for penalize_with_limit in (True, False):
+            inf = float('inf')
+            M = dict((i, dict((sc, list()) for sc in solver_config_ids)) for i in instance_ids)
+            num_successful = dict((i, dict((sc, 0) for sc in solver_config_ids)) for i in instance_ids)
+            num_completed = dict((i, dict((sc, 0) for sc in solver_config_ids)) for i in instance_ids)
+            for r in rows:
+                if r.Instances_idInstance not in M: continue
+                if r.SolverConfig_idSolverConfig not in M[r.Instances_idInstance]: continue
+                successful = str(r.resultCode).startswith('1')
+                if successful: num_successful[r.Instances_idInstance][r.SolverConfig_idSolverConfig] += 1
+                if r.status not in STATUS_PROCESSING:
+                    num_completed[r.Instances_idInstance][r.SolverConfig_idSolverConfig] += 1
+                penalty = float(r.cost) if successful else (float(r.limit) if penalize_with_limit else inf)
+                M[r.Instances_idInstance][r.SolverConfig_idSolverConfig].append(
+                    Run(r.idJob, int(r.status), r.description, int(r.resultCode),
+                        None if int(r.status) <= 0 else float(r.cost), successful,
+                        penalty if successful else penalty * 10, r.SolverConfig_idSolverConfig,
+                        r.Instances_idInstance, penalty, not successful))
+
+            matrix = result_matrix.from_rows(rows, instance_ids, solver_config_ids, penalize_with_limit, 2)
+            S, C = matrix.count_dicts()
+            assert dict(matrix.run_dict()) == M
+            assert dict(S) == num_successful and S[7] is S[7]
+            assert dict(C) == num_completed
+            assert dict(result_matrix.as_result_matrix(M).run_dict()) == M
+
 class UtilsTestCase(unittest.TestCase):
     def test_lzma_compression(self):
         from edacc import utils
@@ -154,6 +325,18 @@ class UtilsTestCase(unittest.TestCase):
         len_bytes = struct.unpack('<Q', compressed_data[5:13])[0]
         assert len_bytes == len(uncompressed_data)
 
+    def test_lzma_decompress_chunks(self):
+        from edacc import utils
+        uncompressed_data = "".join(chr(i % 251) for i in xrange(100000)) * 10
+        compressed_data = utils.lzma_compress(uncompressed_data)
+        chunks = [compressed_data[i:i + 7] for i in xrange(0, len(compressed_data), 7)]
+        decompressed_chunks = list(utils.lzma_decompress_chunks(chunks, bufsize=4096))
+        assert max(len(chunk) for chunk in decompressed_chunks) <= 4096
+        assert "".join(decompressed_chunks) == uncompressed_data
+        reader = utils.IterReader(utils.lzma_decompress_chunks([compressed_data]))
+        assert reader.read(10) + reader.read(5000) + reader.read() == uncompressed_data
+        assert reader.read(10) == ""
+
     def test_format_output_file(self):
         from edacc.utils import formatOutputFile
         assert formatOutputFile("") == ""
@@ -161,6 +344,35 @@ class UtilsTestCase(unittest.TestCase):
         assert formatOutputFile("a" * 4096) == "a" * 4096
         assert formatOutputFile("a" * 4097) == "a" * 2048 + "\n\n... [truncated 0 kB]\n\n" + "a" * 2048
 
+    def test_format_output_window(self):
+        from edacc.utils import formatOutputFile, formatOutputWindow
+        for data in ("", "abc", "".join(chr(65 + i % 26) for i in xrange(3000)),
+                     "".join(chr(65 + i % 26) for i in xrange(10000))):
+            # the windows as returned by blobs.get_windows
+            assert formatOutputWindow(len(data), data[:2048], data[max(len(data) - 2048, 2048):]) == \
+                   formatOutputFile(data)
+        assert formatOutputWindow(None, None, None) == "No output"
+
+    def test_keyset_condition(self):
+        import sqlite3
+        from edacc.utils import keyset_condition
+        assert keyset_condition([("a", "asc"), ("id", "asc")], [None, 3]) == \
+               ("((a IS NOT NULL) OR (a IS NULL AND id > %s))", [3])
+        assert keyset_condition([("a", "desc"), ("id", "asc")], [None, 3]) == ("((a IS NULL AND id > %s))", [3])
+        # keyset pages are the same as LIMIT offset pages (SQLite sorts NULL first like MySQL)
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, a INTEGER, b TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?, ?)",
+                         [(i, [None, 1, 2][i % 3], [None, 'x', 'y'][i % 5 % 3]) for i in xrange(1, 40)])
+        for sort in ([("a", "asc")], [("a", "desc")], [("b", "desc"), ("a", "asc")], [("a", "desc"), ("b", "desc")]):
+            sort = sort + [("id", "asc")]
+            order = " ORDER BY " + ", ".join(c + " " + d for c, d in sort)
+            rows = conn.execute("SELECT " + ", ".join(c for c, _ in sort) + " FROM t" + order).fetchall()
+            for i in xrange(len(rows)):
+                condition, params = keyset_condition(sort, list(rows[i]))
+                assert conn.execute("SELECT " + ", ".join(c for c, _ in sort) + " FROM t WHERE " +
+                                    condition.replace("%s", "?") + order, params).fetchall() == rows[i + 1:]
+
     def test_newline_split_string(self):
         from edacc.utils import newline_split_string
         assert newline_split_string("test", 0) == "test"
@@ -191,6 +403,51 @@ class UtilsTestCase(unittest.TestCase):
         assert ("instance", "-i", "", False, 2) in params
         assert ("seed", "", "", False, 4) in params
 
+class CachingTestCase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+
+    def test_two_tier_cache(self):
+        from edacc.caching import TwoTierCache, FileSystemCache
+        cache = TwoTierCache(FileSystemCache(self.directory, 10000), 1000)
+        cache.set('f:1', [1, 2, 3])
+        assert cache.get('f:1') == [1, 2, 3]
+        assert cache.get('f:2') is None
+        # values that don't fit into the in-process tier are read from the directory
+        cache.set('g:1', 'x' * 2000)
+        assert cache.get('g:1') == 'x' * 2000
+        stats = cache.get_stats()
+        assert stats['f']['memory_hits'] == 1 and stats['f']['misses'] == 1
+        assert stats['g']['shared_hits'] == 1 and stats['g']['bytes_read'] > 2000
+        # a value too large for the in-process tier replaces a small one of the same key
+        cache.set('k:1', 'small')
+        assert cache.get('k:1') == 'small'
+        cache.set('k:1', 'z' * 2000)
+        assert cache.get('k:1') == 'z' * 2000
+        # the directory is limited to its size
+        for i in xrange(10):
+            cache.set('h:%d' % i, 'y' * 2000)
+        assert FileSystemCache(self.directory, 10000)._count() <= 10000
+
+    def test_two_tier_cache_expiry(self):
+        import time
+        from edacc.caching import TwoTierCache, FileSystemCache
+        # two server processes sharing the directory
+        first = TwoTierCache(FileSystemCache(self.directory, 10000), 1000, default_timeout=3600)
+        second = TwoTierCache(FileSystemCache(self.directory, 10000), 1000, default_timeout=3600)
+        first.set('f:1', 'short', timeout=1)
+        assert second.get('f:1') == 'short'
+        assert second.get_stats()['f']['shared_hits'] == 1
+        time.sleep(1.5)
+        # the in-process copy expires with the shared entry
+        assert first.get('f:1') is None
+        assert second.get('f:1') is None
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
 class AnalysisTestCase(unittest.TestCase):
     def setUp(self):
         from edacc import models, config
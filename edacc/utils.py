@@ -9,9 +9,13 @@
     :license: MIT, see LICENSE for details.
 """
 
+import itertools
 import random
 import struct
+import tarfile
+import time
 from cStringIO import StringIO
+from threading import Lock, Event
 
 import pylzma
 
@@ -248,16 +252,20 @@ def render_formula(f):
 
 
 def formatOutputFile(data):
-    if data is not None:
-        if len(data) > 4 * 1024:
-            # show only the first and last 2048 characters if the resultFile is larger than 4kB
-            resultFile_text = data[:2048] + "\n\n... [truncated " + str(
-                int((len(data) - 4096) / 1024.0)) + " kB]\n\n" + data[-2048:]
-        else:
-            resultFile_text = data
-    else:
-        resultFile_text = "No output"
-    return resultFile_text
+    if data is None:
+        return formatOutputWindow(None, None, None)
+    return formatOutputWindow(len(data), data[:2048], data[2048:][-2048:])
+
+
+def formatOutputWindow(length, head, tail):
+    """ Like formatOutputFile, given only the length, the first 2048 characters
+        and the last 2048 characters after them (see blobs.get_windows). """
+    if length is None:
+        return "No output"
+    if length > 4 * 1024:
+        # show only the first and last 2048 characters if the resultFile is larger than 4kB
+        return head + "\n\n... [truncated " + str(int((length - 4096) / 1024.0)) + " kB]\n\n" + tail
+    return head + tail
 
 
 def lzma_decompress(data):
@@ -269,7 +277,7 @@ def lzma_decompress(data):
     """
     # unpack the data length from the LZMA header (bytes # 6-13 inclusively/unsigned long long int)
     coded_length = struct.unpack('<Q', data[5:13])[0]
-    if coded_length == '\xFF\xFF\xFF\xFF\xFF\xFF\xFF\xFF':
+    if coded_length == 0xFFFFFFFFFFFFFFFF:
         # if the length is -1 (in two's complement), there is an EOS marker
         # marking the end of the data and pylzma doesn't need the coded_length
         return pylzma.decompress(data[:5] + data[13:])
@@ -279,6 +287,68 @@ def lzma_decompress(data):
         return pylzma.decompress(data[:5] + data[13:], maxlength=coded_length)
 
 
+def lzma_decompress_chunks(chunks, bufsize=1024 * 1024):
+    """
+        Incremental version of lzma_decompress: Generator of the decompressed data
+        of the LZMA data given as iterable of chunks, in pieces of at most bufsize bytes.
+    """
+    header = ''
+    chunks = iter(chunks)
+    for chunk in chunks:
+        header += chunk
+        if len(header) >= 13: break
+    coded_length = struct.unpack('<Q', header[5:13])[0]
+    if coded_length == 0xFFFFFFFFFFFFFFFF:
+        # EOS marker (see lzma_decompress)
+        decompressor = pylzma.decompressobj()
+    else:
+        decompressor = pylzma.decompressobj(maxlength=coded_length)
+    for chunk in itertools.chain([header[:5] + header[13:]], chunks):
+        data = decompressor.decompress(chunk, bufsize)
+        while data:
+            yield data
+            # drain the data buffered by the decompressor
+            data = decompressor.decompress('', bufsize)
+    data = decompressor.flush()
+    if data: yield data
+
+
+class IterReader(object):
+    """ Read-only file-like object reading the strings of an iterator
+        (e.g. lzma_decompress_chunks), iterating it yields the strings. """
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.buffer = ''
+        self.pos = 0 # position of the unread data in buffer
+
+    def read(self, size=-1):
+        parts = [self.buffer[self.pos:self.pos + size] if size >= 0 else self.buffer[self.pos:]]
+        self.pos += len(parts[0])
+        missing = size - len(parts[0])
+        while size < 0 or missing > 0:
+            self.buffer = next(self.iterator, None)
+            self.pos = 0
+            if self.buffer is None:
+                self.buffer = ''
+                break
+            parts.append(self.buffer[:missing] if size >= 0 else self.buffer)
+            self.pos = len(parts[-1])
+            missing -= self.pos
+        return ''.join(parts)
+
+    def __iter__(self):
+        if self.pos < len(self.buffer):
+            yield self.buffer[self.pos:]
+        self.buffer, self.pos = '', 0
+        for chunk in self.iterator:
+            yield chunk
+
+    def close(self):
+        if hasattr(self.iterator, 'close'):
+            self.iterator.close()
+
+
 def lzma_compress(data):
     """ LZMA compression using pylzma """
     c = pylzma.compressfile(StringIO(data), dictionary=8, fastBytes=128,
@@ -291,4 +361,99 @@ def lzma_compress(data):
 def truncate_name(s, l=100):
     if len(s) > l:
         return s[:l / 2] + " [..] " + s[-l / 2:]
-    return s
\ No newline at end of file
+    return s
+
+
+# marks the end of a tar archive
+TAR_END = '\0' * (2 * tarfile.BLOCKSIZE)
+
+
+def tar_header(name, size=0, mtime=0, type=tarfile.REGTYPE):
+    """ Returns the header block(s) of a tar archive member (GNU format,
+        which supports long names) for archives that are written without
+        a tarfile.TarFile, e.g. streamed. A regular file's data follows the
+        header and is padded to the block size, see tar_padding.
+    """
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.type = type
+    info.mode = 0755 if type == tarfile.DIRTYPE else 0644
+    return info.tobuf(tarfile.GNU_FORMAT, 'utf-8', 'strict')
+
+
+def tar_padding(size):
+    """ Returns the padding of tar member data of the given size """
+    return '\0' * (-size % tarfile.BLOCKSIZE)
+
+
+def keyset_condition(sort, position):
+    """ Returns the SQL condition and its parameters that select the rows after the
+        position in the sort order. sort is a list of (column, 'asc' or 'desc') and
+        position the list of the values of the sort columns of a row.
+        MySQL sorts NULL before all other values.
+    """
+    alternatives, params = [], []
+    for i, (column, direction) in enumerate(sort):
+        # rows with the same values in the previous columns and a following value in this column
+        conditions, condition_params = [], []
+        for (previous_column, _), value in zip(sort[:i], position[:i]):
+            if value is None:
+                conditions.append(previous_column + " IS NULL")
+            else:
+                conditions.append(previous_column + " = %s")
+                condition_params.append(value)
+        value = position[i]
+        if direction == 'asc':
+            if value is None:
+                conditions.append(column + " IS NOT NULL")
+            else:
+                conditions.append(column + " > %s")
+                condition_params.append(value)
+        else:
+            if value is None: continue # NULL is the last value
+            conditions.append("(" + column + " < %s OR " + column + " IS NULL)")
+            condition_params.append(value)
+        alternatives.append("(" + " AND ".join(conditions) + ")")
+        params += condition_params
+    return "(" + " OR ".join(alternatives) + ")", params
+
+
+class SingleFlightCache(object):
+    """ In-process cache for values that expire after ttl seconds.
+        Concurrent requests of a key that is missing or expired wait for the
+        computation of the first request instead of computing the value again.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.values = {} # key -> (expiry time, value)
+        self.pending = {} # key -> Event set when the computation is done
+
+    def get(self, key, compute):
+        """ Returns the cached value of key, calling compute() if it is missing or expired. """
+        while True:
+            with self.lock:
+                now = time.time()
+                if key in self.values and self.values[key][0] > now:
+                    return self.values[key][1]
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = Event()
+                    break
+            # another thread is computing the value
+            event.wait()
+        try:
+            value = compute()
+            with self.lock:
+                self.values[key] = (time.time() + self.ttl, value)
+                # drop expired entries
+                now = time.time()
+                for k in [k for k, v in self.values.iteritems() if v[0] <= now]:
+                    del self.values[k]
+            return value
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
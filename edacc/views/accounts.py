@@ -31,6 +31,7 @@ from edacc.views.helpers import require_phase, require_competition, \
     require_login, password_hash, redirect_ssl, \
     require_admin, is_admin
 from edacc.web import mail
+from edacc.views.frontend import remove_solver_packages
 
 accounts = Blueprint('accounts', __name__, template_folder='static')
 
@@ -563,6 +564,8 @@ def submit_solver(database, id=None):
                 db.session.add(param)
             try:
                 db.session.commit()
+                if code or description_pdf:
+                    remove_solver_packages(database, solver.idSolver)
                 if code:
                     msg = Message("[" + db.label + "][Admin] Code submitted",
                                   recipients=[config.DEFAULT_MAIL_SENDER])
@@ -835,6 +838,7 @@ def update_description(database, solver_id):
 
         try:
             db.session.commit()
+            remove_solver_packages(database, solver.idSolver)
             flash("Solver description updated.")
             return redirect(url_for('accounts.list_submitted_solvers',
                                     database=database))
@@ -11,9 +11,10 @@
 
 from flask import Blueprint
 from flask import render_template as render
-from flask import request, session, url_for, redirect
+from flask import request, session, url_for, redirect, jsonify
 
 from edacc import config, models
+from edacc.web import cache
 from edacc.views.helpers import require_admin
 
 admin = Blueprint('admin', __name__, template_folder='static')
@@ -55,6 +56,14 @@ def databases():
                   host=config.DATABASE_HOST, port=config.DATABASE_PORT)
 
 
+@admin.route('/admin/cache-stats/')
+@require_admin
+def cache_stats():
+    """ Returns the hit, miss and byte counts of the cache of this web server
+        process by key prefix (the name of the memoized function) as JSON """
+    return jsonify(cache.cache.get_stats())
+
+
 @admin.route('/admin/databases/add/', methods=['GET', 'POST'])
 @require_admin
 def databases_add():
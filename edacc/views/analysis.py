@@ -14,7 +14,6 @@ import numpy
 import StringIO
 import csv
 
-from sqlalchemy.orm import joinedload
 from sqlalchemy import or_, func, and_, not_
 from sqlalchemy.sql import expression, select
 
@@ -23,10 +22,10 @@ from flask import render_template as render, g, session
 from flask import abort, request, jsonify, Response
 from werkzeug import Headers, secure_filename
 
-from edacc import models, forms, ranking, statistics, algorithms
+from edacc import models, forms, ranking, statistics, algorithms, config, tasks
 from edacc.web import cache
-from edacc.views.helpers import require_phase, require_login, is_admin
-from edacc.constants import RANKING, ANALYSIS1, ANALYSIS2, OWN_RESULTS
+from edacc.views.helpers import require_phase, require_login, is_admin, task_status_response
+from edacc.constants import RANKING, ANALYSIS1, ANALYSIS2, OWN_RESULTS, STATUS_FINISHED
 from edacc.views import plot
 from edacc.forms import EmptyQuery
 
@@ -38,12 +37,26 @@ analysis = Blueprint('analysis', __name__, template_folder='static')
 #    doc, errs = tidy_document(res)
 #    return doc
 
+def careful_ranking_task(database, experiment_id, solver_config_ids, instance_ids, cost, fixed_limit, noise,
+                         break_ties):
+    """ Background task of careful_solver_ranking, returns the raw scores and the domination matrix """
+    db = models.get_database(database)
+    experiment = db.session.query(db.Experiment).get(experiment_id)
+    solver_configs = [sc for sc in experiment.solver_configurations if sc.idSolverConfig in solver_config_ids]
+    instances = db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
+    results_matrix = experiment.get_result_arrays(db, solver_configs, instances, cost, fixed_limit)
+    _, raw_scores, dom_matrix = ranking.careful_ranking(db, experiment, instances, solver_configs, results_matrix,
+                                                        cost, noise=noise, break_ties=break_ties)
+    return raw_scores, dom_matrix
+
+
 @analysis.route('/<database>/experiment/<int:experiment_id>/careful-ranking/')
 @require_phase(phases=RANKING)
 @require_login
 def careful_solver_ranking(database, experiment_id):
     """
-        Display the raw-scores matrix that is calculated for the careful ranking
+        Display the raw-scores matrix that is calculated for the careful ranking.
+        The ranking is computed by a background task.
     """
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
@@ -58,14 +71,15 @@ def careful_solver_ranking(database, experiment_id):
         if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
             solver_configs = filter(lambda sc: sc.solver_binary.solver.user == g.User, solver_configs)
 
-        results_matrix, _, _ = experiment.get_result_matrix(db, solver_configs, form.i.data, form.cost.data,
-                                                            form.fixed_limit.data)
-
-        carefully_ranked_solvers, raw_scores, dom_matrix = ranking.careful_ranking(db, experiment, form.i.data,
-                                                                                   solver_configs, results_matrix,
-                                                                                   form.cost.data,
-                                                                                   noise=form.careful_ranking_noise.data,
-                                                                                   break_ties=form.break_careful_ties.data)
+        solver_config_ids = sorted(sc.idSolverConfig for sc in solver_configs)
+        instance_ids = sorted(i.idInstance for i in form.i.data)
+        task_args = (database, experiment_id, solver_config_ids, instance_ids, form.cost.data, form.fixed_limit.data,
+                     form.careful_ranking_noise.data, form.break_careful_ties.data)
+        task_id = tasks.submit(('careful-ranking', task_args, experiment.get_data_version(db)), careful_ranking_task,
+                               *task_args)
+        if tasks.status(task_id)['state'] != 'finished':
+            return task_status_response(task_id, db=db, database=database, experiment=experiment)
+        raw_scores, dom_matrix = tasks.get_result(task_id)
 
         return render("/analysis/careful_ranking.html", db=db, experiment=experiment, database=database,
                       raw_scores=raw_scores, solver_configs=solver_configs, dom_matrix=dom_matrix)
@@ -73,12 +87,34 @@ def careful_solver_ranking(database, experiment_id):
     return render("/analysis/careful_ranking.html", db=db, experiment=experiment, database=database)
 
 
+@analysis.route('/<database>/task/<task_id>/')
+@require_login
+def task_status(database, task_id):
+    """ Returns the status of a background task as JSON, see tasks.status """
+    return jsonify(tasks.status(task_id))
+
+
+def survival_ranking_task(database, experiment_id, solver_config_ids, instance_ids, cost, fixed_limit, noise, alpha):
+    """ Background task of survival_solver_ranking, returns the tuple
+        (survival_winner, p_values, tests_performed, dot_code, count_values_tied)
+        of ranking.survival_ranking. """
+    db = models.get_database(database)
+    experiment = db.session.query(db.Experiment).get(experiment_id)
+    solver_configs = [sc for sc in experiment.solver_configurations if sc.idSolverConfig in solver_config_ids]
+    instances = db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
+    results_matrix = experiment.get_result_arrays(db, solver_configs, instances, cost, fixed_limit)
+    _, survival_winner, _, p_values, tests_performed, dot_code, count_values_tied = ranking.survival_ranking(
+        db, experiment, instances, solver_configs, results_matrix, cost, noise, alpha)
+    return survival_winner, p_values, tests_performed, dot_code, count_values_tied
+
+
 @analysis.route('/<database>/experiment/<int:experiment_id>/survival-ranking/')
 @require_phase(phases=RANKING)
 @require_login
 def survival_solver_ranking(database, experiment_id):
     """
-        Display the domination matrix that is calculated for the survival ranking
+        Display the domination matrix that is calculated for the survival ranking.
+        The ranking is computed by a background task.
     """
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
@@ -93,12 +129,15 @@ def survival_solver_ranking(database, experiment_id):
         if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
             solver_configs = filter(lambda sc: sc.solver_binary.solver.user == g.User, solver_configs)
 
-        results_matrix, _, _ = experiment.get_result_matrix(db, solver_configs, form.i.data, form.cost.data,
-                                                            form.fixed_limit.data)
-
-        survival_ranked_solvers, survival_winner, M_surv, p_values, tests_performed, dot_code, count_values_tied = ranking.survival_ranking(
-            db, experiment, form.i.data,
-            solver_configs, results_matrix, form.cost.data, form.survnoise.data, form.survival_ranking_alpha.data)
+        solver_config_ids = sorted(sc.idSolverConfig for sc in solver_configs)
+        instance_ids = sorted(i.idInstance for i in form.i.data)
+        task_args = (database, experiment_id, solver_config_ids, instance_ids, form.cost.data, form.fixed_limit.data,
+                     form.survnoise.data, form.survival_ranking_alpha.data)
+        task_id = tasks.submit(('survival-ranking', task_args, experiment.get_data_version(db)), survival_ranking_task,
+                               *task_args)
+        if tasks.status(task_id)['state'] != 'finished':
+            return task_status_response(task_id, db=db, database=database, experiment=experiment)
+        survival_winner, p_values, tests_performed, dot_code, count_values_tied = tasks.get_result(task_id)
 
         return render("/analysis/survival_ranking.html", db=db, experiment=experiment, database=database,
                       survival_winner=survival_winner, solver_configs=solver_configs, p_values=p_values,
@@ -107,12 +146,41 @@ def survival_solver_ranking(database, experiment_id):
     return render("/analysis/survival_ranking.html", db=db, experiment=experiment, database=database)
 
 
+def careful_ranking_order_task(database, experiment_id, solver_config_ids, instance_ids, cost, fixed_limit, noise,
+                               break_ties):
+    """ Background task of solver_ranking, returns the careful ranking as list of lists of tied solver config IDs """
+    if cost not in ('resultTime', 'wallTime', 'cost'): cost = int(cost)
+    db = models.get_database(database)
+    experiment = db.session.query(db.Experiment).get(experiment_id)
+    solver_configs = [sc for sc in experiment.solver_configurations if sc.idSolverConfig in solver_config_ids]
+    instances = db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
+    results_matrix = experiment.get_result_arrays(db, solver_configs, instances, cost, fixed_limit)
+    ranked_solvers, _, _ = ranking.careful_ranking(db, experiment, instances, solver_configs, results_matrix, cost,
+                                                   noise=noise, break_ties=break_ties)
+    return [[sc.idSolverConfig for sc in tied_solvers] for tied_solvers in ranked_solvers]
+
+
+def survival_ranking_order_task(database, experiment_id, solver_config_ids, instance_ids, cost, fixed_limit, noise,
+                                alpha):
+    """ Background task of solver_ranking, returns the survival ranking as list of lists of tied solver config IDs """
+    if cost not in ('resultTime', 'wallTime', 'cost'): cost = int(cost)
+    db = models.get_database(database)
+    experiment = db.session.query(db.Experiment).get(experiment_id)
+    solver_configs = [sc for sc in experiment.solver_configurations if sc.idSolverConfig in solver_config_ids]
+    instances = db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
+    results_matrix = experiment.get_result_arrays(db, solver_configs, instances, cost, fixed_limit)
+    ranked_solvers = ranking.survival_ranking(db, experiment, instances, solver_configs, results_matrix, cost,
+                                              noise, alpha)[0]
+    return [[sc.idSolverConfig for sc in tied_solvers] for tied_solvers in ranked_solvers]
+
+
 @analysis.route('/<database>/experiment/<int:experiment_id>/ranking/')
 @require_phase(phases=RANKING)
 @require_login
 def solver_ranking(database, experiment_id):
     """ Display a page with the ranking of the solvers of
-        the experiment.
+        the experiment. The careful and survival rankings are
+        computed by background tasks.
     """
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
@@ -137,15 +205,39 @@ def solver_ranking(database, experiment_id):
         show_top = form.show_top.data
 
         solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
+        solver_configs_by_id = dict((sc.idSolverConfig, sc) for sc in solver_configs)
+
+        # the careful and survival rankings run as background tasks, the page shows
+        # their progress until both are finished
+        data_version = experiment.get_data_version(db)
+        task_args = (database, experiment_id, sorted(solver_config_ids), sorted(i.idInstance for i in form.i.data),
+                     form.cost.data, form.fixed_limit.data)
+        careful_ranked_ids = survival_ranked_ids = None
+        if form.careful_ranking.data:
+            careful_args = task_args + (form.careful_ranking_noise.data or 1.0, form.break_careful_ties.data)
+            careful_task_id = tasks.submit(('careful-ranking-order', careful_args, data_version),
+                                           careful_ranking_order_task, *careful_args)
+        if form.survival_ranking.data:
+            survival_args = task_args + (form.survnoise.data, form.survival_ranking_alpha.data)
+            survival_task_id = tasks.submit(('survival-ranking-order', survival_args, data_version),
+                                            survival_ranking_order_task, *survival_args)
+        if form.careful_ranking.data:
+            if tasks.status(careful_task_id)['state'] != 'finished':
+                return task_status_response(careful_task_id, db=db, database=database, experiment=experiment)
+            careful_ranked_ids = tasks.get_result(careful_task_id)
+        if form.survival_ranking.data:
+            if tasks.status(survival_task_id)['state'] != 'finished':
+                return task_status_response(survival_task_id, db=db, database=database, experiment=experiment)
+            survival_ranked_ids = tasks.get_result(survival_task_id)
 
         CACHE_TIME = 7 * 24 * 60 * 60
         #CACHE_TIME = 1
         @cache.memoize(timeout=CACHE_TIME)
-        def cached_ranking(database, experiment_id, solver_config_ids, sc_names, last_modified_job, show_top,
-                           job_count, form_i_data, form_par, form_avg_dev, form_careful_ranking,
+        def cached_ranking(database, experiment_id, solver_config_ids, sc_names, data_version, show_top,
+                           form_i_data, form_par, form_avg_dev, form_careful_ranking,
                            careful_ranking_noise, form_survival_ranking, form_survnoise, form_survival_ranking_alpha,
                            form_break_ties, cost, form_par_factor, form_fixed_limit, form_median_runtime, csv_response,
-                           latex_response, user_id):
+                           latex_response, user_id, careful_ranked_ids, survival_ranked_ids):
 
             if cost not in ('resultTime', 'wallTime', 'cost'): cost = int(cost)
 
@@ -163,16 +255,10 @@ def solver_ranking(database, experiment_id):
                 .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
                 .filter(db.ExperimentResult.resultCode == -1).distinct().all()
 
-            if form_careful_ranking or form_survival_ranking:
-                results_matrix, _, _ = experiment.get_result_matrix(db, solver_configs, form.i.data, cost,
-                                                                    form_fixed_limit)
-
             careful_rank = dict()
             if form_careful_ranking:
-                carefully_ranked_solvers, _, _ = ranking.careful_ranking(db, experiment, form.i.data,
-                                                                         solver_configs, results_matrix, cost,
-                                                                         noise=careful_ranking_noise,
-                                                                         break_ties=form_break_ties)
+                carefully_ranked_solvers = [[solver_configs_by_id[id] for id in tied_ids]
+                                            for tied_ids in careful_ranked_ids]
                 careful_rank_counter = 1 # 1 is VBS
                 for tied_solvers in carefully_ranked_solvers:
                     careful_rank_counter += 1
@@ -185,10 +271,8 @@ def solver_ranking(database, experiment_id):
 
             survival_rank = dict()
             if form_survival_ranking:
-                survival_ranked_solvers, _, _, _, _, _, _ = ranking.survival_ranking(db, experiment, form.i.data,
-                                                                                     solver_configs, results_matrix,
-                                                                                     cost, form_survnoise,
-                                                                                     form_survival_ranking_alpha)
+                survival_ranked_solvers = [[solver_configs_by_id[id] for id in tied_ids]
+                                           for tied_ids in survival_ranked_ids]
 
                 survival_rank_counter = 1
                 for tied_solvers in survival_ranked_solvers:
@@ -264,20 +348,16 @@ def solver_ranking(database, experiment_id):
                           GET_data=GET_data,
                           faulty_solvers_ids=faulty_solvers_ids)
 
-        last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-            .filter_by(experiment=experiment).first()
-        job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
-
         return cached_ranking(database, experiment_id, solver_config_ids,
                               ''.join(sc.get_name() for sc in solver_configs),
-                              last_modified_job, show_top, job_count, [i.idInstance for i in form.i.data],
+                              experiment.get_data_version(db), show_top, [i.idInstance for i in form.i.data],
                               form.penalized_average_runtime.data, form.calculate_average_dev.data,
                               form.careful_ranking.data, form.careful_ranking_noise.data or 1.0,
                               form.survival_ranking.data,
                               form.survnoise.data, form.survival_ranking_alpha.data,
                               form.break_careful_ties.data, form.cost.data, form.par_factor.data, form.fixed_limit.data,
                               form.median_runtime.data, 'csv' in request.args, 'latex' in request.args,
-                              session.get('idUser', None))
+                              session.get('idUser', None), careful_ranked_ids, survival_ranked_ids)
 
     return render('/analysis/ranking.html', database=database, db=db,
                   experiment=experiment, form=form, instance_properties=db.get_instance_properties())
@@ -299,41 +379,33 @@ def sota_solvers(database, experiment_id):
         solver_config_ids = [sc.idSolverConfig for sc in form.sc.data]
         instance_ids = [i.idInstance for i in form.i.data]
 
+        # the minimum set covers are searched by a background task, the page shows
+        # its progress until it is finished
+        data_version = experiment.get_data_version(db)
+        index = experiment.get_solved_index(db, form.i.data, form.sc.data)
+        solved_instances = index.solved_sets()
+        solved_instance_ids = index.instance_ids_of(index.union())
+        task_id = tasks.submit(('sota-set-cover', database, experiment_id, solver_config_ids, instance_ids,
+                                data_version),
+                               algorithms.exact_min_set_cover, solved_instance_ids,
+                               [solved_instances[sc_id] for sc_id in solver_config_ids], solver_config_ids,
+                               time_budget=config.SET_COVER_TIME_BUDGET)
+        if tasks.status(task_id)['state'] != 'finished':
+            return task_status_response(task_id, db=db, database=database, experiment=experiment)
+        minimum_covering_set_solver_combinations = tasks.get_result(task_id)
+
         @cache.memoize(1) # 7*24*60*60
-        def cached_sota_solvers(database, experiment_id, solver_config_ids, sc_names, instance_ids, job_count,
-                                last_modified_job, user_id):
+        def cached_sota_solvers(database, experiment_id, solver_config_ids, sc_names, instance_ids, data_version,
+                                user_id, minimum_covering_set_solver_combinations):
             sota_solvers = experiment.get_sota_solvers(db, form.i.data, form.sc.data)
             unique_solver_contribs = experiment.unique_solver_contributions(db, form.i.data, form.sc.data)
             ranked_solvers = ranking.number_of_solved_instances_ranking(db, experiment, form.i.data, form.sc.data,
                                                                         form.cost.data)
             ranking_data, vbs_uses_solver_count = ranking.get_ranking_data(db, experiment, ranked_solvers, form.i.data,
                                                                            False, False, form.cost.data)
-            result_matrix, _, _ = experiment.get_result_matrix(db, form.sc.data, form.i.data, form.cost.data)
-            sc_correlation = dict((sc, dict()) for sc in form.sc.data)
-            for sc1 in form.sc.data:
-                for sc2 in form.sc.data:
-                    if sc1 == sc2: sc_correlation[sc1][sc2] = sc_correlation[sc2][sc1] = 1.0; continue
-                    if sc1 in sc_correlation and sc2 in sc_correlation[sc1]: continue
-                    v1 = []
-                    v2 = []
-                    for instance in form.i.data:
-                        for sc1run, sc2run in zip(result_matrix[instance.idInstance][sc1.idSolverConfig],
-                                                  result_matrix[instance.idInstance][sc2.idSolverConfig]):
-                            v1.append(sc1run.penalized_time1)
-                            v2.append(sc2run.penalized_time1)
-                    sc_correlation[sc1][sc2] = statistics.spearman_correlation(v1, v2)[0]
-                    sc_correlation[sc2][sc1] = sc_correlation[sc1][sc2]
-
-            solved_instances = experiment.get_solved_instance_ids_by_solver_id(db, form.i.data, form.sc.data)
-            solved_instance_ids = set()
-            for sc in solved_instances:
-                for solved_instance in solved_instances[sc]:
-                    solved_instance_ids.add(solved_instance)
-
-            minimum_covering_set_solver_combinations = algorithms.ak_min_set_cover(set(solved_instance_ids),
-                                                                                   [set(solved_instances[sc_id]) for
-                                                                                    sc_id in solver_config_ids],
-                                                                                   solver_config_ids)
+            coefficients, _ = experiment.get_correlation_matrix(db, form.sc.data, form.i.data, form.cost.data)
+            sc_correlation = dict((sc1, dict((sc2, coefficients[i, j]) for j, sc2 in enumerate(form.sc.data)))
+                                  for i, sc1 in enumerate(form.sc.data))
 
             sc_by_id = dict((sc.idSolverConfig, sc) for sc in form.sc.data)
 
@@ -357,13 +429,10 @@ def sota_solvers(database, experiment_id):
                           sc_correlation=sc_correlation, sc_by_id=sc_by_id,
                           minimum_covering_set_solver_combinations=minimum_covering_set_solver_combinations)
 
-        last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-            .filter_by(experiment=experiment).first()
-        job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
-
         return cached_sota_solvers(database, experiment_id, solver_config_ids,
                                    ''.join(sc.get_name() for sc in form.sc.data),
-                                   instance_ids, job_count, last_modified_job, session.get('idUser', None))
+                                   instance_ids, data_version, session.get('idUser', None),
+                                   minimum_covering_set_solver_combinations)
 
     return render("/analysis/sota_solvers.html", database=database, db=db, form=form,
                   instance_properties=db.get_instance_properties(), experiment=experiment,
@@ -752,46 +821,54 @@ def probabilistic_domination(database, experiment_id):
         sc1 = form.solver_config1.data
         sc2 = form.solver_config2.data
 
-        query = db.session.query(db.ExperimentResult)
-        query = query.enable_eagerloads(True).options(joinedload(db.ExperimentResult.properties))
-
-        sc1_results_by_instance_id = {}
-        sc2_results_by_instance_id = {}
-        for r in query.filter_by(experiment=experiment, solver_configuration=sc1).filter(
-                db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all():
-            if r.Instances_idInstance in sc1_results_by_instance_id:
-                sc1_results_by_instance_id[r.Instances_idInstance].append(r)
-            else:
-                sc1_results_by_instance_id[r.Instances_idInstance] = [r]
-
-        for r in query.filter_by(experiment=experiment, solver_configuration=sc2).filter(
-                db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all():
-            if r.Instances_idInstance in sc2_results_by_instance_id:
-                sc2_results_by_instance_id[r.Instances_idInstance].append(r)
-            else:
-                sc2_results_by_instance_id[r.Instances_idInstance] = [r]
+        result_property = form.result_property.data
+        table = db.metadata.tables['ExperimentResults']
+        from_table = table
+        where = and_(table.c['Experiment_idExperiment'] == experiment.idExperiment,
+                     table.c['SolverConfig_idSolverConfig'].in_([sc1.idSolverConfig, sc2.idSolverConfig]),
+                     table.c['Instances_idInstance'].in_(instance_ids))
+        if result_property in ('resultTime', 'wallTime', 'cost'):
+            value_column = table.c[result_property]
+            if result_property == 'resultTime':
+                # see ExperimentResult.get_time
+                where = and_(where, table.c['status'].in_([STATUS_FINISHED, 21]))
+        else:
+            table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
+            table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
+            value_column = table_has_prop_value.c['value']
+            from_table = table.join(table_has_prop, and_(table_has_prop.c['idProperty'] == int(result_property),
+                                                         table_has_prop.c['idExperimentResults'] == table.c[
+                                                             'idJob'])).join(table_has_prop_value)
+        s = select([table.c['Instances_idInstance'], table.c['SolverConfig_idSolverConfig'], value_column],
+                   and_(where, value_column != None)).select_from(from_table)
+
+        instances1, values1, instances2, values2 = [], [], [], []
+        for idInstance, idSolverConfig, value in db.session.connection().execute(s):
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            if idSolverConfig == sc1.idSolverConfig:
+                instances1.append(idInstance)
+                values1.append(value)
+            if idSolverConfig == sc2.idSolverConfig:
+                instances2.append(idInstance)
+                values2.append(value)
+        domination = statistics.prob_domination_groups(instances1, values1, instances2, values2)
 
         sc1_dom_sc2 = []
         sc2_dom_sc1 = []
         no_dom = []
 
         for instance in instances:
-            if instance.idInstance not in sc1_results_by_instance_id: continue
-            if instance.idInstance not in sc2_results_by_instance_id: continue
-            res1 = [r.get_property_value(form.result_property.data, db) for r in
-                    sc1_results_by_instance_id[instance.idInstance]]
-            res2 = [r.get_property_value(form.result_property.data, db) for r in
-                    sc2_results_by_instance_id[instance.idInstance]]
-            res1 = filter(lambda r: r is not None, res1)
-            res2 = filter(lambda r: r is not None, res2)
-            if len(res1) > 0 and len(res2) > 0:
-                d = statistics.prob_domination(res1, res2)
-                if d == 1:
-                    sc1_dom_sc2.append(instance)
-                elif d == -1:
-                    sc2_dom_sc1.append(instance)
-                else:
-                    no_dom.append(instance)
+            if instance.idInstance not in domination: continue
+            d = domination[instance.idInstance]
+            if d == 1:
+                sc1_dom_sc2.append(instance)
+            elif d == -1:
+                sc2_dom_sc1.append(instance)
+            else:
+                no_dom.append(instance)
 
         num_total = max(max(len(sc1_dom_sc2), len(sc2_dom_sc1)), len(no_dom))
 
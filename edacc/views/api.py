@@ -22,15 +22,13 @@ except ImportError:
     except ImportError:
         from json import dumps as json_dumps
 
-import StringIO
-import csv
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 
-from werkzeug import Headers, secure_filename
-from flask import abort, Blueprint, Response
+from flask import abort, Blueprint
 
 from edacc import models
+from edacc.views.helpers import csv_download
 
 api = Blueprint('api', __name__, template_folder='static')
 
@@ -114,27 +112,25 @@ def configuration_runs(database, experiment_id):
             parameter_values[pv.SolverConfig_idSolverConfig] = dict()
         parameter_values[pv.SolverConfig_idSolverConfig][pv.Parameters_idParameter] = pv.value
 
-    results, _, _ = experiment.get_result_matrix(db, experiment.solver_configurations, experiment.get_instances(db),
-                                                 cost=experiment.defaultCost)
-
-    csv_response = StringIO.StringIO()
-    csv_writer = csv.writer(csv_response)
-    csv_writer.writerow(
-        [p.name for p in configurable_parameters] + [p.name for p in instance_properties] + ['par1', 'censored'])
-    for idInstance in results:
-        for idSolverConfig in results[idInstance]:
-            for run in results[idInstance][idSolverConfig]:
-                csv_writer.writerow(
-                    [parameter_values[idSolverConfig].get(p.idParameter, '') for p in configurable_parameters] + \
-                    [instances_by_id[idInstance].get_property_value(p.idProperty, db) for p in instance_properties] + \
-                    [run.penalized_time1, 1 if run.censored else 0])
-
-    csv_response.seek(0)
-    headers = Headers()
-    headers.add('Content-Type', 'text/csv')
-    headers.add('Content-Disposition', 'attachment',
-                filename=secure_filename(experiment.name) + "_configuration_runs.csv")
-    return Response(response=csv_response.read(), headers=headers)
+    results = experiment.get_result_arrays(db, experiment.solver_configurations, experiment.get_instances(db),
+                                           cost=experiment.defaultCost)
+
+    header = [p.name for p in configurable_parameters] + [p.name for p in instance_properties] + ['par1', 'censored']
+    # the rows are streamed after the session has been removed, look up the values first
+    instance_values = [[instances_by_id[idInstance].get_property_value(p.idProperty, db) for p in instance_properties]
+                       for idInstance in results.instance_ids]
+    parameters = [[parameter_values[idSolverConfig].get(p.idParameter, '') for p in configurable_parameters]
+                  for idSolverConfig in results.solver_config_ids]
+
+    def rows():
+        yield header
+        for i in xrange(len(results.instance_ids)):
+            for j in xrange(len(results.solver_config_ids)):
+                for k in xrange(results.run_count[i, j]):
+                    yield parameters[j] + instance_values[i] + \
+                          [float(results.par1[i, j, k]), 1 if results.censored[i, j, k] else 0]
+
+    return csv_download(experiment.name + "_configuration_runs.csv", rows())
 
 
 """
@@ -12,6 +12,8 @@
 
 import csv
 import datetime
+import hashlib
+import itertools
 
 try:
     from cjson import encode as json_dumps
@@ -27,6 +29,7 @@ import tempfile
 import tarfile
 import time
 import os
+from threading import Lock
 
 from PIL import Image
 from scipy.stats.mstats import mquantiles
@@ -36,21 +39,72 @@ from flask import render_template as render
 from flask import Response, abort, g, request, redirect, url_for
 from werkzeug import Headers, secure_filename
 
-from edacc import utils, models
+from edacc import utils, models, aggregates, blobs, job_search
 from sqlalchemy.orm import joinedload, joinedload_all
 from sqlalchemy import func, text as sqla_text
-from sqlalchemy.sql import not_
+from sqlalchemy.sql import not_, and_, select, expression
 from edacc.constants import *
 from edacc.views.helpers import require_phase, require_competition
 from edacc.views.helpers import require_login, is_admin
+from edacc.views.helpers import stream_query, csv_download, blob_response
 from edacc import forms
 from edacc.forms import EmptyQuery
 from edacc import monitor, clientMonitor
 from edacc import config
 from edacc import config_visualisation
+from edacc.web import cache
 
 frontend = Blueprint('frontend', __name__, template_folder='static')
 
+# packages of public solvers, see solver_download
+SOLVER_PACKAGE_DIR = os.path.join(config.TEMP_DIR, 'solver-packages')
+_solver_package_evict_lock = Lock()
+
+
+def solver_package_prefix(database, solver_id):
+    """ Returns the prefix of the file names of the packages of the solver in SOLVER_PACKAGE_DIR """
+    return secure_filename(database) + '-' + str(solver_id) + '-'
+
+
+def remove_solver_packages(database, solver_id):
+    """ Deletes the saved packages of the solver. Called when the code or the description PDF
+        of the solver is written, the outdated packages would only be deleted by evict_solver_packages. """
+    prefix = solver_package_prefix(database, solver_id)
+    try:
+        names = os.listdir(SOLVER_PACKAGE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix):
+            try:
+                os.remove(os.path.join(SOLVER_PACKAGE_DIR, name))
+            except OSError:
+                pass
+
+
+def evict_solver_packages():
+    """ Deletes the least recently used packages until SOLVER_PACKAGE_DIR is smaller than
+        config.SOLVER_PACKAGE_DIR_SIZE """
+    with _solver_package_evict_lock:
+        entries = []
+        total_size = 0
+        for name in os.listdir(SOLVER_PACKAGE_DIR):
+            if name.endswith('.tmp'): continue # being written
+            try:
+                st = os.stat(os.path.join(SOLVER_PACKAGE_DIR, name))
+            except OSError:
+                continue
+            entries.append((st.st_atime, st.st_size, name))
+            total_size += st.st_size
+        if total_size <= config.SOLVER_PACKAGE_DIR_SIZE: return
+        for atime, size, name in sorted(entries):
+            try:
+                os.remove(os.path.join(SOLVER_PACKAGE_DIR, name))
+            except OSError:
+                continue
+            total_size -= size
+            if total_size <= config.SOLVER_PACKAGE_DIR_SIZE: break
+
 
 @frontend.route('/impressum/<lang>')
 @frontend.route('/impressum')
@@ -215,48 +269,74 @@ def experiment_instances(database, experiment_id):
 @require_phase(phases=(6, 7))
 @require_login
 def download_instances(database, experiment_id):
-    """ Lets users download all instances of the experiment as tarball. TODO: improve memory usage """
+    """ Lets users download all instances of the experiment as tarball.
+        The tarball is streamed while the instance blobs are read from the database,
+        its size is known in advance from the lengths of the blobs.
+    """
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    instances = experiment.get_instances(db)
-    for instance in instances:
-        instance_blob, compressed = instance.get_compressed_instance(db)
-        instance_path = os.path.join(config.TEMP_DIR, 'tarballs', str(g.unique_id), *(instance.get_class_hierarchy()))
-        try:
-            os.makedirs(instance_path)
-        except:
-            pass
-        with open(os.path.join(instance_path, instance.name + ('.lzma' if compressed else '')), 'wb') as f:
-            f.write(instance_blob)
-
-    tmp_file = tempfile.TemporaryFile("w+b")
-    tar_file = tarfile.open(mode='w', fileobj=tmp_file)
-    tar_file.add(os.path.join(config.TEMP_DIR, 'tarballs', g.unique_id), experiment.name)
-    instance_tar_info = tarfile.TarInfo("README")
+    instances = sorted(experiment.get_instances(db), key=lambda i: i.idInstance)
+    table = db.metadata.tables['Instances']
+    c_instance = table.c['instance']
+    c_id = table.c['idInstance']
+    blob_info = dict()
+    if instances:
+        blob_info = dict((row[0], (row[1] == 'LZMA', row[2])) for row in db.session.connection().execute(
+            select([c_id, func.substring(c_instance, 1, 4), func.length(c_instance)],
+                   c_id.in_([i.idInstance for i in instances]))))
+
+    mtime = int(time.time())
     README_content = "Recursively extract compressed files by running: find directory/ -name *.lzma -exec unxz {} \\;"
-    instance_tar_info.size = len(README_content)
-    instance_tar_info.type = tarfile.REGTYPE
-    instance_tar_info.mtime = time.mktime(datetime.datetime.now().timetuple())
-    tar_file.addfile(instance_tar_info, fileobj=StringIO.StringIO(README_content))
-    tar_file.close()
 
-    import shutil
-
-    try:
-        shutil.rmtree(os.path.join(config.TEMP_DIR, 'tarballs', str(g.unique_id)))
-    except:
-        pass
-
-    file_size = tmp_file.tell()
-    tmp_file.seek(0)
+    # list of (instance Blob or None for directories and the README, member name, size, type, is compressed)
+    members = [(None, experiment.name, 0, tarfile.DIRTYPE, False)]
+    directories = set()
+    for instance in instances:
+        compressed, length = blob_info[instance.idInstance]
+        path = experiment.name
+        for instance_class in (instance.get_class_hierarchy() if instance.instance_classes else []):
+            path += '/' + instance_class
+            if path not in directories:
+                directories.add(path)
+                members.append((None, path, 0, tarfile.DIRTYPE, False))
+        # the blobs of compressed instances are prefixed with 'LZMA'
+        size = (length or 0) - 4 if compressed else (length or 0)
+        blob = blobs.Blob(db, 'Instances', 'instance', 'idInstance', instance.idInstance, length=length or 0)
+        members.append((blob, path + '/' + instance.name + ('.lzma' if compressed else ''),
+                        size, tarfile.REGTYPE, compressed))
+    members.append((None, 'README', len(README_content), tarfile.REGTYPE, False))
+
+    file_size = len(utils.TAR_END)
+    for _, name, size, type, _ in members:
+        file_size += len(utils.tar_header(name, size, mtime, type)) + size + len(utils.tar_padding(size))
+
+    def generate():
+        for blob, name, size, type, compressed in members:
+            yield utils.tar_header(name, size, mtime, type)
+            if type != tarfile.REGTYPE: continue
+            if blob is None:
+                chunks = [README_content]
+            else:
+                # read in chunks, one instance blob at a time
+                chunks = blob.chunks(4 if compressed else 0, size)
+            written = 0
+            for chunk in chunks:
+                written += len(chunk)
+                yield chunk
+            # the blob could have been shortened since its size was queried,
+            # the member has to have the announced size nevertheless
+            for pos in xrange(written, size, blobs.CHUNK_SIZE):
+                yield '\0' * min(blobs.CHUNK_SIZE, size - pos)
+            yield utils.tar_padding(size)
+        yield utils.TAR_END
 
     headers = Headers()
     headers.add('Content-Type', 'application/x-tar')
     headers.add('Content-Length', file_size)
     headers.add('Content-Disposition', 'attachment',
                 filename=(secure_filename(experiment.name + "_instances.tar")))
-    return Response(tmp_file, headers=headers, direct_passthrough=True)
+    return Response(generate(), headers=headers, direct_passthrough=True)
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/results/')
@@ -481,36 +561,32 @@ def experiment_results_full_csv(database, experiment_id):
     name_by_instance = dict((i.idInstance, i.name) for i in experiment.instances)
     md5_by_instance = dict((i.idInstance, i.md5) for i in experiment.instances)
 
-    csv_response = StringIO.StringIO()
-    csv_writer = csv.writer(csv_response)
-    csv_writer.writerow(['Experiment: ' + experiment.name, ])
-    csv_writer.writerow(['Instance', 'MD5'] + [sc.name.encode('utf-8') for sc in solver_configs])
-    for idInstance in results.iterkeys():
-        max_runs = 0
-        for idSolverConfig in solver_config_ids:
-            max_runs = max(max_runs, len(results[idInstance][idSolverConfig]))
-        for run in range(max_runs):
-            row = [name_by_instance[idInstance].encode('utf-8') + (
-                (u' attempt #' + str((run + 1))) if max_runs > 1 else ''), md5_by_instance[idInstance]]
+    answers = request.args.has_key('answers')
+    header = [['Experiment: ' + experiment.name, ],
+              ['Instance', 'MD5'] + [sc.name.encode('utf-8') for sc in solver_configs]]
+
+    def rows():
+        for idInstance in results.iterkeys():
+            max_runs = 0
             for idSolverConfig in solver_config_ids:
-                if run < len(results[idInstance][idSolverConfig]):
-                    if results[idInstance][idSolverConfig][run].status < -1:
-                        row.append('err')
-                    else:
-                        if request.args.has_key('answers'):
-                            row.append(str(results[idInstance][idSolverConfig][run].result_code_description or u''))
+                max_runs = max(max_runs, len(results[idInstance][idSolverConfig]))
+            for run in range(max_runs):
+                row = [name_by_instance[idInstance].encode('utf-8') + (
+                    (u' attempt #' + str((run + 1))) if max_runs > 1 else ''), md5_by_instance[idInstance]]
+                for idSolverConfig in solver_config_ids:
+                    if run < len(results[idInstance][idSolverConfig]):
+                        if results[idInstance][idSolverConfig][run].status < -1:
+                            row.append('err')
                         else:
-                            row.append(str(results[idInstance][idSolverConfig][run].penalized_time1 or u''))
-                else:
-                    row.append(u"")
-            csv_writer.writerow(row)
+                            if answers:
+                                row.append(str(results[idInstance][idSolverConfig][run].result_code_description or u''))
+                            else:
+                                row.append(str(results[idInstance][idSolverConfig][run].penalized_time1 or u''))
+                    else:
+                        row.append(u"")
+                yield row
 
-    csv_response.seek(0)
-    headers = Headers()
-    headers.add('Content-Type', 'text/csv')
-    headers.add('Content-Disposition', 'attachment',
-                filename=secure_filename(experiment.name + "_full_results.csv"))
-    return Response(response=csv_response.read(), headers=headers)
+    return csv_download(experiment.name + "_full_results.csv", itertools.chain(header, rows()))
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/results-by-solver/')
@@ -771,6 +847,87 @@ def experiment_progress(database, experiment_id):
                   database=database, db=db, JS_colors=JS_colors)
 
 
+# progress statistics of experiments shared by all clients polling them
+progress_stats_cache = utils.SingleFlightCache(config.PROGRESS_STATS_TTL)
+
+
+def experiment_progress_stats(db, experiment, with_eta=True):
+    """ Returns a dictionary with the progress statistics of the experiment.
+    The job counts are obtained from a single status x priority histogram query.
+    The estimated time left ('eta') needs the average time of the finished jobs
+    from the result aggregates and is only included if with_eta is True.
+    """
+    table = db.metadata.tables['ExperimentResults']
+    status = table.c['status']
+    active = expression.case([(table.c['priority'] >= 0, 1)], else_=0)
+    running_time = func.timestampdiff(sqla_text("SECOND"), table.c['startTime'], func.now())
+    s = select([status, expression.label('active', active),
+                func.count(table.c['idJob']),
+                func.sum(expression.case([(and_(status == STATUS_RUNNING,
+                                                running_time < table.c['CPUTimeLimit'] + 100), 1)], else_=0)),
+                func.sum(expression.case([(status == STATUS_RUNNING, running_time)], else_=0))],
+               table.c['Experiment_idExperiment'] == experiment.idExperiment) \
+        .group_by(status, active)
+
+    num_jobs = num_jobs_active = num_jobs_not_started = num_jobs_running = 0
+    num_jobs_finished = num_jobs_error = num_jobs_running_in_time = 0
+    num_all_running, running_time_sum = 0, 0.0
+    for job_status, job_active, count, running_in_time, running_sum in db.session.connection().execute(s):
+        num_jobs += count
+        if job_status == STATUS_RUNNING:
+            num_all_running += count
+            running_time_sum += float(running_sum or 0)
+        if not job_active: continue
+        num_jobs_active += count
+        num_jobs_running_in_time += int(running_in_time or 0)
+        if job_status == STATUS_NOT_STARTED:
+            num_jobs_not_started += count
+        elif job_status == STATUS_RUNNING:
+            num_jobs_running += count
+        elif job_status >= 1:
+            num_jobs_finished += count
+        elif job_status <= -2:
+            num_jobs_error += count
+
+    stats = {
+        'num_jobs': num_jobs,
+        'num_jobs_active': num_jobs_active,
+        'num_jobs_not_started': num_jobs_not_started,
+        'num_jobs_running': num_jobs_running,
+        'num_jobs_finished': num_jobs_finished,
+        'num_jobs_error': num_jobs_error,
+        'num_instances': experiment.get_num_instances(db),
+        'num_solver_configs': experiment.get_num_solver_configs(db),
+        'is_running': num_jobs_running_in_time > 0,
+        'has_crashed_jobs': num_jobs_error > 0,
+    }
+    if not with_eta: return stats
+
+    finished = aggregates.get_aggregates(db, experiment, 'resultTime').total()
+    if finished.num_finished == 0:
+        avg_time = 0.0
+    else:
+        avg_time = finished.finished_sum / finished.num_finished
+
+    if num_all_running > 0:
+        if num_jobs_finished + num_jobs_running != 0:
+            avg_time = ((num_jobs_finished * avg_time) + (num_jobs_running * running_time_sum / num_all_running)) / (
+                num_jobs_finished + num_jobs_running)
+
+    if num_jobs_running != 0:
+        timeleft = datetime.timedelta(
+            seconds=int((num_jobs_not_started + num_jobs_running) * avg_time / float(num_jobs_running)))
+    else:
+        timeleft = datetime.timedelta(seconds=0)
+    stats['eta'] = str(timeleft)
+    return stats
+
+
+def cached_experiment_progress_stats(database, db, experiment, with_eta=True):
+    return progress_stats_cache.get((database, experiment.idExperiment, with_eta),
+                                    lambda: experiment_progress_stats(db, experiment, with_eta))
+
+
 @frontend.route('/<database>/experiment/<int:experiment_id>/experiment-list-stats-ajax/')
 @require_phase(phases=OWN_RESULTS.union(ALL_RESULTS))
 @require_login
@@ -781,32 +938,10 @@ def experiment_list_stats_ajax(database, experiment_id):
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    num_jobs = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
-    num_instances = experiment.get_num_instances(db)
-    num_solver_configs = experiment.get_num_solver_configs(db)
-
-    experiment_running = db.session.query(db.ExperimentResult.Experiment_idExperiment,
-                                          func.count(db.ExperimentResult)) \
-                             .filter_by(status=STATUS_RUNNING) \
-                             .filter_by(experiment=experiment) \
-                             .filter(func.timestampdiff(sqla_text("SECOND"),
-                                                        db.ExperimentResult.startTime,
-                                                        func.now()) < db.ExperimentResult.CPUTimeLimit + 100) \
-                             .filter(db.ExperimentResult.priority >= 0).first()[1] > 0
-
-    experiment_crashes = db.session.query(db.ExperimentResult.Experiment_idExperiment,
-                                          func.count(db.ExperimentResult)) \
-                             .filter_by(experiment=experiment) \
-                             .filter(db.ExperimentResult.status <= -2) \
-                             .filter(db.ExperimentResult.priority >= 0).first()[1] > 0
-
-    return json_dumps({
-        'num_jobs': num_jobs,
-        'num_instances': num_instances,
-        'num_solver_configs': num_solver_configs,
-        'is_running': experiment_running,
-        'has_crashed_jobs': experiment_crashes,
-    })
+    # the experiment list polls all experiments, don't build their result aggregates for the ETA
+    stats = cached_experiment_progress_stats(database, db, experiment, with_eta=False)
+    return json_dumps(dict((key, stats[key]) for key in ('num_jobs', 'num_instances', 'num_solver_configs',
+                                                          'is_running', 'has_crashed_jobs')))
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/experiment-stats-ajax/')
@@ -820,80 +955,7 @@ def experiment_stats_ajax(database, experiment_id):
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    num_jobs = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
-    num_jobs_active = db.session.query(db.ExperimentResult) \
-        .filter_by(experiment=experiment) \
-        .filter(db.ExperimentResult.priority >= 0).count()
-    num_jobs_not_started = db.session.query(db.ExperimentResult) \
-        .filter_by(experiment=experiment, status=STATUS_NOT_STARTED) \
-        .filter(db.ExperimentResult.priority >= 0).count()
-    num_jobs_running = db.session.query(db.ExperimentResult) \
-        .filter_by(experiment=experiment, status=STATUS_RUNNING) \
-        .filter(db.ExperimentResult.priority >= 0).count()
-    num_jobs_finished = db.session.query(db.ExperimentResult) \
-        .filter_by(experiment=experiment).filter(db.ExperimentResult.status >= 1) \
-        .filter(db.ExperimentResult.priority >= 0).count()
-    num_jobs_error = db.session.query(db.ExperimentResult) \
-        .filter_by(experiment=experiment).filter(db.ExperimentResult.status <= -2) \
-        .filter(db.ExperimentResult.priority >= 0).count()
-
-    num_instances = experiment.get_num_instances(db)
-    num_solver_configs = experiment.get_num_solver_configs(db)
-
-    experiment_running = db.session.query(db.ExperimentResult.Experiment_idExperiment,
-                                          func.count(db.ExperimentResult)) \
-                             .filter_by(status=STATUS_RUNNING) \
-                             .filter_by(experiment=experiment) \
-                             .filter(func.timestampdiff(sqla_text("SECOND"),
-                                                        db.ExperimentResult.startTime,
-                                                        func.now()) < db.ExperimentResult.CPUTimeLimit + 100) \
-                             .filter(db.ExperimentResult.priority >= 0).first()[1] > 0
-
-    experiment_crashes = db.session.query(db.ExperimentResult.Experiment_idExperiment,
-                                          func.count(db.ExperimentResult)) \
-                             .filter_by(experiment=experiment) \
-                             .filter(db.ExperimentResult.status <= -2) \
-                             .filter(db.ExperimentResult.priority >= 0).first()[1] > 0
-
-    avg_time = db.session.query(func.avg(db.ExperimentResult.resultTime)) \
-        .filter_by(experiment=experiment) \
-        .filter(db.ExperimentResult.status >= 1) \
-        .first()
-    if avg_time is None or avg_time[0] is None:
-        avg_time = 0.0
-    else:
-        avg_time = avg_time[0]
-
-    avg_running_time = db.session.query(func.avg(func.timestampdiff(sqla_text("SECOND"),
-                                                                    db.ExperimentResult.startTime, func.now()))) \
-        .filter_by(experiment=experiment) \
-        .filter(db.ExperimentResult.status == 0) \
-        .first()
-
-    if avg_running_time[0] is not None:
-        if num_jobs_finished + num_jobs_running != 0:
-            avg_time = ((num_jobs_finished * avg_time) + (num_jobs_running * float(avg_running_time[0]))) / (
-                num_jobs_finished + num_jobs_running)
-
-    if num_jobs_running != 0:
-        timeleft = datetime.timedelta(
-            seconds=int((num_jobs_not_started + num_jobs_running) * avg_time / float(num_jobs_running)))
-    else:
-        timeleft = datetime.timedelta(seconds=0)
-
-    return json_dumps({
-        'num_jobs': num_jobs,
-        'num_jobs_active': num_jobs_active,
-        'num_jobs_not_started': num_jobs_not_started,
-        'num_jobs_running': num_jobs_running,
-        'num_jobs_finished': num_jobs_finished,
-        'num_jobs_error': num_jobs_error,
-        'num_instances': num_instances,
-        'num_solver_configs': num_solver_configs,
-        'is_running': experiment_running,
-        'has_crashed_jobs': experiment_crashes,
-        'eta': str(timeleft),
-    })
+    return json_dumps(cached_experiment_progress_stats(database, db, experiment))
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/experiment-results-csv/')
@@ -934,8 +996,7 @@ def experiment_results_csv(database, experiment_id):
                       """ % (
             prop.name.replace("%", "%%"), prop.name.replace("%", "%%"), prop.name.replace("%", "%%"), prop.idProperty)
 
-    conn = db.session.connection()
-    base_query = """SELECT SQL_CALC_FOUND_ROWS ExperimentResults.idJob,
+    base_query = """SELECT ExperimentResults.idJob,
                        SolverConfig.name, Instances.name, Instances.md5,
                        ExperimentResults.run, ExperimentResults.resultTime, ExperimentResults.wallTime, ExperimentResults.cost,
                        ExperimentResults.seed, ExperimentResults.status,
@@ -964,27 +1025,43 @@ def experiment_results_csv(database, experiment_id):
 
     # if competition db, show only own solvers unless phase is 6 or 7
     if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
-        res = conn.execute(base_query + """ AND Solver.User_idUser = %s """, (experiment_id, g.User.idUser))
-        jobs = res.fetchall()
+        jobs = stream_query(db, base_query + """ AND Solver.User_idUser = %s """, (experiment_id, g.User.idUser))
     else:
-        res = conn.execute(base_query, (experiment_id, ))
-        jobs = res.fetchall()
+        jobs = stream_query(db, base_query, (experiment_id, ))
 
-    csv_response = StringIO.StringIO()
-    csv_writer = csv.writer(csv_response)
-    csv_writer.writerow(
-        ['id', 'Solver', 'Instance', 'Instance MD5', 'Run', 'Time', 'Walltime', 'Cost', 'Seed', 'status code',
-         'result code', 'Status'] +
-        ['Result', 'running time', 'CPUTimeLimit', 'wallClockTimeLimit', 'memoryLimit'] +
-        ['stackSizeLimit', 'computeNode', 'computeNodeIP',
-         'priority', 'computeQueue ID'] +
-        [p.name for p in result_properties] + [p.name for p in instance_properties])
-    csv_writer.writerows(jobs)
-    csv_response.seek(0)
-    headers = Headers()
-    headers.add('Content-Type', 'text/csv')
-    headers.add('Content-Disposition', 'attachment', filename=secure_filename(experiment.name) + "_data.csv")
-    return Response(response=csv_response.read(), headers=headers)
+    header = ['id', 'Solver', 'Instance', 'Instance MD5', 'Run', 'Time', 'Walltime', 'Cost', 'Seed', 'status code',
+              'result code', 'Status'] + \
+             ['Result', 'running time', 'CPUTimeLimit', 'wallClockTimeLimit', 'memoryLimit'] + \
+             ['stackSizeLimit', 'computeNode', 'computeNodeIP',
+              'priority', 'computeQueue ID'] + \
+             [p.name for p in result_properties] + [p.name for p in instance_properties]
+    return csv_download(experiment.name + "_data.csv", itertools.chain([header], jobs))
+
+
+# sort columns of the job datatable that can't be used for keyset pagination (see experiment_progress_ajax):
+# the running time and the FLOAT columns
+NON_SEEKABLE_COLUMNS = ("runningTime", "ExperimentResults.resultTime", "ExperimentResults.wallTime",
+                        "ExperimentResults.cost")
+
+# joins of the job datatable query, see experiment_progress_ajax
+JOB_TABLE_JOINS = """
+                    LEFT JOIN ResultCodes ON ExperimentResults.resultCode=ResultCodes.resultCode
+                    LEFT JOIN StatusCodes ON ExperimentResults.status=StatusCodes.statusCode
+                    LEFT JOIN SolverConfig ON ExperimentResults.SolverConfig_idSolverConfig = SolverConfig.idSolverConfig
+                    LEFT JOIN SolverBinaries ON SolverBinaries.idSolverBinary = SolverConfig.SolverBinaries_idSolverBinary
+                    LEFT JOIN Solver ON Solver.idSolver = SolverBinaries.idSolver
+                    LEFT JOIN Instances ON ExperimentResults.Instances_idInstance = Instances.idInstance
+                    LEFT JOIN gridQueue ON gridQueue.idgridQueue=ExperimentResults.computeQueue
+                    """
+
+
+@cache.memoize(7 * 24 * 60 * 60)
+def count_jobs(database, query, params, data_version):
+    """ Returns the result of a COUNT query of the jobs of an experiment.
+        data_version is the version stamp of the experiment data, so the
+        count is cached until the jobs of the experiment change. """
+    db = models.get_database(database)
+    return db.session.connection().execute(query, params).fetchone()[0]
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/progress-ajax/')
@@ -1050,7 +1127,13 @@ def experiment_progress_ajax(database, experiment_id):
 
     params = []
     where_clause = ""
+    search_condition = None
     if request.args.has_key('sSearch') and request.args.get('sSearch') != '':
+        search_condition = job_search.search_condition(db, experiment.idExperiment, request.args.get('sSearch'))
+    if search_condition is not None:
+        where_clause, params = search_condition[0], list(search_condition[1])
+    elif request.args.has_key('sSearch') and request.args.get('sSearch') != '':
+        # the search index of the experiment is being built
         where_clause += "(ExperimentResults.idJob LIKE %s OR "
         where_clause += "Instances.name LIKE %s OR "
         where_clause += "SolverConfig.name LIKE %s OR "
@@ -1073,25 +1156,44 @@ def experiment_progress_ajax(database, experiment_id):
     if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
         where_clause += " AND Solver.User_idUser = %s "
         params.append(g.User.idUser)
+    filter_clause, filter_params = where_clause, list(params)
 
-    order = ""
+    # sort columns and directions, the job ID breaks ties so the order is the same on every request
+    sort = []
     if request.args.get('iSortCol_0', '') != '' and int(request.args.get('iSortingCols', 0)) > 0:
-        order = "ORDER BY "
         for i in xrange(int(request.args.get('iSortingCols', 0))):
-            order += columns[int(request.args.get('iSortCol_' + str(i)))] + " "
             direction = request.args.get('sSortDir_' + str(i))
-            if direction in ('asc', 'desc'):
-                order += direction + ", "
-        order = order[:-2]
+            sort.append((columns[int(request.args.get('iSortCol_' + str(i)))], 'desc' if direction == 'desc' else 'asc'))
+    sort.append(("ExperimentResults.idJob", 'asc'))
+    order = "ORDER BY " + ", ".join(column + " " + direction for column, direction in sort)
+    # the running time changes all the time and MySQL returns FLOAT values rounded, so the position of
+    # a row can't be compared with either in the WHERE clause; such pages are selected by LIMIT offset
+    seekable = not any(column in NON_SEEKABLE_COLUMNS for column, _ in sort)
+    # values of the sort columns (except for the job ID in the first column) for keyset pagination
+    sort_columns = "".join(", " + column for column, _ in sort[:-1]) if seekable else ""
+
+    # Pages following a page that was requested before start after the position of its last row
+    # in the sort order (keyset pagination) instead of skipping all rows before them (LIMIT offset),
+    # which requires sorting them. The positions are cached per version of the experiment data.
+    data_version = experiment.get_data_version(db)
+    page_key = lambda start: 'job_datatable_page:' + hashlib.sha1(
+        repr((database, experiment.idExperiment, data_version, filter_clause, filter_params, order, start))).hexdigest()
 
     limit = ""
+    start, length = 0, -1
     if request.args.get('iDisplayStart', '') != '' and int(request.args.get('iDisplayLength', -1)) != -1:
+        start, length = int(request.args.get('iDisplayStart')), int(request.args.get('iDisplayLength'))
         limit = "LIMIT %s, %s"
-        params.append(int(request.args.get('iDisplayStart')))
-        params.append(int(request.args.get('iDisplayLength')))
+        position = cache.get(page_key(start)) if seekable and start > 0 else None
+        if position is not None:
+            seek_condition, seek_params = utils.keyset_condition(sort, position)
+            where_clause += " AND " + seek_condition
+            params += seek_params
+            params += [0, length]
+        else:
+            params += [start, length]
 
-    conn = db.session.connection()
-    res = conn.execute("""SELECT SQL_CALC_FOUND_ROWS ExperimentResults.idJob,
+    query = """SELECT ExperimentResults.idJob,
                        SolverConfig.name, Instances.name,
                        ExperimentResults.run, ExperimentResults.resultTime, ExperimentResults.wallTime, ExperimentResults.cost,
                        ExperimentResults.seed,
@@ -1105,56 +1207,47 @@ def experiment_progress_ajax(database, experiment_id):
                        ExperimentResults.stackSizeLimit,
                        ExperimentResults.computeNode, ExperimentResults.computeNodeIP, ExperimentResults.priority,
                        gridQueue.name
-                       """ + (',' if prop_columns else '') + prop_columns + """
-                 FROM ExperimentResults
-                    LEFT JOIN ResultCodes ON ExperimentResults.resultCode=ResultCodes.resultCode
-                    LEFT JOIN StatusCodes ON ExperimentResults.status=StatusCodes.statusCode
-                    LEFT JOIN SolverConfig ON ExperimentResults.SolverConfig_idSolverConfig = SolverConfig.idSolverConfig
-                    LEFT JOIN SolverBinaries ON SolverBinaries.idSolverBinary = SolverConfig.SolverBinaries_idSolverBinary
-                    LEFT JOIN Solver ON Solver.idSolver = SolverBinaries.idSolver
-                    LEFT JOIN Instances ON ExperimentResults.Instances_idInstance = Instances.idInstance
-                    LEFT JOIN gridQueue ON gridQueue.idgridQueue=ExperimentResults.computeQueue
-                    """ + prop_joins + """
-                 WHERE """ + where_clause + " " + order + " " + limit, tuple(params))
-
-    jobs = res.fetchall()
-
-    res = conn.execute("SELECT FOUND_ROWS()")
-    numFiltered = res.fetchone()[0]
-    res = conn.execute("""SELECT COUNT(ExperimentResults.idJob)
-                       FROM ExperimentResults WHERE Experiment_idExperiment = %s""",
-                       experiment.idExperiment)
-    numTotal = res.fetchone()[0]
-
-    aaData = []
-    for job in jobs:
-        if job.status == 0: # status == running
-            running = job.runningTime
+                       """ + (',' if prop_columns else '') + prop_columns + sort_columns + """
+                 FROM ExperimentResults """ + JOB_TABLE_JOINS + prop_joins + """
+                 WHERE """ + where_clause + " " + order + " " + limit
+
+    def job_row(job):
+        # streamed rows are plain tuples
+        if job[11] == 0: # status == running
+            running = job[9]
         else:
             running = "not running"
 
-        aaData.append([job.idJob, job[1], job[2], job[3],
-                       job[4], job[5], job[6], job[7], job[8], running, job[10], job[11], \
-                       job[12], job[13], job[14], job[15], job[16], job[17], job[18], job[19]] \
-                      + [job[i] for i in xrange(20, 20 + len(result_properties))]
-            #+ [job[i] for i in xrange(20+len(result_properties), 19+len(result_properties)+len(instance_properties))]
-        )
+        return [job[0], job[1], job[2], job[3],
+                job[4], job[5], job[6], job[7], job[8], running, job[10], job[11], \
+                job[12], job[13], job[14], job[15], job[16], job[17], job[18], job[19]] \
+               + [job[i] for i in xrange(20, 20 + len(result_properties))]
+        #+ [job[i] for i in xrange(20+len(result_properties), 19+len(result_properties)+len(instance_properties))]
 
     if request.args.has_key('csv'):
-        csv_response = StringIO.StringIO()
-        csv_writer = csv.writer(csv_response)
-        csv_writer.writerow(
-            ['id', 'Solver', 'Instance', 'Run', 'Time', 'Walltime', 'Cost', 'Seed', 'status code', 'Status'] +
-            ['Result', 'running time', 'CPUTimeLimit', 'wallClockTimeLimit', 'memoryLimit'] +
-            ['stackSizeLimit', 'computeNode', 'computeNodeIP', 'priority', 'computeQueue ID'] +
-            [p.name for p in result_properties]) # +  [p.name for p in instance_properties])
-        for d in aaData:
-            csv_writer.writerow(d)
-        csv_response.seek(0)
-        headers = Headers()
-        headers.add('Content-Type', 'text/csv')
-        headers.add('Content-Disposition', 'attachment', filename=secure_filename(experiment.name) + "_data.csv")
-        return Response(response=csv_response.read(), headers=headers)
+        header = ['id', 'Solver', 'Instance', 'Run', 'Time', 'Walltime', 'Cost', 'Seed', 'status code', 'Status'] + \
+                 ['Result', 'running time', 'CPUTimeLimit', 'wallClockTimeLimit', 'memoryLimit'] + \
+                 ['stackSizeLimit', 'computeNode', 'computeNodeIP', 'priority', 'computeQueue ID'] + \
+                 [p.name for p in result_properties] # +  [p.name for p in instance_properties])
+        jobs = stream_query(db, query, tuple(params))
+        return csv_download(experiment.name + "_data.csv", itertools.chain([header], itertools.imap(job_row, jobs)))
+
+    conn = db.session.connection()
+    jobs = conn.execute(query, tuple(params)).fetchall()
+    if seekable and length > 0 and len(jobs) == length:
+        # remember where the next page starts
+        last = jobs[-1]
+        cache.set(page_key(start + length), list(last[len(last) - len(sort) + 1:]) + [last.idJob],
+                  timeout=60 * 60)
+
+    numFiltered = count_jobs(database, """SELECT COUNT(ExperimentResults.idJob) FROM ExperimentResults """ +
+                                       JOB_TABLE_JOINS + """ WHERE """ + filter_clause,
+                             tuple(filter_params), data_version)
+    numTotal = count_jobs(database, """SELECT COUNT(ExperimentResults.idJob)
+                                    FROM ExperimentResults WHERE Experiment_idExperiment = %s""",
+                          (experiment.idExperiment, ), data_version)
+
+    aaData = [job_row(job) for job in jobs]
 
     return json_dumps({
         'aaData': aaData,
@@ -1269,19 +1362,26 @@ def instance_details(database, instance_id):
     if db.is_competition() and db.competition_phase() not in INSTANCE_DETAILS and not is_admin():
         abort(403)
 
-    instance_blob = instance.get_instance(db)
-    if len(instance_blob) > 1024:
+    instance_blob = instance.get_blob(db)
+    # the size of compressed instances with end marker is unknown, show the compressed size
+    blob_size = instance_blob.uncompressed_size
+    if blob_size is None or blob_size > 1024:
         # show only the first and last 512 characters if the instance is larger than 1kB
-        instance_text = instance_blob[:512] + "\n\n... [truncated " + \
-                        utils.download_size(len(instance_blob) - 1024) + \
-                        "]\n\n" + instance_blob[-512:]
+        if instance_blob.compressed and (blob_size is None or instance_blob.size > 32 * 1024 * 1024):
+            # the end of large compressed instances can only be found by decompressing them completely
+            instance_text = instance_blob.head(512) + "\n\n... [truncated]"
+        else:
+            instance_text = instance_blob.head(512) + "\n\n... [truncated " + \
+                            utils.download_size(blob_size - 1024) + \
+                            "]\n\n" + instance_blob.tail(512)
     else:
-        instance_text = instance_blob
+        instance_text = instance_blob.head(blob_size)
 
     instance_properties = db.get_instance_properties()
 
     return render('instance_details.html', instance=instance,
-                  instance_text=instance_text, blob_size=len(instance_blob),
+                  instance_text=instance_text,
+                  blob_size=instance_blob.size if blob_size is None else blob_size,
                   database=database, db=db,
                   instance_properties=instance_properties)
 
@@ -1296,11 +1396,14 @@ def instance_download(database, instance_id):
     if db.is_competition() and db.competition_phase() not in INSTANCE_DETAILS and not is_admin():
         abort(403)
 
+    instance_blob = instance.get_blob(db)
     headers = Headers()
     headers.add('Content-Type', 'text/plain')
     headers.add('Content-Disposition', 'attachment', filename=instance.name)
+    if instance_blob.uncompressed_size is not None:
+        headers.add('Content-Length', instance_blob.uncompressed_size)
 
-    return Response(response=instance.get_instance(db), headers=headers)
+    return Response(response=instance_blob.decompressed_chunks(), headers=headers, direct_passthrough=True)
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/solver-configurations/<int:solver_configuration_id>')
@@ -1389,6 +1492,10 @@ def solver_description_download(database, solver_id):
 @require_competition
 @require_login
 def solver_download(database, solver_config_id):
+    """ Lets users download the package (tarball) of a public solver.
+        Packages are streamed from the solver blobs and written to SOLVER_PACKAGE_DIR at the same time,
+        later downloads of an unchanged package are served from that file.
+    """
     db = models.get_database(database) or abort(404)
     solver_config = db.session.query(db.SolverConfiguration).get(solver_config_id) or abort(404)
     solver = solver_config.solver_binary.solver
@@ -1396,53 +1503,107 @@ def solver_download(database, solver_config_id):
 
     if solver.public not in (1, 2, 3): abort(404)
 
-    tmp_file = tempfile.TemporaryFile("w+b")
-    tar_file = tarfile.open(mode='w', fileobj=tmp_file)
-
-    # Add README file
-    tar_info = tarfile.TarInfo("README.txt")
-    readme_template = flask.current_app.jinja_env.get_template("other/solver_download_readme.txt")
-    README_content = readme_template.render(solver=solver, solver_config=solver_config, db=db, )
-    tar_info.size = len(README_content)
-    tar_info.type = tarfile.REGTYPE
-    tar_info.mtime = time.mktime(datetime.datetime.now().timetuple())
-    tar_file.addfile(tar_info, fileobj=StringIO.StringIO(README_content.encode('utf-8')))
-
-    if solver.public in (1, 3) and solver_binary.binaryArchive:
+    # list of (member name, blob or string)
+    members = []
+    if solver.public in (1, 3):
         # Add solver binary
-        tar_solver = tarfile.TarInfo("binary.zip")
-        tar_solver.size = len(solver_binary.binaryArchive)
-        tar_solver.type = tarfile.REGTYPE
-        tar_solver.mtime = time.mktime(datetime.datetime.now().timetuple())
-        tar_file.addfile(tar_solver, fileobj=StringIO.StringIO(solver_binary.binaryArchive))
-
-    if solver.public in (2, 3) and solver.code:
+        members.append(("binary.zip", blobs.Blob(db, 'SolverBinaries', 'binaryArchive', 'idSolverBinary',
+                                                 solver_binary.idSolverBinary)))
+    if solver.public in (2, 3):
         # Add solver code
-        tar_code = tarfile.TarInfo("code.zip")
-        tar_code.size = len(solver.code)
-        tar_code.type = tarfile.REGTYPE
-        tar_code.mtime = time.mktime(datetime.datetime.now().timetuple())
-        tar_file.addfile(tar_code, fileobj=StringIO.StringIO(solver.code))
+        members.append(("code.zip", blobs.Blob(db, 'Solver', 'code', 'idSolver', solver.idSolver)))
+    # Add solver description
+    description = blobs.Blob(db, 'Solver', 'description_pdf', 'idSolver', solver.idSolver)
+    members.append(("description.pdf", description))
+    members = [(name, blob) for name, blob in members if blob.length > 0]
 
-    if solver.description_pdf:
-        # Add solver description
-        tar_description = tarfile.TarInfo("description.pdf")
-        tar_description.size = len(solver.description_pdf)
-        tar_description.type = tarfile.REGTYPE
-        tar_description.mtime = time.mktime(datetime.datetime.now().timetuple())
-        tar_file.addfile(tar_description, fileobj=StringIO.StringIO(solver.description_pdf))
-
-    tar_file.close()
-
-    file_size = tmp_file.tell()
-    tmp_file.seek(0)
+    # Add README file
+    readme_template = flask.current_app.jinja_env.get_template("other/solver_download_readme.txt")
+    README_content = readme_template.render(solver=solver, solver_config=solver_config, db=db,
+                                            has_description_pdf=description.length > 0).encode('utf-8')
+    members.insert(0, ("README.txt", README_content))
+
+    # the tables have no modification times, the package is identified by the README, the lengths of the
+    # blobs, the checksum of the binary kept by EDACC and checksums of the code and the description
+    # computed by the database (which doesn't transfer them)
+    solver_blobs = [data for name, data in members[1:] if data.column.table.name == 'Solver']
+    if solver_blobs:
+        checksums = tuple(db.session.connection().execute(
+            select([func.md5(data.column) for data in solver_blobs], solver_blobs[0].where)).first() or ())
+    else:
+        checksums = ()
+    package_id = hashlib.sha1(repr((hashlib.sha1(README_content).hexdigest(), solver.idSolver,
+                                    solver_binary.idSolverBinary, solver_binary.md5, checksums,
+                                    [(name, data.length) for name, data in members[1:]]))).hexdigest()
+    package_prefix = solver_package_prefix(database, solver.idSolver) + str(solver_config_id) + '-'
+    package_path = os.path.join(SOLVER_PACKAGE_DIR, package_prefix + package_id + '.tar')
+    download_name = secure_filename(db.label + "_" + solver.name + ".tar")
+
+    if os.path.exists(package_path):
+        # served by the web server (X-Sendfile) or the WSGI server's file wrapper if available
+        return flask.send_file(package_path, mimetype='application/x-tar', as_attachment=True,
+                               attachment_filename=download_name, add_etags=False)
+
+    mtime = int(time.time())
+    file_size = len(utils.TAR_END)
+    for name, data in members:
+        size = data.length if isinstance(data, blobs.Blob) else len(data)
+        file_size += len(utils.tar_header(name, size, mtime)) + size + len(utils.tar_padding(size))
+
+    complete = [True] # False if a blob was shortened while the package was streamed
+
+    def package():
+        for name, data in members:
+            if isinstance(data, blobs.Blob):
+                yield utils.tar_header(name, data.length, mtime)
+                written = 0
+                for chunk in data.chunks():
+                    written += len(chunk)
+                    yield chunk
+                # the blob could have been shortened since its length was queried, the
+                # padded package is still sent but not saved
+                if written != data.length: complete[0] = False
+                yield '\0' * (data.length - written)
+                yield utils.tar_padding(data.length)
+            else:
+                yield utils.tar_header(name, len(data), mtime)
+                yield data
+                yield utils.tar_padding(len(data))
+        yield utils.TAR_END
+
+    def generate():
+        """ Streams the package and saves it, unless the download is aborted or a blob was shortened """
+        try:
+            os.makedirs(SOLVER_PACKAGE_DIR)
+        except OSError:
+            pass
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=SOLVER_PACKAGE_DIR)
+        saved = False
+        try:
+            with os.fdopen(fd, 'wb') as package_file:
+                for chunk in package():
+                    package_file.write(chunk)
+                    yield chunk
+            if not complete[0]: return
+            os.rename(temp_path, package_path)
+            saved = True
+            # remove outdated packages of the solver configuration
+            for name in os.listdir(SOLVER_PACKAGE_DIR):
+                if name.startswith(package_prefix) and name != os.path.basename(package_path):
+                    try:
+                        os.remove(os.path.join(SOLVER_PACKAGE_DIR, name))
+                    except OSError:
+                        pass
+            evict_solver_packages()
+        finally:
+            if not saved:
+                os.remove(temp_path)
 
     headers = Headers()
     headers.add('Content-Type', 'application/x-tar')
     headers.add('Content-Length', file_size)
-    headers.add('Content-Disposition', 'attachment',
-                filename=(secure_filename(db.label + "_" + solver.name + ".tar")))
-    return Response(tmp_file, headers=headers, direct_passthrough=True)
+    headers.add('Content-Disposition', 'attachment', filename=download_name)
+    return Response(generate(), headers=headers, direct_passthrough=True)
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/result/')
@@ -1457,15 +1618,17 @@ def experiment_result(database, experiment_id):
     if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
         if result.solver_configuration.solver_binary.solver.user != g.User: abort(401)
 
-    solverOutput = result.output.solverOutput
-    launcherOutput = result.output.launcherOutput
-    watcherOutput = result.output.watcherOutput
-    verifierOutput = result.output.verifierOutput
+    # fetch only the lengths and the parts of the outputs that are shown
+    try:
+        windows = blobs.get_windows(db, 'ExperimentResultsOutput', OUTPUT_COLUMNS, output_id_column(db),
+                                    result.idJob, 2048)
+    except KeyError:
+        windows = dict((column, (None, None, None)) for column in OUTPUT_COLUMNS)
 
-    solverOutput_text = utils.formatOutputFile(solverOutput)
-    launcherOutput_text = utils.formatOutputFile(launcherOutput)
-    watcherOutput_text = utils.formatOutputFile(watcherOutput)
-    verifierOutput_text = utils.formatOutputFile(verifierOutput)
+    solverOutput_text = utils.formatOutputWindow(*windows['solverOutput'])
+    launcherOutput_text = utils.formatOutputWindow(*windows['launcherOutput'])
+    watcherOutput_text = utils.formatOutputWindow(*windows['watcherOutput'])
+    verifierOutput_text = utils.formatOutputWindow(*windows['verifierOutput'])
 
     return render('result_details.html', experiment=experiment, result=result, solver=result.solver_configuration,
                   solver_config=result.solver_configuration, instance=result.instance,
@@ -1500,22 +1663,36 @@ def solved_instances(database, experiment_id):
                   solved_instances=solved_instances, instance_properties=db.get_instance_properties())
 
 
-@frontend.route('/<database>/experiment/<int:experiment_id>/result/<int:result_id>/download-solver-output')
-@require_phase(phases=OWN_RESULTS.union(ALL_RESULTS))
-@require_login
-def solver_output_download(database, experiment_id, result_id):
-    """ Returns the specified job client output file as HTTP response """
+OUTPUT_COLUMNS = ('solverOutput', 'launcherOutput', 'watcherOutput', 'verifierOutput')
+
+
+def output_id_column(db):
+    """ Returns the name of the job ID column (primary key) of the ExperimentResultsOutput table """
+    return list(db.metadata.tables['ExperimentResultsOutput'].primary_key)[0].name
+
+
+def output_download(database, result_id, column):
+    """ Returns the output column of the specified job as HTTP response that is
+        streamed in chunks and supports byte ranges """
     db = models.get_database(database) or abort(404)
     result = db.session.query(db.ExperimentResult).get(result_id) or abort(404)
 
     if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
         if result.solver_configuration.solver_binary.solver.user != g.User: abort(401)
 
-    headers = Headers()
-    headers.add('Content-Type', 'text/plain')
-    headers.add('Content-Disposition', 'attachment', filename="result.txt")
+    try:
+        output = blobs.Blob(db, 'ExperimentResultsOutput', column, output_id_column(db), result_id)
+    except KeyError:
+        abort(404)
+    return blob_response(output, "result.txt")
 
-    return Response(response=result.output.solverOutput, headers=headers)
+
+@frontend.route('/<database>/experiment/<int:experiment_id>/result/<int:result_id>/download-solver-output')
+@require_phase(phases=OWN_RESULTS.union(ALL_RESULTS))
+@require_login
+def solver_output_download(database, experiment_id, result_id):
+    """ Returns the specified job client output file as HTTP response """
+    return output_download(database, result_id, 'solverOutput')
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/result/<int:result_id>/download-launcher-output')
@@ -1523,17 +1700,7 @@ def solver_output_download(database, experiment_id, result_id):
 @require_login
 def launcher_output_download(database, experiment_id, result_id):
     """ Returns the specified job client output file as HTTP response """
-    db = models.get_database(database) or abort(404)
-    result = db.session.query(db.ExperimentResult).get(result_id) or abort(404)
-
-    if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
-        if result.solver_configuration.solver_binary.solver.user != g.User: abort(401)
-
-    headers = Headers()
-    headers.add('Content-Type', 'text/plain')
-    headers.add('Content-Disposition', 'attachment', filename="result.txt")
-
-    return Response(response=result.output.launcherOutput, headers=headers)
+    return output_download(database, result_id, 'launcherOutput')
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/result/<int:result_id>/download-watcher-output')
@@ -1541,17 +1708,7 @@ def launcher_output_download(database, experiment_id, result_id):
 @require_login
 def watcher_output_download(database, experiment_id, result_id):
     """ Returns the specified job client output file as HTTP response """
-    db = models.get_database(database) or abort(404)
-    result = db.session.query(db.ExperimentResult).get(result_id) or abort(404)
-
-    if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
-        if result.solver_configuration.solver_binary.solver.user != g.User: abort(401)
-
-    headers = Headers()
-    headers.add('Content-Type', 'text/plain')
-    headers.add('Content-Disposition', 'attachment', filename="result.txt")
-
-    return Response(response=result.output.watcherOutput, headers=headers)
+    return output_download(database, result_id, 'watcherOutput')
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/result/<int:result_id>/download-verifier-output')
@@ -1559,17 +1716,7 @@ def watcher_output_download(database, experiment_id, result_id):
 @require_login
 def verifier_output_download(database, experiment_id, result_id):
     """ Returns the specified job client output file as HTTP response """
-    db = models.get_database(database) or abort(404)
-    result = db.session.query(db.ExperimentResult).get(result_id) or abort(404)
-
-    if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
-        if result.solver_configuration.solver_binary.solver.user != g.User: abort(401)
-
-    headers = Headers()
-    headers.add('Content-Type', 'text/plain')
-    headers.add('Content-Disposition', 'attachment', filename="result.txt")
-
-    return Response(response=result.output.verifierOutput, headers=headers)
+    return output_download(database, result_id, 'verifierOutput')
 
 
 @frontend.route('/<database>/power/')
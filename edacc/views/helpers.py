@@ -10,13 +10,21 @@
     :license: MIT, see LICENSE for details.
 """
 
+import csv
 import hashlib
+import StringIO
 from functools import wraps
 
-from flask import abort, session, url_for, redirect, g, request, flash
+from flask import abort, session, url_for, redirect, g, request, flash, jsonify, render_template
+from flask import Response, make_response as flask_response
+from werkzeug import Headers, secure_filename
 import pbkdf2
+from MySQLdb.cursors import SSCursor
 
-from edacc import config, models, config
+from edacc import config, models, config, tasks
+
+# seconds MySQL waits for a streamed query's rows to be read, see stream_query
+STREAM_NET_WRITE_TIMEOUT = 60 * 60
 
 # decorates a decorator function to be able to specify parameters :-)
 decorator_with_args = lambda decorator: lambda *args, **kwargs: \
@@ -138,6 +146,109 @@ def require_login(f):
     return decorated_f
 
 
+def task_status_response(task_id, **context):
+    """ Response to a request whose result is computed by the background task
+        task_id (see edacc.tasks) that isn't finished yet: The status of the
+        task as JSON for requests with the GET parameter format=json, otherwise
+        a page that shows the progress and reloads when the task is finished.
+        The context (db, database, experiment) is passed to the page template.
+    """
+    status = tasks.status(task_id)
+    if request.args.get('format') == 'json':
+        response = jsonify(status)
+    else:
+        response = flask_response(render_template('/analysis/task_status.html', status=status, **context))
+    response.status_code = 202
+    return response
+
+
+def stream_query(db, query, params=(), batch_size=None):
+    """ Generator of the rows (tuples) of an SQL query that are fetched from
+        an unbuffered server-side cursor (MySQLdb's SSCursor) in batches of
+        batch_size rows (default: config.CSV_BATCH_SIZE). SQLAlchemy's
+        stream_results option is only implemented for PostgreSQL.
+
+        The query runs on its own connection, which is closed when the generator
+        is exhausted or closed, because the rows can be consumed after the
+        request's session has been removed (e.g. by streamed responses).
+        No other query can be executed on that connection meanwhile.
+    """
+    conn = db.engine.connect()
+    finished = False
+    try:
+        cursor = conn.connection.cursor(SSCursor)
+        # the rows are consumed as fast as the client downloads the response,
+        # keep MySQL from aborting the query while it waits for us to read
+        cursor.execute("SET SESSION net_write_timeout = %s", (STREAM_NET_WRITE_TIMEOUT, ))
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size or config.CSV_BATCH_SIZE)
+            if not rows: break
+            for row in rows:
+                yield row
+        cursor.close()
+        cursor = conn.connection.cursor()
+        cursor.execute("SET SESSION net_write_timeout = @@GLOBAL.net_write_timeout")
+        cursor.close()
+        finished = True
+    finally:
+        if not finished:
+            # the rest of the result would have to be read before the connection can be
+            # used again, discard the connection instead of returning it to the pool
+            conn.invalidate()
+        conn.close()
+
+
+def csv_download(filename, rows):
+    """ Response that streams the rows (an iterable of sequences, usually a
+        generator) as CSV file attachment with the given file name.
+        The rows are written in chunks of config.CSV_BATCH_SIZE rows,
+        so they are never held in memory at once.
+        The rows are consumed after the view function returned, they must not
+        depend on the request context or lazy-load attributes from the session.
+    """
+
+    def generate():
+        buffer = StringIO.StringIO()
+        writer = csv.writer(buffer)
+        for num, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if num % config.CSV_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    headers = Headers()
+    headers.add('Content-Type', 'text/csv')
+    headers.add('Content-Disposition', 'attachment', filename=secure_filename(filename))
+    return Response(response=generate(), headers=headers, direct_passthrough=True)
+
+
+def blob_response(blob, filename, content_type='text/plain'):
+    """ Response that streams a blobs.Blob as file attachment in chunks.
+        Supports requests of a single byte range (Range header), e.g. to resume downloads.
+    """
+    headers = Headers()
+    headers.add('Content-Type', content_type)
+    headers.add('Content-Disposition', 'attachment', filename=filename)
+    headers.add('Accept-Ranges', 'bytes')
+    start, stop, status = 0, blob.length, 200
+    byte_range = request.range
+    # multiple ranges aren't supported, the whole blob is sent instead
+    if byte_range is not None and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+        start_stop = byte_range.range_for_length(blob.length)
+        if start_stop is None:
+            headers.add('Content-Range', 'bytes */%d' % blob.length)
+            return Response(status=416, headers=headers)
+        start, stop = start_stop
+        headers.add('Content-Range', 'bytes %d-%d/%d' % (start, stop - 1, blob.length))
+        status = 206
+    headers.add('Content-Length', stop - start)
+    return Response(response=blob.chunks(start, stop - start), status=status, headers=headers,
+                    direct_passthrough=True)
+
+
 def password_hash(password):
     """ Returns a cryptographic hash of the given password salted with
         SECRET_KEY as hexstring.
@@ -12,6 +12,9 @@
 """
 
 import os
+import math
+import inspect
+import datetime
 import numpy
 import StringIO
 import csv
@@ -23,10 +26,10 @@ from sqlalchemy.orm import joinedload_all
 import sqlalchemy.types
 
 from flask import Blueprint, render_template as render
-from flask import Response, abort, request, g
+from flask import Response, abort, request, g, jsonify
 from werkzeug import Headers, secure_filename
 
-from edacc import plots, config, models
+from edacc import plots, plot_pool, plot_cache, config, models, solved_index
 from edacc.web import cache
 from sqlalchemy.orm import joinedload
 from edacc.views.helpers import require_phase, require_login
@@ -47,11 +50,61 @@ def get_request_plot_type():
         return 'rscript'
     elif request.args.has_key('csv'):
         return 'csv'
+    elif request.args.get('format') == 'json':
+        return 'json'
     else:
         return 'png'
 
 
+def plot_json(value):
+    """ Returns value as JSON serializable data. Database objects are
+        represented as {'id': .., 'name': ..}, infinite and NaN values as None,
+        and dictionaries with other than string or integer keys as lists of [key, value] pairs.
+    """
+    if isinstance(value, plot_pool.PlotObject):
+        id = value.key[1]
+        return {'id': id[0] if isinstance(id, tuple) and len(id) == 1 else id, 'name': value.get_name()}
+    if hasattr(value, '_sa_instance_state'):
+        return plot_json(plot_pool.PlotObject(value))
+    if isinstance(value, numpy.ndarray):
+        return plot_json(value.tolist())
+    if isinstance(value, numpy.generic):
+        return plot_json(value.item())
+    if isinstance(value, float):
+        return value if not (math.isinf(value) or math.isnan(value)) else None
+    if isinstance(value, dict):
+        if all(isinstance(k, (basestring, int, long)) for k in value):
+            return dict((unicode(k), plot_json(v)) for k, v in value.iteritems())
+        return [[plot_json(k), plot_json(v)] for k, v in value.iteritems()]
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [plot_json(v) for v in value]
+    return value
+
+
+def make_json_plot_response(function, *args, **kwargs):
+    """ Returns the data of a plot as JSON for client-side rendering: the
+        arguments the plot function would be called with, by name, i.e. the
+        plotted series, axis limits, labels and log-scale flags. """
+    function_args = inspect.getargspec(getattr(function, '__wrapped__', function)).args
+    data = dict(zip(function_args, args))
+    data.update(kwargs)
+    return jsonify({'plot': function.__name__, 'data': plot_json(data)})
+
+
+def make_scatter_json_response(points, xlabel, ylabel, title, max_x, max_y, xscale, yscale, diagonal_line=False):
+    """ Returns the data of a scatter plot as JSON. points is a list of instance groups,
+        each a list of (x, y, instance) points. """
+    return make_json_plot_response(plots.scatter, points, xlabel, ylabel, title, max_x, max_y,
+                                   xscale=xscale, yscale=yscale, diagonal_line=diagonal_line)
+
+
 def make_plot_response(function, *args, **kwargs):
+    """ Renders the plot function with the given arguments in the requested
+        format and returns it as response. Rendered plots are cached on disk and
+        served with ETag and Last-Modified headers, see make_conditional_response.
+        With the GET parameter format=json, the plot data is returned as JSON instead. """
+    if request.args.get('format') == 'json':
+        return make_json_plot_response(function, *args, **kwargs)
     if request.args.has_key('pdf'):
         type = 'pdf'; mime = 'application/pdf'
     elif request.args.has_key('eps'):
@@ -60,17 +113,44 @@ def make_plot_response(function, *args, **kwargs):
         type = 'rscript'; mime = 'text/plain'
     else:
         type = 'png'; mime = 'image/png'
-    filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.' + type
-
-    try:
-        function(*args, filename=filename, format=type, **kwargs)
-    except Exception as exception:
-        plots.make_error_plot(text=str(exception), filename=filename, format='png')
-        print str(exception)
     headers = Headers()
     headers.add('Content-Disposition', 'attachment', filename=secure_filename('data.' + type))
-    response = Response(response=open(filename, 'rb').read(), mimetype=mime, headers=headers)
-    os.remove(filename)
+
+    # database objects are keyed by their IDs instead of their memory addresses
+    args, kwargs = plot_pool.plot_data(args), plot_pool.plot_data(kwargs)
+    key = plot_cache.plot_key(function.__name__, args, kwargs, type)
+    cached = plot_cache.lookup(key, type)
+    if cached is None:
+        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.' + type
+        try:
+            plot_pool.render(function, *args, filename=filename, format=type, **kwargs)
+        except Exception as exception:
+            plot_pool.render(plots.make_error_plot, text=str(exception), filename=filename, format='png')
+            print str(exception)
+            response = Response(response=open(filename, 'rb').read(), mimetype=mime, headers=headers)
+            os.remove(filename)
+            return response
+        # read before storing, the stored plot can be evicted right away
+        with open(filename, 'rb') as f:
+            cached = (f.read(), os.fstat(f.fileno()).st_mtime)
+        if plot_cache.store(key, type, filename) is None:
+            os.remove(filename)
+
+    data, mtime = cached
+    response = Response(response=data, mimetype=mime, headers=headers)
+    response.set_etag(key)
+    response.last_modified = datetime.datetime.utcfromtimestamp(int(mtime))
+    response.cache_control.no_cache = True
+    return response
+
+
+@plot.after_request
+def make_conditional_response(response):
+    """ Answers requests with an If-None-Match or If-Modified-Since header
+        matching the plot with 304 Not Modified. This is done after the
+        request so memoized plot responses are covered as well. """
+    if 'ETag' in response.headers:
+        response.make_conditional(request)
     return response
 
 
@@ -226,10 +306,12 @@ def scatter_2solver_1property(database, experiment_id):
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + sc1.get_name() + '_vs_' + sc2.get_name() + ".csv"))
         return Response(response=csv_response.read(), headers=headers)
+    elif request.args.get('format') == 'json':
+        return make_scatter_json_response(points, xlabel, ylabel, title, max_x, max_y, xscale, yscale, diagonal_line=True)
     elif request.args.has_key('pdf'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.pdf'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf', xscale=xscale, yscale=yscale,
-                      diagonal_line=True)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf',
+                         xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment',
                     filename=secure_filename(sc1.get_name() + '_vs_' + sc2.get_name() + '.pdf'))
@@ -238,8 +320,8 @@ def scatter_2solver_1property(database, experiment_id):
         return response
     elif request.args.has_key('eps'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.eps'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='eps', xscale=xscale, yscale=yscale,
-                      diagonal_line=True)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='eps',
+                         xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment',
                     filename=secure_filename(sc1.get_name() + '_vs_' + sc2.get_name() + '.eps'))
@@ -248,8 +330,8 @@ def scatter_2solver_1property(database, experiment_id):
         return response
     elif request.args.has_key('rscript'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.txt'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript', xscale=xscale,
-                      yscale=yscale, diagonal_line=True)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript',
+                         xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment',
                     filename=secure_filename(sc1.get_name() + '_vs_' + sc2.get_name() + '.txt'))
@@ -258,8 +340,8 @@ def scatter_2solver_1property(database, experiment_id):
         return response
     else:
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.png'
-        pts = plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale, yscale=yscale,
-                            diagonal_line=True)
+        pts = plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale,
+                               yscale=yscale, diagonal_line=True)
         pts2 = []
         for j in xrange(len(points)):
             pts2 += [(pts[j][i][0], pts[j][i][1], points[j][i][0], points[j][i][1], points[j][i][2]) for i in
@@ -391,9 +473,12 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + ".csv"))
         return Response(response=csv_response.read(), headers=headers)
+    elif request.args.get('format') == 'json':
+        return make_scatter_json_response(points, xlabel, ylabel, title, max_x, max_y, xscale, yscale)
     elif request.args.has_key('pdf'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.pdf'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf', xscale=xscale, yscale=yscale)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf',
+                         xscale=xscale, yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.pdf'))
@@ -402,7 +487,8 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
         return response
     elif request.args.has_key('eps'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.eps'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='eps', xscale=xscale, yscale=yscale)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='eps',
+                         xscale=xscale, yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.eps'))
@@ -411,8 +497,8 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
         return response
     elif request.args.has_key('rscript'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.txt'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript', xscale=xscale,
-                      yscale=yscale, diagonal_line=True)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript',
+                         xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.txt'))
@@ -421,7 +507,8 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
         return response
     else:
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.png'
-        pts = plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale, yscale=yscale)
+        pts = plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale,
+                               yscale=yscale)
         pts2 = []
         for j in xrange(len(points)):
             pts2 += [(pts[j][i][0], pts[j][i][1], points[j][i][0], points[j][i][1], points[j][i][2]) for i in
@@ -563,9 +650,12 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.csv'))
         return Response(response=csv_response.read(), headers=headers)
+    elif request.args.get('format') == 'json':
+        return make_scatter_json_response(points, xlabel, ylabel, title, max_x, max_y, xscale, yscale)
     elif request.args.has_key('pdf'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.pdf'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf', xscale=xscale, yscale=yscale)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf',
+                         xscale=xscale, yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.pdf'))
@@ -574,7 +664,8 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
         return response
     elif request.args.has_key('eps'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.eps'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='eps', xscale=xscale, yscale=yscale)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='eps',
+                         xscale=xscale, yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.eps'))
@@ -583,8 +674,8 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
         return response
     elif request.args.has_key('rscript'):
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.txt'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript', xscale=xscale,
-                      yscale=yscale, diagonal_line=True)
+        plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript',
+                         xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.txt'))
@@ -593,7 +684,8 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
         return response
     else:
         filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.png'
-        pts = plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale, yscale=yscale)
+        pts = plot_pool.render(plots.scatter, points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale,
+                               yscale=yscale)
         pts2 = []
         for j in xrange(len(points)):
             pts2 += [(pts[j][i][0], pts[j][i][1], points[j][i][0], points[j][i][1], points[j][i][2]) for i in
@@ -607,6 +699,105 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
         return response
 
 
+def cactus_plot_series(db, exp, solver_configs, instance_groups, result_property, run, log_property):
+    """ Returns the series of a cactus plot and the number of solved runs of
+        each solver configuration (of the last instance group).
+        All runs of the solver configurations on the instances of all groups are
+        fetched with a single query, the values of the run modes
+        (all, average, median, penalized_average, random or a run number)
+        are computed with numpy.
+    """
+    table = db.metadata.tables['ExperimentResults']
+    from_table = table
+    solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
+    all_instance_ids = set(id for group in instance_groups for id in group)
+    if result_property in ('resultTime', 'wallTime', 'cost'):
+        value_column = table.c[result_property]
+        numeric = True
+    else:
+        table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
+        table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
+        value_column = table_has_prop_value.c['value']
+        from_table = table.outerjoin(table_has_prop, and_(table_has_prop.c['idProperty'] == int(result_property),
+                                                          table_has_prop.c['idExperimentResults'] == table.c['idJob']))\
+            .outerjoin(table_has_prop_value)
+        numeric = db.session.query(db.Property).get(int(result_property)).is_plotable()
+
+    rows = []
+    if solver_config_ids and all_instance_ids:
+        rows = db.session.connection().execute(select([table.c['SolverConfig_idSolverConfig'],
+                                                       table.c['Instances_idInstance'], table.c['run'],
+                                                       table.c['status'], table.c['resultCode'], value_column,
+                                                       table.c['CPUTimeLimit'], table.c['wallClockTimeLimit']],
+                                                      and_(table.c['Experiment_idExperiment'] == exp.idExperiment,
+                                                           table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids),
+                                                           table.c['Instances_idInstance'].in_(all_instance_ids)))
+                                               .select_from(from_table)).fetchall()
+
+    def to_float(value):
+        try:
+            return float(value) if numeric and value is not None else numpy.nan
+        except ValueError:
+            return numpy.nan
+
+    sc_column = numpy.array([r[0] for r in rows], dtype=numpy.int64)
+    instance_column = numpy.array([r[1] for r in rows], dtype=numpy.int64)
+    run_column = numpy.array([r[2] for r in rows], dtype=numpy.int64)
+    solved = numpy.array([r[3] == 1 and str(r[4]).startswith('1') for r in rows], dtype=numpy.bool_)
+    values = numpy.array([to_float(r[5]) for r in rows], dtype=numpy.float64)
+    # see ExperimentResult.get_penalized_time, runs without limit (-1) have no finite
+    # penalty (NaN) and are left out of the penalized averages
+    if result_property == 'resultTime':
+        penalties = numpy.array([numpy.nan if r[6] == -1 else (r[6] or 0) * 10.0 for r in rows], dtype=numpy.float64)
+    elif result_property == 'wallTime':
+        penalties = numpy.array([numpy.nan if r[7] == -1 else (r[7] or 0) * 10.0 for r in rows], dtype=numpy.float64)
+    else:
+        penalties = numpy.zeros(len(rows), dtype=numpy.float64)
+    has_value = ~numpy.isnan(values)
+
+    def per_instance(selection, run_values, aggregate):
+        """ Aggregates the values of the selected runs per instance """
+        order = numpy.lexsort((run_values[selection], instance_column[selection]))
+        sorted_values = run_values[selection][order]
+        _, starts, counts = numpy.unique(instance_column[selection][order], return_index=True, return_counts=True)
+        if aggregate == 'average':
+            return numpy.add.reduceat(sorted_values, starts) / counts if len(starts) else sorted_values
+        return (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2.0
+
+    random_run = random.randint(0, exp.get_max_num_runs(db) - 1)
+    solvers = []
+    num_solved = dict()
+    for instance_group, instance_ids in enumerate(instance_groups):
+        in_group = numpy.in1d(instance_column, instance_ids)
+        for sc in solver_configs:
+            runs = in_group & (sc_column == sc.idSolverConfig)
+            num_solved[sc.idSolverConfig] = int((runs & solved).sum())
+            solved_values = runs & solved & has_value
+            if run == 'all':
+                sc_results = values[solved_values]
+            elif run in ('average', 'median'):
+                sc_results = per_instance(solved_values, values, run)
+            elif run == 'penalized_average':
+                # unsolved runs count with their penalty
+                selection = runs & numpy.where(solved, has_value, ~numpy.isnan(penalties))
+                sc_results = per_instance(selection, numpy.where(solved, values, penalties), 'average')
+            else:
+                run_number = random_run if run == 'random' else int(run)
+                sc_results = values[solved_values & (run_column == run_number)]
+
+            # sc_results = (y_1, y_2, ..., y_n) : y_1 <= y_2 <= ... <= y_n
+            # s = {(x, y) \in R² : y = sc_results[x], x = 1, ..., n }
+            sc_results = numpy.sort(sc_results).tolist()
+            s = {'xs': range(1, len(sc_results) + 1), 'ys': sc_results, 'name': sc.get_name(),
+                 'instance_group': instance_group, 'idSolverConfig': sc.idSolverConfig}
+            if not log_property:
+                s['xs'].insert(0, 0)
+                s['ys'].insert(0, 0)
+            solvers.append(s)
+
+    return solvers, num_solved
+
+
 @plot.route('/<database>/experiment/<int:experiment_id>/cactus-plot/')
 @require_phase(phases=ANALYSIS1)
 @require_login
@@ -618,12 +809,8 @@ def cactus_plot(database, experiment_id):
     db = models.get_database(database) or abort(404)
     exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-        .filter_by(experiment=exp).first()
-    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=exp).count()
-
     @cache.memoize(6 * 24 * 60 * 60)
-    def cached_cactus_plot(database, experiment_id, request_args, job_count, last_modified_job, plot_type):
+    def cached_cactus_plot(database, experiment_id, request_args, data_version, plot_type):
         instance_groups_count = int(request.args.get('instance_groups_count', 0))
         use_colors_for = request.args.get('use_colors_for', 'solvers')
         colored_instance_groups = (use_colors_for == 'instance_groups')
@@ -632,10 +819,6 @@ def cactus_plot(database, experiment_id):
         run = request.args.get('run', 'all')
         result_property = request.args.get('result_property') or 'resultTime'
 
-        results = db.session.query(db.ExperimentResult)
-        results = results.enable_eagerloads(True).options(joinedload(db.ExperimentResult.solver_configuration))
-        results = results.options(joinedload(db.ExperimentResult.properties))
-        results = results.filter_by(experiment=exp)
         instances = [[int(id) for id in request.args.getlist('i')]]
         for i in xrange(1, instance_groups_count):
             instances.append([int(id) for id in request.args.getlist('i' + str(i))])
@@ -645,80 +828,9 @@ def cactus_plot(database, experiment_id):
 
         solver_configs = [db.session.query(db.SolverConfiguration).get(int(id)) for id in request.args.getlist('sc')]
 
-        solvers = []
-        num_solved = dict()
-
-        random_run = random.randint(0, exp.get_max_num_runs(db) - 1)
-
-        for instance_group in xrange(instance_groups_count):
-            for sc in solver_configs:
-                s = {'xs': [], 'ys': [], 'name': sc.get_name(), 'instance_group': instance_group, 'solver_config': sc}
-                sc_res = results.filter_by(solver_configuration=sc, status=1).filter(
-                    db.ExperimentResult.resultCode.like('1%')) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instances[instance_group]))
-                num_solved[sc] = sc_res.count()
-                if run == 'all':
-                    sc_results = filter(lambda j: j is not None,
-                                        [r.get_property_value(result_property, db) for r in sc_res.all()])
-                elif run in ('average', 'median'):
-                    sc_results = []
-                    for id in instances[instance_group]:
-                        res = sc_res.filter(db.ExperimentResult.Instances_idInstance == id).all()
-                        res = [r.get_property_value(result_property, db) for r in res]
-                        res = filter(lambda r: r is not None, res)
-                        if len(res) > 0:
-                            if run == 'average':
-                                sc_results.append(numpy.average(res))
-                            elif run == 'median':
-                                sc_results.append(numpy.median(res or [0]))
-                elif run == 'random':
-                    sc_results = [r.get_property_value(result_property, db) for r in
-                                  sc_res.filter_by(run=random_run).all()]
-                    sc_results = filter(lambda r: r is not None, sc_results)
-                elif run == 'penalized_average':
-                    sc_results = []
-                    for id in instances[instance_group]:
-                        res = sc_res.filter(db.ExperimentResult.Instances_idInstance == id).all()
-                        num_penalized = results.filter_by(solver_configuration=sc) \
-                            .filter(db.ExperimentResult.Instances_idInstance == id) \
-                            .filter(or_(db.ExperimentResult.status != 1,
-                                        not_(db.ExperimentResult.resultCode.like('1%')))).count()
-                        if result_property == 'resultTime':
-                            penalized_time = sum(
-                                [j.get_penalized_time(10) for j in res if not str(j.resultCode).startswith('1')])
-                            res_vals = [r.get_property_value(result_property, db) for r in res if
-                                        str(r.resultCode.startswith('1'))]
-                        elif result_property == 'wallTime':
-                            penalized_time = sum(
-                                [j.wallClockTimeLimit * 10 for j in res if not str(j.resultCode).startswith('1')])
-                            res_vals = [r.get_property_value(result_property, db) for r in res if
-                                        str(r.resultCode.startswith('1'))]
-                        else:
-                            penalized_time = 0
-                            res_vals = [r.get_property_value(result_property, db) for r in res]
-                        penalized_avg = (sum(res_vals) + penalized_time) / (num_penalized + len(res_vals))
-                        sc_results.append(penalized_avg)
-                else:
-                    run_number = int(run)
-                    res = sc_res.filter_by(run=run_number).all()
-                    res = [r.get_property_value(result_property, db) for r in res]
-                    sc_results = filter(lambda r: r is not None, res)
-
-                sc_results = sorted(sc_results)
-                if not log_property:
-                    s['ys'].append(0)
-                    s['xs'].append(0)
-
-                # sc_results = (y_1, y_2, ..., y_n) : y_1 <= y_2 <= ... <= y_n
-                # s = {(x, y) \in R² : y = sc_results[x], x = 1, ..., n }
-                i = 1
-                for r in sc_results:
-                    s['ys'].append(r)
-                    s['xs'].append(i)
-                    i += 1
-                solvers.append(s)
-
-        solvers.sort(key=lambda x: num_solved[x['solver_config']], reverse=True)
+        solvers, num_solved = cactus_plot_series(db, exp, solver_configs, instances[:instance_groups_count],
+                                                 result_property, run, log_property)
+        solvers.sort(key=lambda x: num_solved[x['idSolverConfig']], reverse=True)
 
         min_y = min([min(s['ys'] or [0.01]) for s in solvers] or [0.01])
         max_x = max([max(s['xs'] or [0]) for s in solvers] or [0]) + 10
@@ -750,11 +862,16 @@ def cactus_plot(database, experiment_id):
             headers.add('Content-Type', 'text/csv')
             headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_cactus.csv"))
             return Response(response=csv_response.read(), headers=headers)
+        elif plot_type == 'json':
+            return jsonify({'series': [dict((k, s[k]) for k in ('name', 'instance_group', 'idSolverConfig', 'xs', 'ys'))
+                                       for s in solvers],
+                            'max_x': max_x, 'max_y': max_y, 'min_y': min_y, 'log_property': log_property,
+                            'flip_axes': flip_axes, 'ylabel': ylabel, 'title': title})
         else:
             return make_plot_response(plots.cactus, solvers, instance_groups_count, colored_instance_groups,
                                       max_x, max_y, min_y, log_property, flip_axes, ylabel, title)
 
-    return cached_cactus_plot(database, experiment_id, request.args, job_count, last_modified_job,
+    return cached_cactus_plot(database, experiment_id, request.args, exp.get_data_version(db),
                               get_request_plot_type())
 
 
@@ -978,13 +1095,9 @@ def box_plots(database, experiment_id):
     instance_ids = map(int, request.args.getlist('i'))
     solver_config_ids = map(int, request.args.getlist('solver_configs'))
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-        .filter_by(experiment=exp).first()
-    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=exp).count()
-
     @cache.memoize(7 * 24 * 60 * 60)
-    def cached_box_plot(database, experiment_id, instance_ids, solver_config_ids, job_count, last_modified_job,
-                        result_property, plot_type):
+    def cached_box_plot(database, experiment_id, instance_ids, solver_config_ids, data_version, result_property,
+                        plot_type):
         instances = db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
         solver_configs = db.session.query(db.SolverConfiguration).filter(
             db.SolverConfiguration.idSolverConfig.in_(solver_config_ids)).all()
@@ -1029,7 +1142,7 @@ def box_plots(database, experiment_id):
         else:
             return make_plot_response(plots.box_plot, results, result_property_name)
 
-    return cached_box_plot(database, experiment_id, instance_ids, solver_config_ids, job_count, last_modified_job,
+    return cached_box_plot(database, experiment_id, instance_ids, solver_config_ids, exp.get_data_version(db),
                            request.args.get('result_property'), get_request_plot_type())
 
 
@@ -1040,6 +1153,120 @@ def barplot(database, experiment_id, gt, eq, lt):
     return make_plot_response(plots.barplot, [gt, eq, lt])
 
 
+def aggregate_groups(groups, values, num_groups, measure):
+    """ Aggregates the values by group (integer array of group indices in
+        [0, num_groups)) with the given measure (mean, par10, median, min or max).
+        NaN values are ignored, groups without values are NaN.
+    """
+    valid = ~numpy.isnan(values)
+    groups, values = groups[valid], values[valid]
+    result = numpy.empty(num_groups)
+    result.fill(numpy.nan)
+    if len(values) == 0: return result
+    order = numpy.lexsort((values, groups))
+    values = values[order]
+    counts = numpy.bincount(groups, minlength=num_groups)
+    has_values = counts > 0
+    starts = (numpy.cumsum(counts) - counts)[has_values]
+    counts = counts[has_values]
+    if measure == 'min':
+        result[has_values] = values[starts]
+    elif measure == 'max':
+        result[has_values] = values[starts + counts - 1]
+    elif measure == 'median':
+        result[has_values] = (values[starts + (counts - 1) // 2] + values[starts + counts // 2]) / 2.0
+    else:
+        result[has_values] = numpy.add.reduceat(values, starts) / counts
+    return result
+
+
+@cache.memoize(14 * 24 * 60 * 60)
+def runtime_matrix(database, experiment_id, measure, cost, data_version):
+    """ Returns (solver config ids, instance ids, matrix) where matrix is a
+        (#instances x #solver configs) numpy array of the measure of the runs
+        of each solver configuration on each instance (NaN if there are no runs).
+        Solver configurations are sorted by the measure over all their runs,
+        instances by their hardness (the measure over all runs on them).
+        Solver configurations and instances without runs are left out.
+        data_version is the version stamp of the experiment data the matrix
+        is cached for.
+    """
+    db = models.get_database(database)
+    exp = db.session.query(db.Experiment).get(experiment_id)
+    table = db.metadata.tables['ExperimentResults']
+    from_table = table
+    table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
+    table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
+    cost_limit = table.c['CPUTimeLimit'] if cost == 'resultTime' else table.c[
+        'wallClockTimeLimit'] if cost == 'wallTime' else exp.cost_penalty if cost == 'cost' else None
+
+    if cost in ('resultTime', 'wallTime', 'cost'):
+        cost_c = table.c[cost]
+    else:
+        cost_c = table_has_prop_value.c['value']
+        from_table = table.join(table_has_prop, and_(table_has_prop.c['idProperty'] == int(cost),
+                                                     table_has_prop.c['idExperimentResults'] == table.c[
+                                                         'idJob'])).join(table_has_prop_value)
+
+        s = select([func.max(expression.cast(cost_c, sqlalchemy.types.Float))],
+                   table.c['Experiment_idExperiment'] == experiment_id).select_from(from_table)
+        cost_limit = float(db.session.connection().execute(s).fetchone()[0])
+
+    if measure == 'par10':
+        time_case = expression.case([
+                                        (table.c['resultCode'].like(u'1%'),
+                                         expression.cast(cost_c, sqlalchemy.types.Float))],
+                                    else_=cost_limit * 10.0)
+    else:
+        time_case = expression.cast(cost_c, sqlalchemy.types.Float)
+
+    s = select([time_case,
+                table.c['SolverConfig_idSolverConfig'],
+                table.c['Instances_idInstance']],
+               table.c['Experiment_idExperiment'] == experiment_id).select_from(from_table)
+    runs = db.session.connection().execute(s).fetchall()
+    if not runs:
+        return [], [], numpy.zeros((0, 0))
+
+    values = numpy.array([numpy.nan if r[0] is None else float(r[0]) for r in runs])
+    solver_config_ids, solver_config_index = numpy.unique(numpy.array([r[1] for r in runs]), return_inverse=True)
+    instance_ids, instance_index = numpy.unique(numpy.array([r[2] for r in runs]), return_inverse=True)
+    num_solver_configs, num_instances = len(solver_config_ids), len(instance_ids)
+
+    solver_score = aggregate_groups(solver_config_index, values, num_solver_configs, measure)
+    instance_hardness = aggregate_groups(instance_index, values, num_instances, measure)
+    matrix = aggregate_groups(instance_index * num_solver_configs + solver_config_index, values,
+                              num_instances * num_solver_configs, measure).reshape(num_instances, num_solver_configs)
+
+    solver_config_order = numpy.argsort(solver_score, kind='mergesort')
+    instance_order = numpy.argsort(instance_hardness, kind='mergesort')
+    return (map(int, solver_config_ids[solver_config_order]), map(int, instance_ids[instance_order]),
+            matrix[instance_order][:, solver_config_order])
+
+
+def downsample_matrix(matrix, max_rows, max_columns):
+    """ Reduces the matrix to at most max_rows rows and max_columns columns
+        by averaging blocks of adjacent cells. The values are averaged on a
+        logarithmic scale, like the colors of the runtime matrix plot.
+        Returns (downsampled matrix, rows per block, columns per block).
+    """
+    rows, columns = matrix.shape
+    row_block = max(1, int(math.ceil(rows / float(max_rows))))
+    column_block = max(1, int(math.ceil(columns / float(max_columns))))
+    if row_block == 1 and column_block == 1:
+        return matrix, 1, 1
+    num_row_blocks = int(math.ceil(rows / float(row_block)))
+    num_column_blocks = int(math.ceil(columns / float(column_block)))
+    # pad with NaN to a multiple of the block size, the padding is ignored in the average
+    padded = numpy.empty((num_row_blocks * row_block, num_column_blocks * column_block))
+    padded.fill(numpy.nan)
+    padded[:rows, :columns] = numpy.log10(matrix)
+    blocks = padded.reshape(num_row_blocks, row_block, num_column_blocks, column_block)
+    valid = ~numpy.isnan(blocks)
+    block_sums = numpy.where(valid, blocks, 0.0).sum(axis=(1, 3))
+    return 10.0 ** (block_sums / valid.sum(axis=(1, 3))), row_block, column_block
+
+
 @plot.route('/<database>/experiment/<int:experiment_id>/runtime-matrix-plot-img/')
 @require_phase(phases=ANALYSIS2)
 @require_login
@@ -1047,145 +1274,38 @@ def runtime_matrix_plot(database, experiment_id):
     db = models.get_database(database) or abort(404)
     exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
     measure = request.args.get('measure', 'par10') or abort(404)
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-        .filter_by(experiment=exp).first()
+    if measure not in ('par10', 'mean', 'median', 'min', 'max'): abort(404)
     cost = request.args.get('result_property', 'resultTime')
 
-    #CACHE_TIME = 14*24*60*60
-    #@cache.memoize(timeout=CACHE_TIME)
-    def make_rtm_response(experiment_id, last_modified_job, measure, num_jobs, cost, csv=False, type='png'):
-        solver_configs = sorted(exp.solver_configurations, key=lambda sc: sc.idSolverConfig)
-        instances = sorted(exp.instances, key=lambda i: i.idInstance)
-        solver_configs_dict = dict((sc.idSolverConfig, sc) for sc in solver_configs)
-
-        table = db.metadata.tables['ExperimentResults']
-        from_table = table
-        table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
-        table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
-        cost_limit = table.c['CPUTimeLimit'] if cost == 'resultTime' else table.c[
-            'wallClockTimeLimit'] if cost == 'wallTime' else exp.cost_penalty if cost == 'cost' else None
-
-        if cost in ('resultTime', 'wallTime', 'cost'):
-            cost_c = table.c[cost]
-        else:
-            cost_c = table_has_prop_value.c['value']
-            from_table = table.join(table_has_prop, and_(table_has_prop.c['idProperty'] == int(cost),
-                                                         table_has_prop.c['idExperimentResults'] == table.c[
-                                                             'idJob'])).join(table_has_prop_value)
+    solver_config_ids, instance_ids, matrix = runtime_matrix(database, experiment_id, measure, cost,
+                                                             exp.get_data_version(db))
 
-        if cost not in ('resultTime', 'wallTime', 'cost'):
-            s = select([func.max(expression.cast(cost_c, sqlalchemy.types.Float))],
-                       table.c['Experiment_idExperiment'] == experiment_id).select_from(from_table)
-            cost_limit = float(db.session.connection().execute(s).fetchone()[0])
-
-        if measure == 'par10':
-            time_case = expression.case([
-                                            (table.c['resultCode'].like(u'1%'),
-                                             expression.cast(cost_c, sqlalchemy.types.Float))],
-                                        else_=cost_limit * 10.0)
-        else:
-            time_case = cost_c
-
-        s = select([time_case,
-                    table.c['resultCode'],
-                    table.c['SolverConfig_idSolverConfig'],
-                    table.c['Instances_idInstance']],
-                   table.c['Experiment_idExperiment'] == experiment_id).select_from(from_table)
-        runs = db.session.connection().execute(s)
+    if request.args.has_key('csv'):
+        solver_configs = dict((sc.idSolverConfig, sc) for sc in exp.solver_configurations)
+        instances = dict((i.idInstance, i) for i in exp.instances)
+        csv_response = StringIO.StringIO()
+        csv_writer = csv.writer(csv_response)
+        csv_writer.writerow([''] + [str(solver_configs[id]) for id in solver_config_ids])
+        for instance_id, row in zip(instance_ids, matrix):
+            csv_writer.writerow([str(instances[instance_id])] + [str(None if numpy.isnan(v) else v) for v in row])
+        csv_response.seek(0)
 
-        if measure == 'mean':
-            aggregate_func = func.AVG(time_case)
-        elif measure == 'min':
-            aggregate_func = func.MIN(time_case)
-        elif measure == 'max':
-            aggregate_func = func.MAX(time_case)
-        elif measure == 'par10' or measure is None:
-            aggregate_func = func.AVG(time_case)
-
-        s = select([table.c['SolverConfig_idSolverConfig'],
-                    aggregate_func], table.c['Experiment_idExperiment'] == experiment_id) \
-            .group_by(table.c['SolverConfig_idSolverConfig']) \
-            .select_from(from_table)
-        solver_score = dict((sc[0], float(sc[1])) for sc in db.session.connection().execute(s))
-
-        # throw out all solver configs for which there are no runs
-        solver_configs = filter(lambda sc: sc.idSolverConfig in solver_score.keys(), solver_configs)
-
-        s = select([table.c['Instances_idInstance'],
-                    aggregate_func], table.c['Experiment_idExperiment'] == experiment_id) \
-            .group_by(table.c['Instances_idInstance']) \
-            .select_from(from_table)
-        instance_hardness = dict((inst[0], float(inst[1])) for inst in db.session.connection().execute(s))
-
-        results_by_instance = {}
-        for r in runs:
-            c = float(r[0])
-            if r.Instances_idInstance not in results_by_instance:
-                results_by_instance[r.Instances_idInstance] = {r.SolverConfig_idSolverConfig: [c]}
-            else:
-                rs = results_by_instance[r.Instances_idInstance]
-                if r.SolverConfig_idSolverConfig not in rs:
-                    rs[r.SolverConfig_idSolverConfig] = [c]
-                else:
-                    rs[r.SolverConfig_idSolverConfig].append(c)
-
-        sorted_solver_configs = sorted(solver_configs, key=lambda sc: solver_score[sc.idSolverConfig])
-        sorted_instances = sorted(instances, key=lambda i: instance_hardness[i.idInstance])
-
-        rt_matrix = dict((sc.idSolverConfig, dict((i.idInstance, None) for i in instances)) for sc in solver_configs)
-        flattened_rt_matrix = []
-        for instance in sorted_instances:
-            if instance.idInstance not in results_by_instance: continue
-            rs = results_by_instance[instance.idInstance]
-            for solver_config in sorted_solver_configs:
-                jobs = rs.get(solver_config.idSolverConfig, [])
-                runtimes = filter(lambda r: r is not None, jobs)
-                time_measure = None
-                if len(runtimes) > 0:
-                    if measure == 'mean':
-                        time_measure = numpy.average(runtimes)
-                    elif measure == 'median':
-                        time_measure = numpy.median(runtimes)
-                    elif measure == 'min':
-                        time_measure = min(runtimes)
-                    elif measure == 'max':
-                        time_measure = max(runtimes)
-                    elif measure == 'par10' or measure is None:
-                        time_measure = numpy.average(jobs or [0])
-                if request.args.has_key('csv'): rt_matrix[solver_config.idSolverConfig][
-                    instance.idInstance] = time_measure
-                flattened_rt_matrix.append(time_measure + 0.0000001)
-
-        if csv:
-            csv_response = StringIO.StringIO()
-            csv_writer = csv.writer(csv_response)
-            csv_writer.writerow([''] + map(str, sorted_solver_configs))
-            for instance in sorted_instances:
-                row = [str(instance)]
-                for sc in sorted_solver_configs:
-                    row.append(str(rt_matrix[sc.idSolverConfig][instance.idInstance]))
-                csv_writer.writerow(row)
-            csv_response.seek(0)
+        headers = Headers()
+        headers.add('Content-Type', 'text/csv')
+        headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_runtime_matrix.csv"))
+        return Response(response=csv_response.read(), headers=headers)
 
-            headers = Headers()
-            headers.add('Content-Type', 'text/csv')
-            headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_runtime_matrix.csv"))
-            return Response(response=csv_response.read(), headers=headers)
-        else:
-            return make_plot_response(plots.runtime_matrix_plot, flattened_rt_matrix, len(sorted_solver_configs),
-                                      len(sorted_instances),
-                                      measure)
+    if numpy.isnan(matrix).any():
+        # the plot shows a message instead
+        return make_plot_response(plots.runtime_matrix_plot, [None], len(solver_config_ids), len(instance_ids),
+                                  measure)
 
-    if request.args.has_key('pdf'):
-        type = 'pdf'
-    elif request.args.has_key('eps'):
-        type = 'eps'
-    elif request.args.has_key('rscript'):
-        type = 'rscript'
-    else:
-        type = 'png'
-    return make_rtm_response(experiment_id, last_modified_job, measure, exp.get_num_jobs(db), cost,
-                             request.args.has_key('csv'), type)
+    matrix, instance_block, solver_config_block = downsample_matrix(matrix + 0.0000001,
+                                                                    config.RUNTIME_MATRIX_PLOT_RESOLUTION,
+                                                                    config.RUNTIME_MATRIX_PLOT_RESOLUTION)
+    return make_plot_response(plots.runtime_matrix_plot, matrix.ravel().tolist(), matrix.shape[1],
+                              matrix.shape[0], measure, instance_block=instance_block,
+                              solver_config_block=solver_config_block)
 
 
 @plot.route('/<database>/experiment/<int:experiment_id>/parameter-plot-1d-img/')
@@ -1203,13 +1323,10 @@ def parameter_plot_1d(database, experiment_id):
     log_param = request.args.has_key('log_x')
     log_cost = request.args.has_key('log_y')
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-        .filter_by(experiment=exp).first()
-
     CACHE_TIME = 14 * 24 * 60 * 60
 
     @cache.memoize(timeout=CACHE_TIME)
-    def plot_image(experiment_id, parameter_id, measure, instance_ids, runtime_cap, last_modified_job, type, num_jobs,
+    def plot_image(experiment_id, parameter_id, measure, instance_ids, runtime_cap, data_version, type,
                    log_param, log_cost):
         table = db.metadata.tables['ExperimentResults']
         table_sc = db.metadata.tables['SolverConfig']
@@ -1271,10 +1388,12 @@ def parameter_plot_1d(database, experiment_id):
         type = 'eps'
     elif request.args.has_key('rscript'):
         type = 'rscript'
+    elif request.args.get('format') == 'json':
+        type = 'json'
     else:
         type = 'png'
-    return plot_image(experiment_id, parameter_id, measure, instance_ids, runtime_cap, last_modified_job, type,
-                      exp.get_num_jobs(db), log_param, log_cost)
+    return plot_image(experiment_id, parameter_id, measure, instance_ids, runtime_cap, exp.get_data_version(db), type,
+                      log_param, log_cost)
 
 
 @plot.route('/<database>/experiment/<int:experiment_id>/parameter-plot-2d-img/')
@@ -1296,14 +1415,11 @@ def parameter_plot_2d(database, experiment_id):
     instance_ids = map(int, request.args.getlist('i'))
     runtime_cap = float(request.args.get('runtime_cap'))
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-        .filter_by(experiment=exp).first()
-
     CACHE_TIME = 14 * 24 * 60 * 60
 
     @cache.memoize(timeout=CACHE_TIME)
     def plot_image(experiment_id, parameter1_id, parameter2_id, measure, instance_ids,
-                   runtime_cap, last_modified_job, surface_interpolation, type, num_jobs,
+                   runtime_cap, data_version, surface_interpolation, type,
                    log_x, log_y, log_cost):
         table = db.metadata.tables['ExperimentResults']
         table_sc = db.metadata.tables['SolverConfig']
@@ -1371,10 +1487,12 @@ def parameter_plot_2d(database, experiment_id):
         type = 'eps'
     elif request.args.has_key('rscript'):
         type = 'rscript'
+    elif request.args.get('format') == 'json':
+        type = 'json'
     else:
         type = 'png'
     return plot_image(experiment_id, parameter1_id, parameter2_id, measure, instance_ids, runtime_cap,
-                      last_modified_job, surface_interpolation, type, exp.get_num_jobs(db), log_x, log_y, log_cost)
+                      exp.get_data_version(db), surface_interpolation, type, log_x, log_y, log_cost)
 
 
 @plot.route('/<database>/experiment/<int:experiment_id>/perc-solved-alone/')
@@ -1388,26 +1506,15 @@ def perc_solved_alone(database, experiment_id):
     solver_config_ids = map(int, request.args.getlist('sc'))
     solver_configs = [sc for sc in exp.solver_configurations if sc.idSolverConfig in solver_config_ids]
 
-    table = db.metadata.tables['ExperimentResults']
-    s = select([table.c['SolverConfig_idSolverConfig'],
-                table.c['Instances_idInstance']],
-               and_(table.c['resultCode'].like(u'1%'),
-                    table.c['Instances_idInstance'].in_(instance_ids),
-                    table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids),
-                    table.c['Experiment_idExperiment'] == exp.idExperiment,
-                    table.c['status'] == 1)).select_from(table)
-    successful_runs = db.session.connection().execute(s)
-
-    solved_instances = set()
-    solved_instances_by_solver = dict((sc, set()) for sc in solver_config_ids)
-    for run in successful_runs:
-        solved_instances.add(run.Instances_idInstance)
-        solved_instances_by_solver[run.SolverConfig_idSolverConfig].add(run.Instances_idInstance)
+    instances = db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
+    index = exp.get_solved_index(db, instances, solver_configs)
+    num_solved = index.counts()
+    num_solved_any = solved_index.popcount(index.union())
 
     perc_solved_by_solver = dict()
     for sc in solver_configs:
-        perc_solved_by_solver[sc] = len(solved_instances_by_solver[sc.idSolverConfig]) / float(
-            len(solved_instances)) if len(solved_instances) != 0 else 0
+        perc_solved_by_solver[sc] = num_solved[index.solver_config_index[sc.idSolverConfig]] / float(
+            num_solved_any) if num_solved_any != 0 else 0
 
     return make_plot_response(plots.perc_solved_alone, perc_solved_by_solver)
 
@@ -1424,31 +1531,36 @@ def correlation_matrix_plot(database, experiment_id):
     solver_configs = db.session.query(db.SolverConfiguration).filter(
         db.SolverConfiguration.idSolverConfig.in_(map(int, request.args.getlist('sc')))).all()
 
+    method = request.args.get('method', 'spearman')
+    if method not in ('spearman', 'pearson'): abort(404)
+
     @cache.memoize(7 * 24 * 60 * 60)
-    def cached_correlation_matrix_plot(database, experiment_id, sc_names, request_args, job_count, last_modified_job):
-        result_matrix, _, _ = experiment.get_result_matrix(db, solver_configs, instances,
-                                                           request.args.get('cost', 'resultTime'))
-        sc_correlation = dict((sc, dict()) for sc in solver_configs)
-        for sc1 in solver_configs:
-            for sc2 in solver_configs:
-                if sc1 == sc2: sc_correlation[sc1][sc2] = sc_correlation[sc2][sc1] = 1.0; continue
-                if sc1 in sc_correlation and sc2 in sc_correlation[sc1]: continue
-                v1 = []
-                v2 = []
-                for instance in instances:
-                    for sc1run, sc2run in zip(result_matrix[instance.idInstance][sc1.idSolverConfig],
-                                              result_matrix[instance.idInstance][sc2.idSolverConfig]):
-                        v1.append(sc1run.penalized_time1)
-                        v2.append(sc2run.penalized_time1)
-                sc_correlation[sc1][sc2] = statistics.spearman_correlation(v1, v2)[0]
-                sc_correlation[sc2][sc1] = sc_correlation[sc1][sc2]
+    def cached_correlation_matrix_plot(database, experiment_id, sc_names, request_args, data_version):
+        coefficients, p_values = experiment.get_correlation_matrix(db, solver_configs, instances,
+                                                                   request.args.get('cost', 'resultTime'), method)
+        if request.args.has_key('csv'):
+            csv_response = StringIO.StringIO()
+            csv_writer = csv.writer(csv_response)
+            csv_writer.writerow(['Solver configuration 1', 'Solver configuration 2', method, 'p-value'])
+            for i, sc1 in enumerate(solver_configs):
+                for j, sc2 in enumerate(solver_configs):
+                    csv_writer.writerow([sc1.get_name(), sc2.get_name(), coefficients[i, j], p_values[i, j]])
+            csv_response.seek(0)
 
-        return make_plot_response(plots.correlation_matrix_plot, sc_correlation)
+            headers = Headers()
+            headers.add('Content-Type', 'text/csv')
+            headers.add('Content-Disposition', 'attachment',
+                        filename=secure_filename(experiment.name + "_correlation_matrix.csv"))
+            return Response(response=csv_response.read(), headers=headers)
+        elif request.args.get('format') == 'json':
+            return jsonify(method=method,
+                           solver_configs=[{'id': sc.idSolverConfig, 'name': sc.get_name()} for sc in solver_configs],
+                           coefficients=coefficients.tolist(), p_values=p_values.tolist())
 
+        sc_correlation = dict((sc1, dict((sc2, coefficients[i, j]) for j, sc2 in enumerate(solver_configs)))
+                              for i, sc1 in enumerate(solver_configs))
+        return make_plot_response(plots.correlation_matrix_plot, sc_correlation)
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
-        .filter_by(experiment=experiment).first()
-    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
 
     return cached_correlation_matrix_plot(database, experiment_id, ''.join(sc.name for sc in solver_configs),
-                                          request.args, job_count, last_modified_job)
+                                          request.args, experiment.get_data_version(db))
@@ -15,17 +15,20 @@ import uuid, datetime, os
 from jinja2 import FileSystemBytecodeCache
 from werkzeug import ImmutableDict
 from flask import Flask, Request, g, Blueprint
-from flask.ext.cache import Cache
 from flask.ext.mail import Mail
 from simplekv.fs import FilesystemStore
 from flask.ext.kvsession import KVSessionExtension
-from edacc import config, models, utils
+from edacc import config, models, utils, plot_pool, tasks
+from edacc.caching import Cache
 
 try:
     os.makedirs(config.TEMP_DIR)
 except OSError:
     pass
 
+# fork the plot rendering processes while this process has no threads and no R
+plot_pool.start()
+
 Flask.jinja_options = ImmutableDict({
     'extensions': ['jinja2.ext.autoescape', 'jinja2.ext.with_'],
     'bytecode_cache': FileSystemBytecodeCache(config.TEMP_DIR),
@@ -64,8 +67,8 @@ app.request_class = LimitedRequest
 app.config.update(
     SECRET_KEY=config.SECRET_KEY,
     PERMANENT_SESSION_LIFETIME=datetime.timedelta(days=14),
-    CACHE_TYPE='filesystem',
-    CACHE_DIR=config.TEMP_DIR,
+    CACHE_TYPE='edacc.caching.two_tier',
+    CACHE_DEFAULT_TIMEOUT=config.CACHE_TIMEOUT,
     MAIL_SERVER=config.MAIL_SERVER,
     MAIL_PORT=config.MAIL_PORT,
     MAIL_USE_TLS=config.MAIL_USE_TLS,
@@ -97,6 +100,10 @@ from edacc.plugins.borgexplorer import borgexplorer
 
 app.register_blueprint(borgexplorer)
 
+# fork the background task processes, which start their own survival test processes,
+# after the modules of the task functions are imported and before any threads exist
+tasks.start()
+
 app.jinja_env.filters['download_size'] = utils.download_size
 app.jinja_env.filters['job_status_color'] = utils.job_status_color
 app.jinja_env.filters['job_result_code_color'] = utils.job_result_code_color
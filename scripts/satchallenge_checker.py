@@ -1,4 +1,4 @@
-import sys, tempfile, subprocess, os
+import sys, tempfile, subprocess, os, shutil
 sys.path.append("..")
 
 from edacc import models, config, constants
@@ -54,7 +54,7 @@ for experiment_id in [19, 21, 18, 20, 24]:
             # run verifier and check answer again.
             instance_path = os.path.join(TEMP_DIR, run.instance.md5)
             if not os.path.exists(instance_path):
-                with open(os.path.join(instance_path), 'wb') as f: f.write(run.instance.get_instance(db))
+                with open(os.path.join(instance_path), 'wb') as f: shutil.copyfileobj(run.instance.get_blob(db).open(), f)
 
             solver_output_path = os.path.join(TEMP_DIR, str(run.idJob))
             with open(os.path.join(solver_output_path), 'wb') as f: f.write(run.output.solverOutput)
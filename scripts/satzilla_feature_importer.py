@@ -1,4 +1,4 @@
-import sys, tempfile, subprocess, os
+import sys, tempfile, subprocess, os, shutil
 sys.path.append("..")
 from sqlalchemy.orm import joinedload_all
 from edacc import models, config, constants
@@ -13,7 +13,7 @@ property_by_name = dict()
 for instance in db.session.query(db.Instance).options(joinedload_all('properties')):
     instance_path = os.path.join(TMP_DIR, instance.md5)
     with open(instance_path, 'wb') as instance_file:
-        instance_file.write(instance.get_instance(db))
+        shutil.copyfileobj(instance.get_blob(db).open(), instance_file)
 
     features = subprocess.Popen([SATZILLA_FEATURE_SCRIPT, "-base", instance_path], stdout=subprocess.PIPE)
     feature_names = features.stdout.readline().strip().split(",")
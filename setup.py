@@ -16,14 +16,14 @@ setup(
         "mysql-python>=1.2",
         "Flask-WTF>=0.5.2",
         "Flask-Actions>=0.5.2",
-        "Flask-Cache>=0.3.3",
+        "Flask-Cache>=0.10",
         "Flask-KVSession",
         "flask-mail",
         "PyLZMA>=0.4.2",
         "PIL>=1.1.7",
         "scipy>=0.9.0",
         "scikits.learn==0.8.1",
-        "numpy>=1.5.1",
+        "numpy>=1.9",
         "lxml>=2.3",
         "pbkdf2>=1.3",
         "pylzma>=0.4.4",